@@ -2,143 +2,50 @@
 English Teacher AI - Main Application
 Tích hợp DeepSeek API + Edge-TTS + Database
 With Full Security Hardening for Production
+
+Application factory: import module này không tạo app, không kết nối DB.
+    flask run / flask db upgrade   (Flask CLI tự gọi create_app)
+    gunicorn -c gunicorn.conf.py   (production)
+Schema do migrations quản lý (flask db upgrade); SQLite mới: flask init-db + flask db stamp head.
 """
 
 from datetime import timedelta, datetime
 
+import click
 from flask import Flask, render_template, request, jsonify, redirect, url_for
 from flask_login import LoginManager, login_required, current_user
 from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect, generate_csrf
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
-from flask_talisman import Talisman
 from flask_cors import CORS
 
-from models import db, User
+from models import db
 from config import (
     IS_PRODUCTION, SECRET_KEY, SESSION_TIMEOUT, DATABASE_URI,
-    ALLOWED_ORIGINS, RATE_LIMIT_DEFAULT, RATE_LIMIT_LOGIN,
-    RATE_LIMIT_REGISTER, RATE_LIMIT_CHAT, RATE_LIMIT_TTS
+    ALLOWED_ORIGINS, RATE_LIMIT_CHAT, RATE_LIMIT_TTS, SECURITY_LOGGING,
+    WARM_UP_DB_CONNECTIONS
+)
+from utils.security import log_security_event, setup_security_logging
+from utils.rate_limit import limiter
+from utils.compression import compress_response
+from utils.static_assets import (
+    FastPathSessionInterface, is_fast_path, add_static_version,
+    send_static, compress_static_files
 )
-from utils.security import log_security_event
-
-# Import route blueprints
-from routes import auth_bp, chat_bp, tts_bp, conversation_bp, vocabulary_bp
-
-
-# ==================== APP INITIALIZATION ====================
-
-app = Flask(__name__)
-
-# ==================== APP CONFIGURATION ====================
-
-app.config['SECRET_KEY'] = SECRET_KEY
-
-# Session security
-app.config['SESSION_COOKIE_SECURE'] = IS_PRODUCTION
-app.config['SESSION_COOKIE_HTTPONLY'] = True
-app.config['SESSION_COOKIE_SAMESITE'] = 'Strict' if IS_PRODUCTION else 'Lax'
-app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=SESSION_TIMEOUT)
-app.config['SESSION_COOKIE_NAME'] = '__Host-session' if IS_PRODUCTION else 'session'
-app.config['REMEMBER_COOKIE_DURATION'] = timedelta(hours=SESSION_TIMEOUT)
-app.config['REMEMBER_COOKIE_SECURE'] = IS_PRODUCTION
-app.config['REMEMBER_COOKIE_HTTPONLY'] = True
-app.config['REMEMBER_COOKIE_SAMESITE'] = 'Strict' if IS_PRODUCTION else 'Lax'
-
-# CSRF Protection
-app.config['WTF_CSRF_ENABLED'] = True
-app.config['WTF_CSRF_TIME_LIMIT'] = 3600
-app.config['WTF_CSRF_SSL_STRICT'] = IS_PRODUCTION
-
-# JSON security
-app.config['JSON_SORT_KEYS'] = False
-app.config['JSONIFY_PRETTYPRINT_REGULAR'] = False
-
-# Request size limit (prevent DoS)
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
-
-# Database
-app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URI
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    'pool_pre_ping': True,
-    'pool_recycle': 300,
-}
-
-
-# ==================== INITIALIZE EXTENSIONS ====================
-
-db.init_app(app)
-migrate = Migrate(app, db)
-
-# CSRF Protection
-csrf = CSRFProtect(app)
 
-# Rate Limiting
-def get_rate_limit_key():
-    """Get rate limit key - use user ID if logged in, else IP"""
-    if hasattr(current_user, 'id') and current_user.is_authenticated:
-        return f"user:{current_user.id}"
-    return get_remote_address()
 
-limiter = Limiter(
-    key_func=get_rate_limit_key,
-    app=app,
-    default_limits=[f"{RATE_LIMIT_DEFAULT} per hour"],
-    storage_uri="memory://",
-)
+# ==================== EXTENSIONS ====================
 
-# CORS
-if IS_PRODUCTION:
-    CORS(app, 
-         origins=ALLOWED_ORIGINS,
-         supports_credentials=True,
-         allow_headers=['Content-Type', 'X-CSRFToken', 'Authorization'],
-         methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
-else:
-    CORS(app, 
-         origins=['http://localhost:5000', 'http://127.0.0.1:5000'],
-         supports_credentials=True)
-
-# Security Headers (Talisman)
-if IS_PRODUCTION:
-    csp = {
-        'default-src': "'self'",
-        'script-src': "'self'",
-        'style-src': "'self' 'unsafe-inline' https://fonts.googleapis.com",
-        'font-src': "'self' https://fonts.gstatic.com",
-        'img-src': "'self' data:",
-        'connect-src': "'self'",
-        'frame-ancestors': "'none'",
-        'base-uri': "'self'",
-        'form-action': "'self'",
-        'upgrade-insecure-requests': True,
-    }
-    Talisman(
-        app,
-        content_security_policy=csp,
-        force_https=True,
-        strict_transport_security=True,
-        strict_transport_security_max_age=31536000,
-        strict_transport_security_include_subdomains=True,
-        strict_transport_security_preload=True,
-        x_content_type_options=True,
-        x_xss_protection=True,
-        referrer_policy='strict-origin-when-cross-origin',
-        session_cookie_secure=True,
-        session_cookie_http_only=True,
-    )
-
-# Login Manager
+migrate = Migrate()
+csrf = CSRFProtect()
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'auth.login_page'
 login_manager.session_protection = 'strong'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Import lúc dùng: import app không kéo theo services/ (models, SQLAlchemy mapper...)
+    from services.user_cache_service import user_cache
+    return user_cache.load(int(user_id))
 
 @login_manager.unauthorized_handler
 def unauthorized():
@@ -148,145 +55,376 @@ def unauthorized():
     return redirect(url_for('auth.login_page'))
 
 
-# ==================== REGISTER BLUEPRINTS ====================
+# ==================== APP FACTORY ====================
+
+def create_app(start_background=False):
+    """
+    Mặc định không start thread nền: Flask CLI (flask db upgrade, init-db...) và gunicorn
+    preload (tạo app ở master, thread không sống qua fork) đều gọi create_app().
+    Thread nền chỉ start ở process phục vụ request: post_worker_init (gunicorn.conf.py)
+    và `python app.py`.
+    """
+    app = Flask(__name__)
+    configure_app(app)
+
+    if SECURITY_LOGGING:
+        setup_security_logging()
+
+    init_extensions(app)
+    register_static(app)
+    register_blueprints(app)
+    register_middleware(app)
+    register_main_routes(app)
+    register_error_handlers(app)
+    register_commands(app)
+
+    if start_background:
+        start_background_workers(app)
+
+    return app
+
+
+def start_background_workers(app):
+    # Purge soft-deleted conversations off the request path
+    from services.maintenance_service import maintenance_worker
+    maintenance_worker.start(app)
+
+
+# ==================== WARM-UP ====================
+
+def warm_imports():
+    """Import các module nặng được import lazy (gọi ở gunicorn master để worker fork dùng chung)"""
+    import bleach  # noqa: F401
+    import edge_tts  # noqa: F401
+    import openai  # noqa: F401
+
+
+def warm_up(app):
+    """
+    Chuẩn bị worker trước khi nhận request (gunicorn post_worker_init): mở sẵn kết nối DB,
+    build mapper, template, DeepSeek client, process pool hash mật khẩu để request đầu tiên
+    không chịu chi phí khởi tạo.
+    """
+    from sqlalchemy import text
+    from sqlalchemy.orm import configure_mappers
+    from services.ai_service import get_client
+    from utils.passwords import password_hasher
+
+    try:
+        warm_imports()
+        get_client()
+        password_hasher.start()
+        configure_mappers()
+        for template in ('home.html', 'index.html'):
+            app.jinja_env.get_template(template)
+
+        with app.app_context():
+            # Kết nối kế thừa từ master (preload) không được dùng chung giữa các process
+            db.engine.dispose(close=False)
+            pool_size = getattr(db.engine.pool, 'size', lambda: 1)()
+            connections = []
+            try:
+                for _ in range(max(1, min(WARM_UP_DB_CONNECTIONS, pool_size))):
+                    connection = db.engine.connect()
+                    connections.append(connection)
+                    connection.execute(text("SELECT 1"))
+            finally:
+                # Trả về pool, vẫn giữ mở
+                for connection in connections:
+                    connection.close()
+    except Exception as e:
+        log_security_event('WARM_UP_ERROR', f"Worker warm-up failed: {str(e)[:100]}")
+
 
-app.register_blueprint(auth_bp)
-app.register_blueprint(chat_bp)
-app.register_blueprint(tts_bp)
-app.register_blueprint(conversation_bp)
-app.register_blueprint(vocabulary_bp)
+# ==================== APP CONFIGURATION ====================
 
-# Exempt CSRF for routes that don't use secureFetch
-# Tất cả routes đều có login_required nên vẫn an toàn
-csrf.exempt(auth_bp)          # user chưa có session
-csrf.exempt(chat_bp)          # streaming endpoint
-csrf.exempt(tts_bp)           # audio generation + voices
-csrf.exempt(conversation_bp)  # conversations API
-csrf.exempt(vocabulary_bp)    # vocabularies API
+def configure_app(app):
+    app.config['SECRET_KEY'] = SECRET_KEY
+
+    # Session security
+    app.config['SESSION_COOKIE_SECURE'] = IS_PRODUCTION
+    app.config['SESSION_COOKIE_HTTPONLY'] = True
+    app.config['SESSION_COOKIE_SAMESITE'] = 'Strict' if IS_PRODUCTION else 'Lax'
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=SESSION_TIMEOUT)
+    app.config['SESSION_COOKIE_NAME'] = '__Host-session' if IS_PRODUCTION else 'session'
+    app.config['REMEMBER_COOKIE_DURATION'] = timedelta(hours=SESSION_TIMEOUT)
+    app.config['REMEMBER_COOKIE_SECURE'] = IS_PRODUCTION
+    app.config['REMEMBER_COOKIE_HTTPONLY'] = True
+    app.config['REMEMBER_COOKIE_SAMESITE'] = 'Strict' if IS_PRODUCTION else 'Lax'
+
+    # CSRF Protection
+    app.config['WTF_CSRF_ENABLED'] = True
+    app.config['WTF_CSRF_TIME_LIMIT'] = 3600
+    app.config['WTF_CSRF_SSL_STRICT'] = IS_PRODUCTION
+
+    # JSON security
+    app.config['JSON_SORT_KEYS'] = False
+    app.config['JSONIFY_PRETTYPRINT_REGULAR'] = False
+
+    # Request size limit (prevent DoS)
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
+
+    # Database
+    app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URI
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_pre_ping': True,
+        'pool_recycle': 300,
+    }
 
+    # /static, /health không mở/ghi cookie session
+    app.session_interface = FastPathSessionInterface()
 
-# ==================== MIDDLEWARE ====================
 
-@app.before_request
-def make_session_permanent():
-    from flask import session
-    session.permanent = True
+# ==================== INITIALIZE EXTENSIONS ====================
 
-@app.before_request
-def validate_origin():
-    """Validate request origin in production"""
-    if not IS_PRODUCTION:
-        return None
-    
-    if request.path.startswith('/static/'):
-        return None
-    
-    if request.method == 'GET' and not request.path.startswith('/api/'):
-        return None
-    
-    origin = request.headers.get('Origin')
-    referer = request.headers.get('Referer')
-    
-    if request.path.startswith('/api/') or request.method in ['POST', 'PUT', 'DELETE']:
-        if origin:
-            if origin not in ALLOWED_ORIGINS:
-                log_security_event('BLOCKED_ORIGIN', f"Blocked request from origin: {origin}")
-                return jsonify({"error": "Origin not allowed"}), 403
-        elif referer:
-            referer_origin = '/'.join(referer.split('/')[:3])
-            if referer_origin not in ALLOWED_ORIGINS:
-                log_security_event('BLOCKED_REFERER', f"Blocked request from referer: {referer}")
-                return jsonify({"error": "Origin not allowed"}), 403
-    
-    return None
-
-@app.after_request
-def add_security_headers(response):
-    """Add security headers to all responses"""
-    response.headers['X-Frame-Options'] = 'DENY'
-    response.headers['X-Content-Type-Options'] = 'nosniff'
-    response.headers['X-XSS-Protection'] = '1; mode=block'
-    response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
-    response.headers['Permissions-Policy'] = 'geolocation=(), microphone=(self), camera=()'
-    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, private'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers.pop('Server', None)
-    return response
+def init_extensions(app):
+    db.init_app(app)
+    migrate.init_app(app, db)
 
+    # CSRF Protection
+    csrf.init_app(app)
 
-# ==================== MAIN ROUTES ====================
+    # Rate Limiting (storage dùng chung giữa các worker - utils/rate_limit.py)
+    limiter.init_app(app)
 
-@app.route("/")
-def home():
-    """Landing page - accessible to all users"""
-    if current_user.is_authenticated:
-        return redirect(url_for('index'))
-    return render_template("home.html")
+    # CORS
+    if IS_PRODUCTION:
+        CORS(app,
+             origins=ALLOWED_ORIGINS,
+             supports_credentials=True,
+             allow_headers=['Content-Type', 'X-CSRFToken', 'Authorization', 'Idempotency-Key'],
+             methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
+    else:
+        CORS(app,
+             origins=['http://localhost:5000', 'http://127.0.0.1:5000'],
+             supports_credentials=True)
 
-@app.route("/app")
-@login_required
-def index():
-    return render_template("index.html")
+    # Security Headers (Talisman)
+    if IS_PRODUCTION:
+        from flask_talisman import Talisman
+        csp = {
+            'default-src': "'self'",
+            'script-src': "'self'",
+            'style-src': "'self' 'unsafe-inline' https://fonts.googleapis.com",
+            'font-src': "'self' https://fonts.gstatic.com",
+            'img-src': "'self' data:",
+            'connect-src': "'self'",
+            'frame-ancestors': "'none'",
+            'base-uri': "'self'",
+            'form-action': "'self'",
+            'upgrade-insecure-requests': True,
+        }
+        Talisman(
+            app,
+            content_security_policy=csp,
+            force_https=True,
+            strict_transport_security=True,
+            strict_transport_security_max_age=31536000,
+            strict_transport_security_include_subdomains=True,
+            strict_transport_security_preload=True,
+            x_content_type_options=True,
+            x_xss_protection=True,
+            referrer_policy='strict-origin-when-cross-origin',
+            session_cookie_secure=True,
+            session_cookie_http_only=True,
+        )
+
+    # Login Manager
+    login_manager.init_app(app)
+
+
+# ==================== STATIC ASSETS ====================
+
+def register_static(app):
+    # url_for('static') có ?v=<hash>, serve file .br/.gz nén sẵn
+    app.url_defaults(add_static_version)
+    app.view_functions['static'] = send_static
 
-@csrf.exempt
-@app.route('/api/csrf-token', methods=['GET'])
-@limiter.limit("30 per minute")
-def get_csrf_token():
-    """Get CSRF token for API requests"""
-    return jsonify({'csrf_token': generate_csrf()})
 
-@app.route("/health", methods=["GET"])
-@limiter.exempt
-def health_check():
-    """Health check endpoint for load balancers"""
-    return jsonify({"status": "healthy", "timestamp": datetime.utcnow().isoformat()})
+# ==================== REGISTER BLUEPRINTS ====================
 
+def register_blueprints(app):
+    # Import routes kéo theo services - chỉ khi tạo app
+    from routes import auth_bp, chat_bp, tts_bp, conversation_bp, vocabulary_bp, search_bp
 
-# ==================== ERROR HANDLERS ====================
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(chat_bp)
+    app.register_blueprint(tts_bp)
+    app.register_blueprint(conversation_bp)
+    app.register_blueprint(vocabulary_bp)
+    app.register_blueprint(search_bp)
 
-@app.errorhandler(429)
-def ratelimit_handler(e):
-    log_security_event('RATE_LIMIT', f"Rate limit exceeded: {request.path}")
-    return jsonify({"error": "Quá nhiều request. Vui lòng thử lại sau."}), 429
+    # Exempt CSRF for routes that don't use secureFetch
+    # Tất cả routes đều có login_required nên vẫn an toàn
+    csrf.exempt(auth_bp)          # user chưa có session
+    csrf.exempt(chat_bp)          # streaming endpoint
+    csrf.exempt(tts_bp)           # audio generation + voices
+    csrf.exempt(conversation_bp)  # conversations API
+    csrf.exempt(vocabulary_bp)    # vocabularies API
+    csrf.exempt(search_bp)        # search API (GET only)
 
-@app.errorhandler(400)
-def bad_request_handler(e):
-    return jsonify({"error": "Bad request"}), 400
+    # Per-endpoint rate limits
+    limiter.limit(f"{RATE_LIMIT_CHAT} per minute")(chat_bp)
+    limiter.limit(f"{RATE_LIMIT_TTS} per minute")(tts_bp)
 
-@app.errorhandler(403)
-def forbidden_handler(e):
-    log_security_event('FORBIDDEN', f"Forbidden access: {request.path}")
-    return jsonify({"error": "Forbidden"}), 403
 
-@app.errorhandler(404)
-def not_found_handler(e):
-    if request.is_json or request.path.startswith('/api/'):
-        return jsonify({"error": "Not found"}), 404
-    return redirect(url_for('auth.login_page'))
+# ==================== MIDDLEWARE ====================
 
-@app.errorhandler(413)
-def request_entity_too_large(e):
-    log_security_event('PAYLOAD_TOO_LARGE', f"Request too large: {request.path}")
-    return jsonify({"error": "Request quá lớn"}), 413
+def register_middleware(app):
+    @app.before_request
+    def make_session_permanent():
+        if is_fast_path(request.path):
+            return
+        from flask import session
+        # Chỉ set 1 lần, tránh đánh dấu session modified ở mọi request
+        if not session.permanent:
+            session.permanent = True
+
+    @app.before_request
+    def validate_origin():
+        """Validate request origin in production"""
+        if not IS_PRODUCTION:
+            return None
+
+        if is_fast_path(request.path):
+            return None
+
+        if request.method == 'GET' and not request.path.startswith('/api/'):
+            return None
+
+        origin = request.headers.get('Origin')
+        referer = request.headers.get('Referer')
+
+        if request.path.startswith('/api/') or request.method in ['POST', 'PUT', 'DELETE']:
+            if origin:
+                if origin not in ALLOWED_ORIGINS:
+                    log_security_event('BLOCKED_ORIGIN', f"Blocked request from origin: {origin}")
+                    return jsonify({"error": "Origin not allowed"}), 403
+            elif referer:
+                referer_origin = '/'.join(referer.split('/')[:3])
+                if referer_origin not in ALLOWED_ORIGINS:
+                    log_security_event('BLOCKED_REFERER', f"Blocked request from referer: {referer}")
+                    return jsonify({"error": "Origin not allowed"}), 403
 
-@app.errorhandler(500)
-def internal_error_handler(e):
-    db.session.rollback()
-    log_security_event('SERVER_ERROR', f"Internal error: {str(e)[:100]}")
-    return jsonify({"error": "Internal server error"}), 500
+        return None
+
+    @app.after_request
+    def add_security_headers(response):
+        """Add security headers to all responses"""
+        response.headers['X-Frame-Options'] = 'DENY'
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        response.headers['X-XSS-Protection'] = '1; mode=block'
+        response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
+        response.headers['Permissions-Policy'] = 'geolocation=(), microphone=(self), camera=()'
+        # File tĩnh tự đặt Cache-Control (send_static)
+        if request.endpoint != 'static':
+            response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, private'
+            response.headers['Pragma'] = 'no-cache'
+        response.headers.pop('Server', None)
+        return response
+
+    # gzip/br cho JSON/HTML lớn (bỏ qua stream SSE, audio, file)
+    app.after_request(compress_response)
 
 
-# ==================== CREATE TABLES ====================
+# ==================== MAIN ROUTES ====================
 
-with app.app_context():
-    db.create_all()
+def register_main_routes(app):
+    @app.route("/")
+    def home():
+        """Landing page - accessible to all users"""
+        if current_user.is_authenticated:
+            return redirect(url_for('index'))
+        return render_template("home.html")
+
+    @app.route("/app")
+    @login_required
+    def index():
+        return render_template("index.html")
+
+    @csrf.exempt
+    @app.route('/api/csrf-token', methods=['GET'])
+    @limiter.limit("30 per minute")
+    def get_csrf_token():
+        """Get CSRF token for API requests"""
+        return jsonify({'csrf_token': generate_csrf()})
+
+    @app.route("/health", methods=["GET"])
+    @limiter.exempt
+    def health_check():
+        """Health check endpoint for load balancers"""
+        from services.speculative_service import speculative_store
+        return jsonify({
+            "status": "healthy",
+            "timestamp": datetime.utcnow().isoformat(),
+            "speculative": speculative_store.metrics.snapshot()
+        })
+
+
+# ==================== ERROR HANDLERS ====================
+
+def register_error_handlers(app):
+    @app.errorhandler(429)
+    def ratelimit_handler(e):
+        log_security_event('RATE_LIMIT', f"Rate limit exceeded: {request.path}")
+        return jsonify({"error": "Quá nhiều request. Vui lòng thử lại sau."}), 429
+
+    @app.errorhandler(400)
+    def bad_request_handler(e):
+        return jsonify({"error": "Bad request"}), 400
+
+    @app.errorhandler(403)
+    def forbidden_handler(e):
+        log_security_event('FORBIDDEN', f"Forbidden access: {request.path}")
+        return jsonify({"error": "Forbidden"}), 403
+
+    @app.errorhandler(404)
+    def not_found_handler(e):
+        if request.is_json or request.path.startswith('/api/'):
+            return jsonify({"error": "Not found"}), 404
+        return redirect(url_for('auth.login_page'))
+
+    @app.errorhandler(413)
+    def request_entity_too_large(e):
+        log_security_event('PAYLOAD_TOO_LARGE', f"Request too large: {request.path}")
+        return jsonify({"error": "Request quá lớn"}), 413
+
+    @app.errorhandler(500)
+    def internal_error_handler(e):
+        db.session.rollback()
+        log_security_event('SERVER_ERROR', f"Internal error: {str(e)[:100]}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+# ==================== CLI ====================
+
+def register_commands(app):
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Tạo bảng + index full-text trực tiếp (dev/test nhanh; production dùng flask db upgrade)"""
+        from services.search_service import ensure_search_index
+        db.create_all()
+        ensure_search_index()
+        click.echo("Database initialized. Run 'flask db stamp head' before using migrations on this database.")
+
+    @app.cli.command('compress-static')
+    def compress_static_command():
+        """Tạo file .gz/.br nén sẵn cho static/ (chạy lại mỗi lần deploy)"""
+        count, has_brotli = compress_static_files(app.static_folder)
+        click.echo(f"Compressed {count} files" + ("" if has_brotli else " (gzip only, pip install brotli for .br)"))
 
 
 # ==================== MAIN ====================
 
 if __name__ == "__main__":
     if IS_PRODUCTION:
-        app.run(host='0.0.0.0', port=5000, debug=False)
-    else:
-        # Enable threading to handle multiple TTS requests concurrently
-        app.run(debug=True, port=5000, host='127.0.0.1', threaded=True)
+        raise SystemExit("Production: gunicorn -c gunicorn.conf.py (Werkzeug dev server không dùng cho production)")
+    from werkzeug.serving import is_running_from_reloader
+
+    dev_app = create_app()
+    # debug=True bật reloader: process cha chỉ theo dõi file, thread nền chạy ở process con phục vụ request
+    if is_running_from_reloader():
+        start_background_workers(dev_app)
+    # Enable threading to handle multiple TTS requests concurrently
+    dev_app.run(debug=True, port=5000, host='127.0.0.1', threaded=True)
@@ -27,12 +27,68 @@ MAX_LOGIN_ATTEMPTS = int(os.getenv('MAX_LOGIN_ATTEMPTS', 5))
 LOCKOUT_DURATION = int(os.getenv('LOCKOUT_DURATION_MINUTES', 30))
 TOKEN_LIMIT_PER_USER = int(os.getenv('TOKEN_LIMIT_PER_USER', 100000))
 
+# ==================== SECURITY LOGGING ====================
+SECURITY_LOGGING = os.getenv('SECURITY_LOGGING', 'true').lower() == 'true'
+SECURITY_LOG_QUEUE_SIZE = int(os.getenv('SECURITY_LOG_QUEUE_SIZE', 10000))  # Queue đầy thì bỏ record (có đếm)
+SECURITY_LOG_SAMPLE_WINDOW = int(os.getenv('SECURITY_LOG_SAMPLE_WINDOW_SECONDS', 60))
+SECURITY_LOG_SAMPLE_MAX = int(os.getenv('SECURITY_LOG_SAMPLE_MAX', 5))  # Bản ghi đầy đủ / (event, ip) / window cho RATE_LIMIT
+
+# ==================== PASSWORD HASHING ====================
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')  # Hoặc scrypt:32768:8:1 (memory-hard)
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))  # Process hash / worker (0 = chạy trên request thread)
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 16))  # Quá số này -> 503
+PASSWORD_HASH_TIMEOUT = int(os.getenv('PASSWORD_HASH_TIMEOUT_SECONDS', 10))
+
+# ==================== USER CACHE ====================
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL_SECONDS', 30))  # Cache user cho load_user / process (0 = tắt)
+USER_CACHE_MAX_SIZE = int(os.getenv('USER_CACHE_MAX_SIZE', 10000))
+
 # ==================== RATE LIMITS ====================
 RATE_LIMIT_LOGIN = os.getenv('RATE_LIMIT_LOGIN', '10')
 RATE_LIMIT_REGISTER = os.getenv('RATE_LIMIT_REGISTER', '5')
 RATE_LIMIT_CHAT = os.getenv('RATE_LIMIT_CHAT', '60')
 RATE_LIMIT_TTS = os.getenv('RATE_LIMIT_TTS', '200')  # Increased for TTS prefetch
 RATE_LIMIT_DEFAULT = os.getenv('RATE_LIMIT_DEFAULT', '200')
+RATE_LIMIT_STORAGE_URI = os.getenv('RATE_LIMIT_STORAGE_URI', 'sqlite:///rate_limits.db')  # Dùng chung giữa các worker (hoặc memory://, redis://...)
+
+# ==================== CHAT ADMISSION ====================
+CHAT_MAX_CONCURRENT = int(os.getenv('CHAT_MAX_CONCURRENT', 8))  # Tổng số stream LLM đồng thời / process
+CHAT_MAX_PER_USER = int(os.getenv('CHAT_MAX_PER_USER', 1))  # Số stream đồng thời / user
+CHAT_MAX_QUEUED_PER_USER = int(os.getenv('CHAT_MAX_QUEUED_PER_USER', 3))
+CHAT_QUEUE_TIMEOUT = int(os.getenv('CHAT_QUEUE_TIMEOUT_SECONDS', 60))
+CHAT_IDEMPOTENCY_TTL = int(os.getenv('CHAT_IDEMPOTENCY_TTL_SECONDS', 600))  # Cửa sổ dedupe Idempotency-Key
+
+# ==================== SPECULATIVE GENERATION ====================
+SPECULATIVE_MAX_TOKENS = int(os.getenv('SPECULATIVE_MAX_TOKENS', 800))  # Budget completion / speculation
+SPECULATIVE_MAX_CONCURRENT = int(os.getenv('SPECULATIVE_MAX_CONCURRENT', 2))  # / process
+SPECULATIVE_TIMEOUT = int(os.getenv('SPECULATIVE_TIMEOUT_SECONDS', 20))
+SPECULATIVE_TTL = int(os.getenv('SPECULATIVE_TTL_SECONDS', 600))
+
+# ==================== MAINTENANCE ====================
+CONVERSATION_RESTORE_SECONDS = int(os.getenv('CONVERSATION_RESTORE_SECONDS', 15))  # Cửa sổ hoàn tác xóa
+MAINTENANCE_INTERVAL = int(os.getenv('MAINTENANCE_INTERVAL_SECONDS', 60))  # Chu kỳ job nền / process
+PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', 200))  # Số conversation xóa hẳn / transaction
+PENDING_MESSAGE_TIMEOUT = int(os.getenv('PENDING_MESSAGE_TIMEOUT_SECONDS', 900))  # Message pending lâu hơn coi như bị bỏ dở
+
+# ==================== COLD ARCHIVE ====================
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 90))  # Conversation không hoạt động lâu hơn -> nén messages (0 = tắt)
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 50))  # Số conversation archive / lần chạy job
+
+# ==================== RESPONSE COMPRESSION ====================
+RESPONSE_COMPRESSION = os.getenv('RESPONSE_COMPRESSION', 'true').lower() == 'true'  # gzip/br cho JSON/HTML (tắt nếu proxy đã nén)
+RESPONSE_COMPRESS_MIN_SIZE = int(os.getenv('RESPONSE_COMPRESS_MIN_SIZE', 1024))  # Byte - nhỏ hơn thì không đáng nén
+
+# ==================== SERVER (gunicorn.conf.py) ====================
+GUNICORN_BIND = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+GUNICORN_WORKER_CLASS = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')  # gthread | gevent
+GUNICORN_WORKERS = int(os.getenv('GUNICORN_WORKERS', 0))  # 0 = số CPU
+GUNICORN_THREADS = int(os.getenv('GUNICORN_THREADS', 16))  # / worker (gthread) - mỗi SSE stream giữ 1 thread
+GUNICORN_WORKER_CONNECTIONS = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))  # / worker (gevent)
+GUNICORN_PRELOAD = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'  # Tắt khi dùng gevent
+GUNICORN_TIMEOUT = int(os.getenv('GUNICORN_TIMEOUT_SECONDS', 60))  # Heartbeat worker, không giới hạn SSE với gthread/gevent
+GUNICORN_GRACEFUL_TIMEOUT = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT_SECONDS', 120))  # Chờ stream đang chạy khi reload/stop
+GUNICORN_KEEPALIVE = int(os.getenv('GUNICORN_KEEPALIVE_SECONDS', 5))
+WARM_UP_DB_CONNECTIONS = int(os.getenv('WARM_UP_DB_CONNECTIONS', 5))  # Kết nối mở sẵn / worker trước khi nhận request
 
 # ==================== ALLOWED ORIGINS ====================
 def get_allowed_origins():
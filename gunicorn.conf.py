@@ -0,0 +1,58 @@
+"""
+Gunicorn config - production entry point
+
+    gunicorn -c gunicorn.conf.py
+
+Workload: SSE chat stream dài (giữ 1 thread/greenlet suốt thời gian sinh) xen với
+request TTS/API ngắn. Worker gthread (mặc định) hoặc gevent nên stream dài không chặn
+request khác; `timeout` chỉ là heartbeat của worker, không cắt stream.
+Cấu hình qua env (xem config.py, .env.example).
+"""
+
+import multiprocessing
+import os
+
+from config import (
+    GUNICORN_BIND, GUNICORN_WORKER_CLASS, GUNICORN_WORKERS, GUNICORN_THREADS,
+    GUNICORN_WORKER_CONNECTIONS, GUNICORN_PRELOAD, GUNICORN_TIMEOUT,
+    GUNICORN_GRACEFUL_TIMEOUT, GUNICORN_KEEPALIVE
+)
+
+
+# App tạo 1 lần (ở master nếu preload); create_app() không start thread nền,
+# post_worker_init start trong từng worker
+wsgi_app = 'app:create_app()'
+
+bind = GUNICORN_BIND
+worker_class = GUNICORN_WORKER_CLASS
+workers = GUNICORN_WORKERS or multiprocessing.cpu_count()
+threads = GUNICORN_THREADS
+worker_connections = GUNICORN_WORKER_CONNECTIONS
+preload_app = GUNICORN_PRELOAD
+
+timeout = GUNICORN_TIMEOUT
+graceful_timeout = GUNICORN_GRACEFUL_TIMEOUT
+keepalive = GUNICORN_KEEPALIVE
+
+# Heartbeat file trên tmpfs (tránh worker bị coi là treo khi disk chậm, vd. Docker)
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = '-'
+errorlog = '-'
+
+
+# ==================== HOOKS ====================
+
+def when_ready(server):
+    # preload: import module nặng 1 lần ở master, worker fork dùng chung (copy-on-write)
+    if preload_app:
+        from app import warm_imports
+        warm_imports()
+
+
+def post_worker_init(worker):
+    # Chạy trong worker sau khi load app, trước khi nhận request
+    from app import warm_up, start_background_workers
+    warm_up(worker.wsgi)
+    start_background_workers(worker.wsgi)
@@ -0,0 +1,23 @@
+"""Add parsed segments column to messages
+
+Revision ID: 007_add_message_segments
+Revises: 006_add_security_fields
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '007_add_message_segments'
+down_revision = '006_add_security_fields'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Parsed (JSON) form of assistant content; NULL for old rows - parsed lazily by clients
+    op.add_column('messages', sa.Column('segments', sa.Text(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('messages', 'segments')
@@ -0,0 +1,25 @@
+"""Add index for keyset-paginated conversation list
+
+Revision ID: 008_add_conversation_list_index
+Revises: 007_add_message_segments
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+
+revision = '008_add_conversation_list_index'
+down_revision = '007_add_message_segments'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # GET /api/conversations: WHERE user_id, is_deleted ORDER BY updated_at DESC, id DESC
+    op.create_index(
+        'ix_conversations_user_list', 'conversations',
+        ['user_id', 'is_deleted', 'updated_at', 'id']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_conversations_user_list', table_name='conversations')
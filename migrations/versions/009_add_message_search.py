@@ -0,0 +1,56 @@
+"""Add full-text search index over messages
+
+Revision ID: 009_add_message_search
+Revises: 008_add_conversation_list_index
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+
+revision = '009_add_message_search'
+down_revision = '008_add_conversation_list_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'mysql':
+        op.execute("ALTER TABLE messages ADD FULLTEXT INDEX ft_messages_content (content)")
+        return
+    
+    # SQLite: FTS5 table synced by triggers when a message becomes 'completed'
+    op.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS message_search USING fts5(
+        content, tokenize = 'unicode61 remove_diacritics 2'
+    )""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS message_search_complete
+    AFTER UPDATE OF status, content ON messages WHEN new.status = 'completed'
+    BEGIN
+        DELETE FROM message_search WHERE rowid = new.id;
+        INSERT INTO message_search (rowid, content) VALUES (new.id, new.content);
+    END""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS message_search_insert
+    AFTER INSERT ON messages WHEN new.status = 'completed'
+    BEGIN
+        INSERT INTO message_search (rowid, content) VALUES (new.id, new.content);
+    END""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS message_search_delete
+    AFTER DELETE ON messages
+    BEGIN
+        DELETE FROM message_search WHERE rowid = old.id;
+    END""")
+    op.execute("DELETE FROM message_search")
+    op.execute(
+        "INSERT INTO message_search (rowid, content) "
+        "SELECT id, content FROM messages WHERE status = 'completed'"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'mysql':
+        op.execute("ALTER TABLE messages DROP INDEX ft_messages_content")
+        return
+    
+    op.execute("DROP TRIGGER IF EXISTS message_search_delete")
+    op.execute("DROP TRIGGER IF EXISTS message_search_insert")
+    op.execute("DROP TRIGGER IF EXISTS message_search_complete")
+    op.execute("DROP TABLE IF EXISTS message_search")
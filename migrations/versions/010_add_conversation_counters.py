@@ -0,0 +1,106 @@
+"""Add denormalized message counters and last-message preview to conversations
+
+Revision ID: 010_add_conversation_counters
+Revises: 009_add_message_search
+Create Date: 2026-10-19
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '010_add_conversation_counters'
+down_revision = '009_add_message_search'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 500
+
+# Giữ đồng bộ với utils.message_parser.message_preview (migration không import code app)
+TAG_PATTERN = re.compile(r'\[(Vietsub|Engsub|Table|Tip|List|Actions)\]', re.IGNORECASE)
+BOLD_PATTERN = re.compile(r'\*\*([^*]+)\*\*')
+MARKDOWN_PATTERN = re.compile(r'[*#_`~]')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+PREVIEW_LENGTH = 120
+
+
+def message_preview(text):
+    text = text or ''
+    matches = list(TAG_PATTERN.finditer(text))
+    if matches:
+        parts = []
+        for i, match in enumerate(matches):
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+            if match.group(1).lower() != 'actions':
+                parts.append(text[match.end():end].strip())
+        text = ' '.join(part for part in parts if part)
+    preview = MARKDOWN_PATTERN.sub('', BOLD_PATTERN.sub(r'\1', text))
+    preview = WHITESPACE_PATTERN.sub(' ', preview).strip()
+    if len(preview) > PREVIEW_LENGTH:
+        preview = preview[:PREVIEW_LENGTH - 1].rstrip() + '…'
+    return preview
+
+
+def upgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('message_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('completed_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('last_message_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('last_message_preview', sa.String(length=200), nullable=True))
+
+    # Backfill counters (set-based)
+    op.execute("""
+        UPDATE conversations SET
+            message_count = (SELECT COUNT(*) FROM messages m WHERE m.conversation_id = conversations.id),
+            completed_count = (SELECT COUNT(*) FROM messages m
+                               WHERE m.conversation_id = conversations.id AND m.status = 'completed'),
+            last_message_at = (SELECT MAX(m.created_at) FROM messages m
+                               WHERE m.conversation_id = conversations.id AND m.status = 'completed')
+    """)
+
+    # Preview cần bỏ tag/markdown nên tính bằng Python. Đọc theo khoảng id conversation
+    # (keyset) để bộ nhớ chỉ giữ 1 batch nội dung message, không phải toàn bộ bảng
+    bind = op.get_bind()
+    conversations = sa.table('conversations', sa.column('id'), sa.column('last_message_preview'))
+    statement = conversations.update().where(
+        conversations.c.id == sa.bindparam('conv_id')
+    ).values(last_message_preview=sa.bindparam('preview'))
+    select_ids = sa.text("""
+        SELECT id FROM conversations
+        WHERE id > :last_id AND last_message_at IS NOT NULL
+        ORDER BY id
+        LIMIT :limit
+    """)
+    select_contents = sa.text("""
+        SELECT c.id, m.content
+        FROM conversations c
+        JOIN messages m ON m.conversation_id = c.id
+            AND m.status = 'completed' AND m.created_at = c.last_message_at
+        WHERE c.id IN :ids
+        ORDER BY m.id
+    """).bindparams(sa.bindparam('ids', expanding=True))
+
+    last_id = ''
+    while True:
+        ids = [row[0] for row in bind.execute(select_ids, {'last_id': last_id, 'limit': BACKFILL_BATCH_SIZE})]
+        if not ids:
+            break
+        # Trùng created_at: message có id lớn nhất ghi đè
+        previews = {
+            conv_id: message_preview(content) or None
+            for conv_id, content in bind.execute(select_contents, {'ids': ids})
+        }
+        if previews:
+            bind.execute(statement, [
+                {'conv_id': conv_id, 'preview': preview} for conv_id, preview in previews.items()
+            ])
+        last_id = ids[-1]
+
+
+def downgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.drop_column('last_message_preview')
+        batch_op.drop_column('last_message_at')
+        batch_op.drop_column('completed_count')
+        batch_op.drop_column('message_count')
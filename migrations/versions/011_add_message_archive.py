@@ -0,0 +1,41 @@
+"""Add cold archive table for messages of inactive conversations
+
+Revision ID: 011_add_message_archive
+Revises: 010_add_conversation_counters
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '011_add_message_archive'
+down_revision = '010_add_conversation_counters'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_archived', sa.Boolean(), nullable=False, server_default=sa.false()))
+        batch_op.add_column(sa.Column('archived_at', sa.DateTime(), nullable=True))
+
+    # zlib-compressed JSON blocks (services/archive_service.py)
+    op.create_table(
+        'message_archives',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('conversation_id', sa.String(length=36), sa.ForeignKey('conversations.id'), nullable=False),
+        sa.Column('block_index', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('message_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('raw_size', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('data', sa.LargeBinary(length=16 * 1024 * 1024), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True)
+    )
+    op.create_index('ix_message_archives_conversation_id', 'message_archives', ['conversation_id'])
+
+
+def downgrade():
+    op.drop_index('ix_message_archives_conversation_id', table_name='message_archives')
+    op.drop_table('message_archives')
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.drop_column('archived_at')
+        batch_op.drop_column('is_archived')
@@ -0,0 +1,70 @@
+"""Add normalized word with unique index to vocabularies
+
+Revision ID: 012_add_vocabulary_normalized
+Revises: 011_add_message_archive
+Create Date: 2026-10-19
+"""
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '012_add_vocabulary_normalized'
+down_revision = '011_add_message_archive'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def normalize_word(word):
+    # Giữ đồng bộ với services/vocabulary_service.normalize_word
+    return ' '.join(unicodedata.normalize('NFKC', word or '').casefold().split())
+
+
+def upgrade():
+    with op.batch_alter_table('vocabularies', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('word_normalized', sa.String(length=200), nullable=True))
+
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT id, user_id, word, note FROM vocabularies ORDER BY user_id, id"
+    )).fetchall()
+
+    # Trùng sau khi chuẩn hóa: giữ bản cũ nhất, gộp ghi chú của các bản sau vào
+    kept = {}
+    duplicates = []
+    for vocab_id, user_id, word, note in rows:
+        key = (user_id, normalize_word(word))
+        if key not in kept:
+            kept[key] = {'vocab_id': vocab_id, 'normalized': key[1], 'note': note or ''}
+            continue
+        if note and note not in kept[key]['note']:
+            kept[key]['note'] = f"{kept[key]['note']}\n{note}" if kept[key]['note'] else note
+        duplicates.append(vocab_id)
+
+    vocabularies = sa.table(
+        'vocabularies', sa.column('id'), sa.column('word_normalized'), sa.column('note')
+    )
+    statement = vocabularies.update().where(
+        vocabularies.c.id == sa.bindparam('vocab_id')
+    ).values(word_normalized=sa.bindparam('normalized'), note=sa.bindparam('note'))
+
+    items = list(kept.values())
+    for start in range(0, len(items), BACKFILL_BATCH_SIZE):
+        bind.execute(statement, items[start:start + BACKFILL_BATCH_SIZE])
+    for start in range(0, len(duplicates), BACKFILL_BATCH_SIZE):
+        bind.execute(vocabularies.delete().where(
+            vocabularies.c.id.in_(duplicates[start:start + BACKFILL_BATCH_SIZE])
+        ))
+
+    with op.batch_alter_table('vocabularies', schema=None) as batch_op:
+        batch_op.alter_column('word_normalized', existing_type=sa.String(length=200), nullable=False)
+        batch_op.create_unique_constraint('uq_vocabularies_user_word', ['user_id', 'word_normalized'])
+
+
+def downgrade():
+    with op.batch_alter_table('vocabularies', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_vocabularies_user_word', type_='unique')
+        batch_op.drop_column('word_normalized')
@@ -0,0 +1,38 @@
+"""Add spaced-repetition scheduling fields to vocabularies
+
+Revision ID: 013_add_vocabulary_review
+Revises: 012_add_vocabulary_normalized
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '013_add_vocabulary_review'
+down_revision = '012_add_vocabulary_normalized'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('vocabularies', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('due_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('interval_days', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('ease', sa.Float(), nullable=False, server_default='2.5'))
+        batch_op.add_column(sa.Column('reps', sa.Integer(), nullable=False, server_default='0'))
+
+    # Từ đã lưu trước đây: đến hạn ngay, theo thứ tự đã lưu
+    op.execute("UPDATE vocabularies SET due_at = COALESCE(created_at, CURRENT_TIMESTAMP)")
+
+    with op.batch_alter_table('vocabularies', schema=None) as batch_op:
+        batch_op.alter_column('due_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index('ix_vocabularies_user_due', ['user_id', 'due_at'])
+
+
+def downgrade():
+    with op.batch_alter_table('vocabularies', schema=None) as batch_op:
+        batch_op.drop_index('ix_vocabularies_user_due')
+        batch_op.drop_column('reps')
+        batch_op.drop_column('ease')
+        batch_op.drop_column('interval_days')
+        batch_op.drop_column('due_at')
@@ -0,0 +1,25 @@
+"""Track when an archived conversation was last reopened
+
+Revision ID: 014_add_conversation_rehydrated_at
+Revises: 013_add_vocabulary_review
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '014_add_conversation_rehydrated_at'
+down_revision = '013_add_vocabulary_review'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Job archive bỏ qua conversation vừa được rehydrate (updated_at giữ nguyên khi mở lại)
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rehydrated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.drop_column('rehydrated_at')
@@ -0,0 +1,38 @@
+"""Store chat Idempotency-Keys in the database (shared by all workers)
+
+Revision ID: 015_add_chat_requests
+Revises: 014_add_conversation_rehydrated_at
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '015_add_chat_requests'
+down_revision = '014_add_conversation_rehydrated_at'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'chat_requests',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('key_digest', sa.String(length=32), nullable=False),
+        sa.Column('request_hash', sa.String(length=64), nullable=False),
+        sa.Column('conversation_id', sa.String(length=36), nullable=True),
+        sa.Column('user_message_id', sa.Integer(), nullable=True),
+        sa.Column('assistant_message_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'key_digest', name='uq_chat_requests_user_key')
+    )
+    op.create_index('ix_chat_requests_expires_at', 'chat_requests', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_chat_requests_expires_at', table_name='chat_requests')
+    op.drop_table('chat_requests')
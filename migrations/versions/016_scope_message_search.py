@@ -0,0 +1,90 @@
+"""Scope the message search index by user
+
+Revision ID: 016_scope_message_search
+Revises: 015_add_chat_requests
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+
+revision = '016_scope_message_search'
+down_revision = '015_add_chat_requests'
+branch_labels = None
+depends_on = None
+
+
+def drop_sqlite_search():
+    op.execute("DROP TRIGGER IF EXISTS message_search_delete")
+    op.execute("DROP TRIGGER IF EXISTS message_search_insert")
+    op.execute("DROP TRIGGER IF EXISTS message_search_complete")
+    op.execute("DROP TABLE IF EXISTS message_search")
+
+
+def upgrade():
+    # MySQL: FULLTEXT trên messages.content giữ nguyên (lọc user bằng join conversations)
+    if op.get_bind().dialect.name == 'mysql':
+        return
+    
+    # SQLite: token owner 'u<user_id>' để MATCH chỉ duyệt message của 1 user,
+    # cột UNINDEXED để truy vấn không phải join messages
+    drop_sqlite_search()
+    op.execute("""CREATE VIRTUAL TABLE message_search USING fts5(
+        owner, content, conversation_id UNINDEXED, role UNINDEXED, created_at UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )""")
+    op.execute("""CREATE TRIGGER message_search_complete
+    AFTER UPDATE OF status, content ON messages WHEN new.status = 'completed'
+    BEGIN
+        DELETE FROM message_search WHERE rowid = new.id;
+        INSERT INTO message_search (rowid, owner, content, conversation_id, role, created_at)
+        SELECT new.id, 'u' || c.user_id, new.content, new.conversation_id, new.role, new.created_at
+        FROM conversations c WHERE c.id = new.conversation_id;
+    END""")
+    op.execute("""CREATE TRIGGER message_search_insert
+    AFTER INSERT ON messages WHEN new.status = 'completed'
+    BEGIN
+        INSERT INTO message_search (rowid, owner, content, conversation_id, role, created_at)
+        SELECT new.id, 'u' || c.user_id, new.content, new.conversation_id, new.role, new.created_at
+        FROM conversations c WHERE c.id = new.conversation_id;
+    END""")
+    op.execute("""CREATE TRIGGER message_search_delete
+    AFTER DELETE ON messages
+    BEGIN
+        DELETE FROM message_search WHERE rowid = old.id;
+    END""")
+    op.execute(
+        "INSERT INTO message_search (rowid, owner, content, conversation_id, role, created_at) "
+        "SELECT m.id, 'u' || c.user_id, m.content, m.conversation_id, m.role, m.created_at "
+        "FROM messages m JOIN conversations c ON c.id = m.conversation_id WHERE m.status = 'completed'"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'mysql':
+        return
+    
+    # Bảng 009: chỉ có cột content
+    drop_sqlite_search()
+    op.execute("""CREATE VIRTUAL TABLE message_search USING fts5(
+        content, tokenize = 'unicode61 remove_diacritics 2'
+    )""")
+    op.execute("""CREATE TRIGGER message_search_complete
+    AFTER UPDATE OF status, content ON messages WHEN new.status = 'completed'
+    BEGIN
+        DELETE FROM message_search WHERE rowid = new.id;
+        INSERT INTO message_search (rowid, content) VALUES (new.id, new.content);
+    END""")
+    op.execute("""CREATE TRIGGER message_search_insert
+    AFTER INSERT ON messages WHEN new.status = 'completed'
+    BEGIN
+        INSERT INTO message_search (rowid, content) VALUES (new.id, new.content);
+    END""")
+    op.execute("""CREATE TRIGGER message_search_delete
+    AFTER DELETE ON messages
+    BEGIN
+        DELETE FROM message_search WHERE rowid = old.id;
+    END""")
+    op.execute(
+        "INSERT INTO message_search (rowid, content) "
+        "SELECT id, content FROM messages WHERE status = 'completed'"
+    )
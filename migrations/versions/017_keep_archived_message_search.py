@@ -0,0 +1,59 @@
+"""Keep search rows of archived messages
+
+Revision ID: 017_keep_archived_message_search
+Revises: 016_scope_message_search
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+
+revision = '017_keep_archived_message_search'
+down_revision = '016_scope_message_search'
+branch_labels = None
+depends_on = None
+
+
+def create_insert_trigger(delete_first):
+    op.execute(f"""CREATE TRIGGER message_search_insert
+    AFTER INSERT ON messages WHEN new.status = 'completed'
+    BEGIN
+        {'DELETE FROM message_search WHERE rowid = new.id;' if delete_first else ''}
+        INSERT INTO message_search (rowid, owner, content, conversation_id, role, created_at)
+        SELECT new.id, 'u' || c.user_id, new.content, new.conversation_id, new.role, new.created_at
+        FROM conversations c WHERE c.id = new.conversation_id;
+    END""")
+
+
+def upgrade():
+    # MySQL: FULLTEXT nằm trên messages, không có bảng FTS riêng
+    if op.get_bind().dialect.name == 'mysql':
+        return
+    
+    # Archive xóa messages nhưng giữ row FTS; rehydrate insert lại cùng id nên xóa row cũ trước
+    op.execute("DROP TRIGGER IF EXISTS message_search_delete")
+    op.execute("DROP TRIGGER IF EXISTS message_search_insert")
+    op.execute("""CREATE TRIGGER message_search_delete
+    AFTER DELETE ON messages
+    WHEN NOT EXISTS (SELECT 1 FROM conversations WHERE id = old.conversation_id AND is_archived = 1)
+    BEGIN
+        DELETE FROM message_search WHERE rowid = old.id;
+    END""")
+    create_insert_trigger(delete_first=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'mysql':
+        return
+    
+    op.execute("DROP TRIGGER IF EXISTS message_search_delete")
+    op.execute("DROP TRIGGER IF EXISTS message_search_insert")
+    op.execute("""CREATE TRIGGER message_search_delete
+    AFTER DELETE ON messages
+    BEGIN
+        DELETE FROM message_search WHERE rowid = old.id;
+    END""")
+    create_insert_trigger(delete_first=False)
+    # Row FTS của conversation đang archive không còn message tương ứng
+    op.execute(
+        "DELETE FROM message_search WHERE rowid NOT IN (SELECT id FROM messages)"
+    )
@@ -0,0 +1,34 @@
+"""Use a binary collation for vocabularies.word_normalized on MySQL
+
+Revision ID: 018_vocabulary_normalized_binary_collation
+Revises: 017_keep_archived_message_search
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+
+revision = '018_vocabulary_normalized_binary_collation'
+down_revision = '017_keep_archived_message_search'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite so sánh BINARY sẵn; MySQL collation mặc định không phân biệt dấu/hoa thường
+    # nên unique (user_id, word_normalized) coi 'resume' và 'résumé' là trùng
+    if op.get_bind().dialect.name != 'mysql':
+        return
+    op.execute(
+        "ALTER TABLE vocabularies MODIFY word_normalized "
+        "VARCHAR(200) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL"
+    )
+
+
+def downgrade():
+    # Có thể lỗi duplicate key nếu đã có từ chỉ khác nhau ở dấu
+    if op.get_bind().dialect.name != 'mysql':
+        return
+    op.execute(
+        "ALTER TABLE vocabularies MODIFY word_normalized "
+        "VARCHAR(200) CHARACTER SET utf8mb4 NOT NULL"
+    )
@@ -0,0 +1,26 @@
+"""Add a revision counter to conversations for the sidebar ETag
+
+Revision ID: 019_add_conversation_revision
+Revises: 018_vocabulary_normalized_binary_collation
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '019_add_conversation_revision'
+down_revision = '018_vocabulary_normalized_binary_collation'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # updated_at chỉ tới giây trên MySQL: ETag cần thêm bộ đếm tăng ở mỗi UPDATE
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('revision', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    # DROP COLUMN trực tiếp (SQLite >= 3.35): batch sẽ dựng lại bảng conversations và
+    # lỗi ở bước rename vì trigger message_search_* đang tham chiếu tới bảng này
+    op.drop_column('conversations', 'revision')
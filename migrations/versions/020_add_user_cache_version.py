@@ -0,0 +1,26 @@
+"""Add a version counter to users for cross-process user cache invalidation
+
+Revision ID: 020_add_user_cache_version
+Revises: 019_add_conversation_revision
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '020_add_user_cache_version'
+down_revision = '019_add_conversation_revision'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Cache load_user là per process: mỗi hit so cache_version với DB để không giữ
+    # is_active/locked_until cũ sau khi worker khác khóa tài khoản
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cache_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('cache_version')
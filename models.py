@@ -4,13 +4,22 @@ With Security Enhancements
 """
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import mysql
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import json
 
+from utils.passwords import hash_password, verify_password, needs_rehash
+
 db = SQLAlchemy()
 
+# session.info key: id các user đổi trong transaction (services/user_cache_service.py invalidate sau commit)
+CHANGED_USER_IDS_KEY = 'changed_user_ids'
+
+
+def mark_user_changed(session, user_id):
+    session.info.setdefault(CHANGED_USER_IDS_KEY, set()).add(user_id)
+
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -31,24 +40,47 @@ class User(UserMixin, db.Model):
     last_login_ip = db.Column(db.String(45), nullable=True)  # IPv6 compatible
     password_changed_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Tăng trong chính câu UPDATE (kể cả bulk update như add_tokens_used): user cache của
+    # mọi process so cột này khi hit để thấy ngay lockout/khóa tài khoản từ worker khác
+    cache_version = db.Column(db.Integer, default=0, server_default='0', nullable=False,
+                              onupdate=db.literal_column('cache_version') + 1)
+    
     # Relationships
     conversations = db.relationship('Conversation', backref='user', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
-        # Use stronger hashing with higher iterations
-        self.password_hash = generate_password_hash(password, method='pbkdf2:sha256:600000')
+        # Thuật toán/tham số theo PASSWORD_HASH_METHOD, hash trong process pool
+        self.password_hash = hash_password(password)
         self.password_changed_at = datetime.utcnow()
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+    
+    def rehash_password_if_needed(self, password):
+        """Sau khi login đúng: hash lại nếu tham số đã cũ. Trả về True nếu đã đổi hash."""
+        if not needs_rehash(self.password_hash):
+            return False
+        self.password_hash = hash_password(password)
+        return True
     
     def can_use_tokens(self, amount=0):
         """Kiểm tra user còn đủ token không"""
         return self.total_tokens_used + amount <= self.token_limit
     
     def add_tokens_used(self, amount):
-        """Cộng thêm token đã sử dụng"""
-        self.total_tokens_used += amount
+        """
+        Cộng thêm token đã sử dụng bằng UPDATE nguyên tử trên DB: instance có thể là bản
+        dựng từ user cache (giá trị cũ), ghi lại giá trị tuyệt đối sẽ làm mất usage của request khác.
+        """
+        User.query.filter_by(id=self.id).update(
+            {User.total_tokens_used: User.total_tokens_used + amount},
+            synchronize_session=False
+        )
+        if self in db.session:
+            # Đọc lại giá trị mới ở lần truy cập sau
+            db.session.expire(self, ['total_tokens_used'])
+        # Bulk UPDATE không qua ORM event after_update
+        mark_user_changed(db.session, self.id)
     
     def record_login(self, ip_address=None):
         """Record successful login"""
@@ -88,19 +120,55 @@ class Conversation(db.Model):
     total_tokens = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Tăng trong chính câu UPDATE (kể cả bulk update), dùng cho ETag sidebar:
+    # DATETIME của MySQL chỉ tới giây nên 2 lần sửa trong cùng 1 giây có cùng updated_at
+    revision = db.Column(db.Integer, default=0, server_default='0', nullable=False,
+                         onupdate=db.literal_column('revision') + 1)
+    
+    # Counter denormalized, cập nhật cùng transaction với thao tác trên messages
+    message_count = db.Column(db.Integer, default=0, nullable=False)
+    completed_count = db.Column(db.Integer, default=0, nullable=False)
+    last_message_at = db.Column(db.DateTime, nullable=True)
+    last_message_preview = db.Column(db.String(200), nullable=True)
     
     # Soft delete fields
     is_deleted = db.Column(db.Boolean, default=False)
     deleted_at = db.Column(db.DateTime, nullable=True)
     
+    # Cold archive: messages nằm trong message_archives (services/archive_service.py)
+    is_archived = db.Column(db.Boolean, default=False, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=True)
+    rehydrated_at = db.Column(db.DateTime, nullable=True)  # Lần mở lại gần nhất, tính là hoạt động khi xét archive
+    
+    # Sidebar list: keyset pagination on (updated_at, id) per user
+    __table_args__ = (
+        db.Index('ix_conversations_user_list', 'user_id', 'is_deleted', 'updated_at', 'id'),
+    )
+    
     # Relationships
     messages = db.relationship('Message', backref='conversation', lazy=True, cascade='all, delete-orphan', order_by='Message.created_at')
     
+    def add_messages(self, count=1):
+        """Cộng (hoặc trừ nếu count < 0) số message của conversation"""
+        self.message_count = max(0, (self.message_count or 0) + count)
+    
+    def record_message_completed(self, created_at, preview):
+        """1 message vừa chuyển sang 'completed': tăng counter, cập nhật preview nếu là message mới nhất"""
+        self.completed_count = (self.completed_count or 0) + 1
+        if self.last_message_at is None or created_at >= self.last_message_at:
+            self.last_message_at = created_at
+            self.last_message_preview = preview
+    
     def to_dict(self, include_messages=False):
         data = {
             'id': self.id,
             'title': self.title,
             'total_tokens': self.total_tokens,
+            'message_count': self.message_count or 0,
+            'completed_count': self.completed_count or 0,
+            'last_message_at': self.last_message_at.isoformat() if self.last_message_at else None,
+            'last_message_preview': self.last_message_preview,
+            'is_archived': bool(self.is_archived),
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
@@ -116,6 +184,7 @@ class Message(db.Model):
     conversation_id = db.Column(db.String(36), db.ForeignKey('conversations.id'), nullable=False)
     role = db.Column(db.String(20), nullable=False)  # 'user' or 'assistant'
     content = db.Column(db.Text, nullable=False)
+    segments = db.Column(db.Text, nullable=True)  # Parsed form of assistant content (JSON, utils/message_parser.py)
     status = db.Column(db.String(20), default='completed')  # 'pending', 'completed', 'cancelled'
     prompt_tokens = db.Column(db.Integer, default=0)
     completion_tokens = db.Column(db.Integer, default=0)
@@ -127,6 +196,7 @@ class Message(db.Model):
             'id': self.id,
             'role': self.role,
             'content': self.content,
+            'segments': json.loads(self.segments) if self.segments else None,
             'status': self.status,
             'tokens': {
                 'prompt_tokens': self.prompt_tokens,
@@ -137,15 +207,70 @@ class Message(db.Model):
         }
 
 
+class MessageArchive(db.Model):
+    """1 block messages đã nén (zlib, JSON) của 1 conversation không hoạt động"""
+    __tablename__ = 'message_archives'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.String(36), db.ForeignKey('conversations.id'), nullable=False, index=True)
+    block_index = db.Column(db.Integer, nullable=False, default=0)
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+    raw_size = db.Column(db.Integer, nullable=False, default=0)  # Bytes JSON trước khi nén
+    data = db.Column(db.LargeBinary(length=16 * 1024 * 1024), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ChatRequest(db.Model):
+    """
+    1 Idempotency-Key của /api/chat (services/idempotency_service.py).
+    Lưu trong DB để request retry rơi vào worker khác vẫn thấy lần submit đầu.
+    """
+    __tablename__ = 'chat_requests'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    key_digest = db.Column(db.String(32), nullable=False)  # blake2b 16 byte (hex) của Idempotency-Key
+    request_hash = db.Column(db.String(64), nullable=False)  # sha256 body của lần submit đầu
+    conversation_id = db.Column(db.String(36), nullable=True)
+    user_message_id = db.Column(db.Integer, nullable=True)
+    assistant_message_id = db.Column(db.Integer, nullable=True)  # NULL: lần submit đầu chưa tạo xong message
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key_digest', name='uq_chat_requests_user_key'),
+        db.Index('ix_chat_requests_expires_at', 'expires_at'),
+    )
+
+
 class Vocabulary(db.Model):
     __tablename__ = 'vocabularies'
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     word = db.Column(db.String(200), nullable=False)
+    # services/vocabulary_service.normalize_word. MySQL: collation nhị phân để unique/thứ tự/keyset
+    # so sánh đúng theo chuỗi đã chuẩn hóa (collation mặc định bỏ dấu: 'resume' trùng 'résumé')
+    word_normalized = db.Column(
+        db.String(200).with_variant(mysql.VARCHAR(200, charset='utf8mb4', collation='utf8mb4_bin'), 'mysql'),
+        nullable=False
+    )
     note = db.Column(db.Text, default='')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Spaced repetition (SM-2, services/vocabulary_service.schedule_review)
+    due_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    interval_days = db.Column(db.Integer, default=0, nullable=False)
+    ease = db.Column(db.Float, default=2.5, nullable=False)
+    reps = db.Column(db.Integer, default=0, nullable=False)
+    
+    # Chống trùng ngay trong DB + prefix search theo index
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'word_normalized', name='uq_vocabularies_user_word'),
+        db.Index('ix_vocabularies_user_id', 'user_id'),  # Danh sách mới nhất trước: (user_id, id)
+        db.Index('ix_vocabularies_user_due', 'user_id', 'due_at'),  # Hàng đợi ôn tập
+    )
+    
     # Relationship
     user = db.relationship('User', backref=db.backref('vocabularies', lazy=True, cascade='all, delete-orphan'))
     
@@ -154,5 +279,11 @@ class Vocabulary(db.Model):
             'id': self.id,
             'word': self.word,
             'note': self.note,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at.isoformat(),
+            'review': {
+                'due_at': self.due_at.isoformat() if self.due_at else None,
+                'interval': self.interval_days,
+                'ease': self.ease,
+                'reps': self.reps
+            }
         }
@@ -7,3 +7,4 @@ from .chat import chat_bp
 from .tts import tts_bp
 from .conversation import conversation_bp
 from .vocabulary import vocabulary_bp
+from .search import search_bp
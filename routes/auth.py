@@ -12,6 +12,8 @@ from utils.security import (
     validate_password_strength, check_account_lockout,
     record_failed_login, reset_failed_login, log_security_event
 )
+from utils.passwords import PasswordHasherBusy
+from utils.rate_limit import limiter
 
 
 auth_bp = Blueprint('auth', __name__)
@@ -32,6 +34,7 @@ def register_page():
 
 
 @auth_bp.route("/api/register", methods=["POST"])
+@limiter.limit(f"{RATE_LIMIT_REGISTER} per minute")
 def register():
     data = request.json or {}
     username = sanitize_input(data.get("username", ""), max_length=30)
@@ -72,6 +75,10 @@ def register():
         log_security_event('USER_REGISTERED', f"New user registered: {username}", user.id)
         login_user(user)
         return jsonify({"success": True, "user": user.to_dict()})
+    except PasswordHasherBusy:
+        db.session.rollback()
+        log_security_event('PASSWORD_HASH_BUSY', "Password hasher overloaded on register")
+        return jsonify({"error": "Hệ thống đang bận, vui lòng thử lại"}), 503
     except Exception as e:
         db.session.rollback()
         log_security_event('REGISTER_ERROR', f"Registration failed: {str(e)[:100]}")
@@ -79,6 +86,7 @@ def register():
 
 
 @auth_bp.route("/api/login", methods=["POST"])
+@limiter.limit(f"{RATE_LIMIT_LOGIN} per minute")
 def login():
     data = request.json or {}
     username = sanitize_input(data.get("username", ""), max_length=120)
@@ -100,7 +108,13 @@ def login():
         return jsonify({"error": f"Tài khoản bị khóa. Vui lòng thử lại sau {remaining} phút"}), 403
     
     # Verify credentials
-    if not user or not user.check_password(password):
+    try:
+        password_ok = bool(user) and user.check_password(password)
+    except PasswordHasherBusy:
+        log_security_event('PASSWORD_HASH_BUSY', f"Password hasher overloaded on login: {username}", user.id)
+        return jsonify({"error": "Hệ thống đang bận, vui lòng thử lại"}), 503
+    
+    if not password_ok:
         if user:
             record_failed_login(user)
             log_security_event('LOGIN_FAILED', f"Failed login for user: {username}", user.id)
@@ -112,7 +126,11 @@ def login():
         log_security_event('LOGIN_INACTIVE', f"Login attempt on inactive account: {username}", user.id)
         return jsonify({"error": "Tài khoản đã bị khóa"}), 403
     
-    # Successful login
+    # Successful login (hash lại nếu PASSWORD_HASH_METHOD đã đổi; bận thì để lần sau)
+    try:
+        user.rehash_password_if_needed(password)
+    except PasswordHasherBusy:
+        pass
     reset_failed_login(user)
     remember = data.get("remember", False)
     login_user(user, remember=remember)
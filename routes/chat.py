@@ -3,24 +3,41 @@ Chat routes - AI conversation handling
 """
 
 import json
+import time
 import uuid
 import threading
-from datetime import datetime
 
 from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
 
 from models import db, User, Conversation, Message
-from config import IS_PRODUCTION, MAX_PROMPT_TOKENS, MAX_COMPLETION_TOKENS
+from config import IS_PRODUCTION, MAX_PROMPT_TOKENS, MAX_COMPLETION_TOKENS, CHAT_QUEUE_TIMEOUT
 from prompts import TEACHER_PROMPT, MAX_HISTORY_MESSAGES
-from services.ai_service import client
-from services.tts_service import pre_generate_tts
-from utils.security import sanitize_input, sanitize_html, validate_uuid, log_security_event
+from services.ai_service import get_client
+from services.admission_service import chat_admission
+from services.archive_service import rehydrate_conversation
+from services.generation_service import generation_registry, record_message_usage, close_pending_messages
+from services.idempotency_service import chat_idempotency, IdempotencyConflict, IdempotencyInProgress
+from services.speculative_service import speculative_store
+from services.tts_service import pre_generate_tts, get_user_voice_config
+from utils.security import (
+    sanitize_input, sanitize_html, validate_uuid, validate_idempotency_key, log_security_event
+)
 from utils.helpers import estimate_tokens
+from utils.message_parser import parse_message, dump_parsed, load_parsed, message_preview
 
 
 chat_bp = Blueprint('chat', __name__)
 
+# Khoảng thời gian giữa các lần kiểm tra vị trí hàng đợi (giây)
+QUEUE_POLL_INTERVAL = 1.0
+
+# Thời gian request trùng chờ lần submit đầu tạo xong message (giây)
+IDEMPOTENCY_WAIT_SECONDS = 5
+
+# Request trùng theo dõi generation chạy ở worker khác qua nội dung đã lưu trong DB (giây)
+SAVED_MESSAGE_POLL_INTERVAL = 1.0
+
 
 @chat_bp.route("/api/chat", methods=["POST"])
 @login_required
@@ -33,6 +50,8 @@ def chat():
     user_message = sanitize_input(data.get("message", ""), max_length=5000)
     conversation_id = data.get("conversation_id")
     retry_message_id = data.get("retry_message_id")
+    speculative = bool(data.get("speculative"))
+    voice_config = get_user_voice_config()
     
     if not user_message.strip():
         return jsonify({"error": "Tin nhắn trống"}), 400
@@ -40,7 +59,11 @@ def chat():
     if not current_user.can_use_tokens():
         return jsonify({"error": "Bạn đã hết token. Vui lòng liên hệ admin để nâng cấp."}), 403
     
-    # Validate and get/create conversation
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key is not None and not validate_idempotency_key(idempotency_key):
+        return jsonify({"error": "Invalid Idempotency-Key"}), 400
+    
+    # Validate conversation
     conv = None
     if conversation_id:
         if not validate_uuid(conversation_id):
@@ -48,112 +71,224 @@ def chat():
         conv = Conversation.query.filter_by(id=conversation_id, user_id=current_user.id).first()
         if not conv:
             return jsonify({"error": "Không tìm thấy cuộc trò chuyện"}), 404
-    else:
-        conv_id = str(uuid.uuid4())
-        title = sanitize_html(user_message[:30]) + ('...' if len(user_message) > 30 else '')
-        conv = Conversation(
-            id=conv_id,
-            user_id=current_user.id,
-            title=title
-        )
-        db.session.add(conv)
-        db.session.commit()
+        if conv.is_archived:
+            rehydrate_conversation(conv)
     
-    # Handle retry
+    existing_msg = None
     if retry_message_id:
-        existing_msg = Message.query.filter_by(id=retry_message_id, conversation_id=conv.id).first()
+        if conv:
+            existing_msg = Message.query.filter_by(id=retry_message_id, conversation_id=conv.id).first()
+        if not existing_msg:
+            return jsonify({"error": "Không tìm thấy tin nhắn"}), 404
+    
+    # Request trùng (kể cả ở worker khác): gắn vào generation của lần submit đầu thay vì gọi API lần nữa
+    idempotency_record = None
+    if idempotency_key:
+        request_hash = chat_idempotency.request_hash(user_message, conversation_id, retry_message_id)
+        try:
+            idempotency_record, created = chat_idempotency.reserve(current_user.id, idempotency_key, request_hash)
+            if not created:
+                replay = replay_generation(idempotency_record.id, current_user.id)
+                if replay is not None:
+                    return replay
+                # Lần submit trước đã thất bại/bị hủy - chạy lại như request mới
+                chat_idempotency.release(idempotency_record)
+                idempotency_record, created = chat_idempotency.reserve(current_user.id, idempotency_key, request_hash)
+                if not created:
+                    # Request trùng khác đã giữ chỗ trước
+                    raise IdempotencyInProgress()
+        except IdempotencyConflict:
+            return jsonify({"error": "Idempotency-Key đã được dùng cho nội dung khác"}), 422
+        except IdempotencyInProgress:
+            return jsonify({"error": "Yêu cầu đang được xử lý"}), 409
+    
+    # Từ reserve tới bind: lỗi giữa chừng phải bỏ key, nếu không retry cùng key nhận 409
+    ticket = None
+    try:
+        # Speculative: user chọn đúng action đã được sinh trước -> trả kết quả ngay
+        if conv and speculative_store.has(current_user.id, conv.id):
+            if existing_msg:
+                speculative_store.discard(current_user.id, conv.id)
+            else:
+                last_msg = Message.query.filter_by(conversation_id=conv.id).order_by(Message.id.desc()).first()
+                speculation = speculative_store.take(current_user.id, conv.id, last_msg.id if last_msg else None, user_message)
+                if speculation:
+                    return serve_speculation(conv, user_message, speculation, idempotency_record, speculative, voice_config)
+        
+        # Giữ chỗ trong hàng đợi ngay lúc kiểm tra: 2 request đồng thời không cùng lọt qua giới hạn
+        ticket = chat_admission.try_enqueue(current_user.id)
+        if ticket is None:
+            if idempotency_record:
+                chat_idempotency.release(idempotency_record)
+            log_security_event('CHAT_QUEUE_FULL', "Too many queued chat requests", current_user.id)
+            return jsonify({"error": "Bạn đang có quá nhiều yêu cầu đang chờ. Vui lòng thử lại sau."}), 429
+        
+        if not conv:
+            conv_id = str(uuid.uuid4())
+            title = sanitize_html(user_message[:30]) + ('...' if len(user_message) > 30 else '')
+            conv = Conversation(
+                id=conv_id,
+                user_id=current_user.id,
+                title=title
+            )
+            db.session.add(conv)
+            db.session.commit()
+        
+        # Handle retry
         if existing_msg:
-            existing_msg.status = 'completed'
+            if existing_msg.status != 'completed':
+                existing_msg.status = 'completed'
+                conv.record_message_completed(existing_msg.created_at, message_preview(existing_msg.content))
             user_msg = existing_msg
         else:
-            return jsonify({"error": "Không tìm thấy tin nhắn"}), 404
-    else:
-        user_msg = Message(
-            conversation_id=conv.id,
-            role='user',
-            content=user_message,
+            user_msg = Message(
+                conversation_id=conv.id,
+                role='user',
+                content=user_message,
+                status='pending'
+            )
+            db.session.add(user_msg)
+            conv.add_messages(1)
+        
+        db.session.commit()
+        
+        # Get history
+        history = trim_history([{"role": m.role, "content": m.content} for m in conv.messages if m.status == 'completed' or m.id == user_msg.id])
+        
+        # Store context
+        conv_id = conv.id
+        user_msg_id = user_msg.id
+        user_id = current_user.id
+        original_user_message = user_message
+        
+        # Create assistant message
+        assistant_msg = Message(
+            conversation_id=conv_id,
+            role='assistant',
+            content='',
             status='pending'
         )
-        db.session.add(user_msg)
-    
-    db.session.commit()
-    
-    # Get history
-    history = [{"role": m.role, "content": m.content} for m in conv.messages if m.status == 'completed' or m.id == user_msg.id]
+        db.session.add(assistant_msg)
+        conv.add_messages(1)
+        db.session.commit()
+        assistant_msg_id = assistant_msg.id
+        
+        generation = generation_registry.register(assistant_msg_id, user_id)
+        if idempotency_record:
+            chat_idempotency.bind(idempotency_record, conv_id, user_msg_id, assistant_msg_id)
+    except Exception:
+        db.session.rollback()
+        if ticket:
+            chat_admission.release(ticket)
+        if idempotency_record:
+            chat_idempotency.release(idempotency_record)
+        raise
     
-    # Limit history by message count first (to save tokens)
-    if len(history) > MAX_HISTORY_MESSAGES:
-        history = history[-MAX_HISTORY_MESSAGES:]
+    def usage_for(content, prompt_tokens, completion_tokens):
+        """Usage thực tế từ API, hoặc ước tính nếu stream không trả về usage"""
+        if prompt_tokens == 0:
+            prompt_tokens = estimate_tokens(TEACHER_PROMPT + str(history))
+        if completion_tokens == 0:
+            completion_tokens = estimate_tokens(content)
+        return prompt_tokens, completion_tokens
     
-    # Then trim by token count
-    total_tokens = estimate_tokens(TEACHER_PROMPT)
-    trimmed_history = []
-    for msg in reversed(history):
-        msg_tokens = estimate_tokens(msg["content"])
-        if total_tokens + msg_tokens > MAX_PROMPT_TOKENS:
-            break
-        total_tokens += msg_tokens
-        trimmed_history.insert(0, msg)
-    
-    history = trimmed_history
+    def save_partial_message(content):
+        """Lưu nội dung đang stream. Trả về False nếu message đã bị hủy (vd. từ worker khác)"""
+        try:
+            updated = Message.query.filter_by(id=assistant_msg_id, status='pending').update({'content': content})
+            db.session.commit()
+            return updated > 0
+        except Exception as e:
+            log_security_event('DB_ERROR', f"Error updating message: {str(e)[:100]}", user_id)
+            db.session.rollback()
+            return True
     
-    # Store context
-    conv_id = conv.id
-    user_msg_id = user_msg.id
-    user_id = current_user.id
-    original_user_message = user_message
+    def complete_assistant_message(content, parsed, prompt_tokens, completion_tokens):
+        try:
+            record_message_usage(
+                assistant_msg_id, 'completed', prompt_tokens, completion_tokens,
+                content=content, segments=dump_parsed(parsed)
+            )
+            
+            conv_obj = Conversation.query.get(conv_id)
+            user_msg_obj = Message.query.get(user_msg_id)
+            if user_msg_obj and user_msg_obj.status != 'completed':
+                user_msg_obj.status = 'completed'
+                if conv_obj:
+                    conv_obj.record_message_completed(user_msg_obj.created_at, message_preview(user_msg_obj.content))
+            
+            if conv_obj:
+                if conv_obj.completed_count <= 2:
+                    conv_obj.title = sanitize_html(original_user_message[:30]) + ('...' if len(original_user_message) > 30 else '')
+            
+            db.session.commit()
+        except Exception as e:
+            log_security_event('DB_ERROR', f"Error updating message: {str(e)[:100]}", user_id)
+            db.session.rollback()
     
-    # Create assistant message
-    assistant_msg = Message(
-        conversation_id=conv_id,
-        role='assistant',
-        content='',
-        status='pending'
-    )
-    db.session.add(assistant_msg)
-    db.session.commit()
-    assistant_msg_id = assistant_msg.id
+    def cancel_assistant_message(content, prompt_tokens, completion_tokens):
+        """Đánh dấu cancelled và tính usage của phần đã sinh"""
+        try:
+            record_message_usage(assistant_msg_id, 'cancelled', prompt_tokens, completion_tokens, content=content)
+            Message.query.filter_by(id=user_msg_id, status='pending').update({'status': 'cancelled'})
+            db.session.commit()
+        except Exception as e:
+            log_security_event('DB_ERROR', f"Error cancelling message: {str(e)[:100]}", user_id)
+            db.session.rollback()
     
-    def update_assistant_message(content, status='pending', prompt_tokens=0, completion_tokens=0, total_tokens=0):
+    def close_unfinished_messages():
+        """Lượt chat dừng giữa chừng (lỗi, hết thời gian chờ...) thì không để message ở trạng thái pending"""
         try:
-            msg = Message.query.get(assistant_msg_id)
-            if msg:
-                msg.content = content
-                msg.status = status
-                if status == 'completed':
-                    msg.prompt_tokens = prompt_tokens
-                    msg.completion_tokens = completion_tokens
-                    msg.total_tokens = total_tokens
-                    
-                    user_msg_obj = Message.query.get(user_msg_id)
-                    if user_msg_obj:
-                        user_msg_obj.status = 'completed'
-                    
-                    conv_obj = Conversation.query.get(conv_id)
-                    if conv_obj:
-                        conv_obj.total_tokens += total_tokens
-                        if len([m for m in conv_obj.messages if m.status == 'completed']) <= 2:
-                            conv_obj.title = sanitize_html(original_user_message[:30]) + ('...' if len(original_user_message) > 30 else '')
-                    
-                    user_obj = User.query.get(user_id)
-                    if user_obj:
-                        user_obj.add_tokens_used(total_tokens)
-                
+            if close_pending_messages([user_msg_id, assistant_msg_id]):
                 db.session.commit()
         except Exception as e:
-            log_security_event('DB_ERROR', f"Error updating message: {str(e)[:100]}", user_id)
+            log_security_event('DB_ERROR', f"Error closing pending messages: {str(e)[:100]}", user_id)
             db.session.rollback()
     
     def generate():
+        try:
+            for event in run_generation():
+                if not event.startswith(':'):
+                    generation.publish(event)
+                yield event
+        finally:
+            chat_admission.release(ticket)
+            close_unfinished_messages()
+            generation_registry.unregister(generation)
+            generation.finish()
+    
+    def run_generation():
+        yield f"data: {json.dumps({'type': 'init', 'assistant_message_id': assistant_msg_id, 'conversation_id': conv_id})}\n\n"
+        
+        # Chờ tới lượt trong hàng đợi (fair round-robin giữa các user), ticket đã giữ chỗ từ lúc nhận request
+        last_position = 0
+        while True:
+            position = chat_admission.position(ticket)
+            if position == 0:
+                break
+            if time.time() - ticket.enqueued_at >= CHAT_QUEUE_TIMEOUT:
+                log_security_event('CHAT_QUEUE_TIMEOUT', f"Chat request timed out in queue at position {position}", user_id)
+                yield f"data: {json.dumps({'type': 'error', 'error': 'Hệ thống đang bận. Vui lòng thử lại sau.'})}\n\n"
+                return
+            if position != last_position:
+                last_position = position
+                yield f"data: {json.dumps({'type': 'queued', 'position': position})}\n\n"
+            else:
+                # Keep-alive để phát hiện client ngắt kết nối khi đang chờ
+                yield ": keep-alive\n\n"
+            chat_admission.wait(ticket, timeout=QUEUE_POLL_INTERVAL)
+        
+        yield from stream_reply()
+    
+    def stream_reply():
         assistant_message = ""
         prompt_tokens = 0
         completion_tokens = 0
         chunk_count = 0
-        
-        yield f"data: {json.dumps({'type': 'init', 'assistant_message_id': assistant_msg_id, 'conversation_id': conv_id})}\n\n"
+        finished = False
         
         try:
-            stream = client.chat.completions.create(
+            stream = get_client().chat.completions.create(
                 model="deepseek-chat",
                 messages=[
                     {"role": "system", "content": TEACHER_PROMPT},
@@ -163,8 +298,12 @@ def chat():
                 max_tokens=MAX_COMPLETION_TOKENS,
                 stream=True
             )
+            generation.attach(stream)
             
             for chunk in stream:
+                if generation.cancelled.is_set():
+                    break
+                
                 if chunk.choices[0].delta.content:
                     content = chunk.choices[0].delta.content
                     assistant_message += content
@@ -172,8 +311,9 @@ def chat():
                     
                     yield f"data: {json.dumps({'type': 'chunk', 'content': content})}\n\n"
                     
-                    if chunk_count % 10 == 0:
-                        update_assistant_message(assistant_message)
+                    if chunk_count % 10 == 0 and not save_partial_message(assistant_message):
+                        generation.cancel()
+                        break
                 
                 if hasattr(chunk, 'usage') and chunk.usage:
                     usage = chunk.usage
@@ -184,29 +324,145 @@ def chat():
                         prompt_tokens = getattr(usage, 'prompt_tokens', 0)
                         completion_tokens = getattr(usage, 'completion_tokens', 0)
             
-            if prompt_tokens == 0:
-                prompt_tokens = estimate_tokens(TEACHER_PROMPT + str(history))
-            if completion_tokens == 0:
-                completion_tokens = estimate_tokens(assistant_message)
-            
+            prompt_tokens, completion_tokens = usage_for(assistant_message, prompt_tokens, completion_tokens)
             total_tokens = prompt_tokens + completion_tokens
+            tokens = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': total_tokens}
+            
+            if generation.cancelled.is_set():
+                finished = True
+                cancel_assistant_message(assistant_message, prompt_tokens, completion_tokens)
+                yield f"data: {json.dumps({'type': 'cancelled', 'assistant_message_id': assistant_msg_id, 'tokens': tokens})}\n\n"
+                return
             
-            update_assistant_message(assistant_message, 'completed', prompt_tokens, completion_tokens, total_tokens)
+            finished = True
+            parsed = parse_message(assistant_message)
+            complete_assistant_message(assistant_message, parsed, prompt_tokens, completion_tokens)
             
-            yield f"data: {json.dumps({'type': 'done', 'conversation_id': conv_id, 'message_id': user_msg_id, 'assistant_message_id': assistant_msg_id, 'tokens': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': total_tokens}})}\n\n"
+            yield f"data: {json.dumps({'type': 'done', 'conversation_id': conv_id, 'message_id': user_msg_id, 'assistant_message_id': assistant_msg_id, 'tokens': tokens, 'segments': parsed})}\n\n"
             
-            tts_thread = threading.Thread(target=pre_generate_tts, args=(assistant_message, "+10%"))
+            tts_thread = threading.Thread(target=pre_generate_tts, args=(parsed['tts'], voice_config))
             tts_thread.start()
             
+            if speculative:
+                start_speculation(user_id, conv_id, assistant_msg_id, history, assistant_message, parsed['actions'], voice_config)
+            
         except Exception as e:
+            finished = True
+            if generation.cancelled.is_set():
+                # Upstream bị đóng bởi endpoint cancel
+                prompt_tokens, completion_tokens = usage_for(assistant_message, prompt_tokens, completion_tokens)
+                cancel_assistant_message(assistant_message, prompt_tokens, completion_tokens)
+                yield f"data: {json.dumps({'type': 'cancelled', 'assistant_message_id': assistant_msg_id})}\n\n"
+                return
+            
             if assistant_message:
-                update_assistant_message(assistant_message, 'cancelled')
+                cancel_assistant_message(assistant_message, 0, 0)
             error_msg = "Đã xảy ra lỗi khi xử lý yêu cầu" if IS_PRODUCTION else str(e)
             log_security_event('CHAT_ERROR', f"Chat stream error: {str(e)[:200]}", user_id)
             yield f"data: {json.dumps({'type': 'error', 'error': error_msg})}\n\n"
+        finally:
+            if not finished:
+                # Client ngắt kết nối giữa chừng: đóng upstream ngay và ghi usage phần đã sinh
+                generation.close()
+                if assistant_message:
+                    prompt_tokens, completion_tokens = usage_for(assistant_message, prompt_tokens, completion_tokens)
+                    cancel_assistant_message(assistant_message, prompt_tokens, completion_tokens)
+                generation.publish(f"data: {json.dumps({'type': 'cancelled', 'assistant_message_id': assistant_msg_id})}\n\n")
+    
+    response = sse_response(generate())
+    # Client ngắt trước khi generator chạy thì finally của generate() không chạy - trả slot khi đóng response
+    response.call_on_close(lambda: chat_admission.release(ticket))
+    return response
+
+
+def trim_history(history):
+    """Giới hạn history theo số message rồi theo số token của prompt"""
+    # Limit history by message count first (to save tokens)
+    if len(history) > MAX_HISTORY_MESSAGES:
+        history = history[-MAX_HISTORY_MESSAGES:]
+    
+    # Then trim by token count
+    total_tokens = estimate_tokens(TEACHER_PROMPT)
+    trimmed_history = []
+    for msg in reversed(history):
+        msg_tokens = estimate_tokens(msg["content"])
+        if total_tokens + msg_tokens > MAX_PROMPT_TOKENS:
+            break
+        total_tokens += msg_tokens
+        trimmed_history.insert(0, msg)
+    
+    return trimmed_history
+
+
+def start_speculation(user_id, conv_id, assistant_msg_id, history, reply, actions, voice_config):
+    """Sinh trước reply cho action gợi ý đầu tiên (nếu user còn dư quota)"""
+    if not actions:
+        return
     
+    user = User.query.get(user_id)
+    if not user:
+        return
+    
+    messages = trim_history(history + [{"role": "assistant", "content": reply}])
+    speculative_store.start(
+        user_id, conv_id, assistant_msg_id,
+        sanitize_input(actions[0], max_length=5000),
+        messages, user.tokens_remaining, voice_config
+    )
+
+
+def serve_speculation(conv, user_message, speculation, idempotency_record, speculative, voice_config):
+    """Lưu user message + reply đã sinh trước và phát lại như 1 stream hoàn chỉnh"""
+    user_msg = Message(
+        conversation_id=conv.id,
+        role='user',
+        content=user_message,
+        status='completed'
+    )
+    assistant_msg = Message(
+        conversation_id=conv.id,
+        role='assistant',
+        content=speculation.content,
+        status='pending'
+    )
+    db.session.add(user_msg)
+    db.session.add(assistant_msg)
+    db.session.flush()
+    conv.add_messages(2)
+    conv.record_message_completed(user_msg.created_at, message_preview(user_message))
+    record_message_usage(
+        assistant_msg.id, 'completed', speculation.prompt_tokens, speculation.completion_tokens,
+        segments=dump_parsed(speculation.parsed)
+    )
+    db.session.commit()
+    
+    conv_id = conv.id
+    user_id = conv.user_id
+    user_msg_id = user_msg.id
+    assistant_msg_id = assistant_msg.id
+    history = trim_history([{"role": m.role, "content": m.content} for m in conv.messages if m.status == 'completed'])
+    tokens = {
+        'prompt_tokens': speculation.prompt_tokens,
+        'completion_tokens': speculation.completion_tokens,
+        'total_tokens': speculation.total_tokens
+    }
+    if idempotency_record:
+        chat_idempotency.bind(idempotency_record, conv_id, user_msg_id, assistant_msg_id)
+    
+    def replay():
+        yield f"data: {json.dumps({'type': 'init', 'assistant_message_id': assistant_msg_id, 'conversation_id': conv_id})}\n\n"
+        yield f"data: {json.dumps({'type': 'chunk', 'content': speculation.content})}\n\n"
+        yield f"data: {json.dumps({'type': 'done', 'conversation_id': conv_id, 'message_id': user_msg_id, 'assistant_message_id': assistant_msg_id, 'tokens': tokens, 'segments': speculation.parsed, 'speculative': True})}\n\n"
+        
+        if speculative:
+            start_speculation(user_id, conv_id, assistant_msg_id, history[:-1], speculation.content, speculation.parsed['actions'], voice_config)
+    
+    return sse_response(replay())
+
+
+def sse_response(events):
     return Response(
-        stream_with_context(generate()),
+        stream_with_context(events),
         mimetype='text/event-stream',
         headers={
             'Cache-Control': 'no-cache, no-store, must-revalidate',
@@ -216,6 +472,77 @@ def chat():
     )
 
 
+def done_event(record, msg):
+    tokens = {'prompt_tokens': msg.prompt_tokens, 'completion_tokens': msg.completion_tokens, 'total_tokens': msg.total_tokens}
+    return f"data: {json.dumps({'type': 'done', 'conversation_id': record.conversation_id, 'message_id': record.user_message_id, 'assistant_message_id': msg.id, 'tokens': tokens, 'segments': load_parsed(msg.segments)})}\n\n"
+
+
+def replay_generation(record_id, user_id):
+    """
+    Response cho request trùng Idempotency-Key:
+    - generation đang chạy trong process này -> phát lại event đã gửi và theo dõi tiếp
+    - generation đang chạy ở worker khác -> theo dõi nội dung được lưu dần vào DB
+    - đã hoàn thành -> phát lại kết quả từ DB
+    - thất bại/bị hủy -> None (caller chạy lại)
+    Raise IdempotencyInProgress nếu lần submit đầu chưa tạo xong message.
+    """
+    record = chat_idempotency.wait_bound(record_id, IDEMPOTENCY_WAIT_SECONDS)
+    if record is None:
+        # Lần submit đầu lỗi trước khi tạo message (record đã bị release)
+        return None
+    
+    generation = generation_registry.get(record.assistant_message_id)
+    if generation is not None and generation.user_id == user_id:
+        return sse_response(generation.follow(idle_timeout=CHAT_QUEUE_TIMEOUT + 60))
+    
+    msg = Message.query.get(record.assistant_message_id)
+    if msg and msg.status == 'pending':
+        return sse_response(follow_saved_message(record, msg.content))
+    if not msg or msg.status != 'completed':
+        return None
+    
+    def replay():
+        yield f"data: {json.dumps({'type': 'init', 'assistant_message_id': msg.id, 'conversation_id': record.conversation_id})}\n\n"
+        yield f"data: {json.dumps({'type': 'chunk', 'content': msg.content})}\n\n"
+        yield done_event(record, msg)
+    
+    return sse_response(replay())
+
+
+def follow_saved_message(record, content):
+    """
+    Generator: theo dõi assistant message do worker khác đang stream (content được lưu mỗi
+    vài chunk) tới khi message rời trạng thái pending - không gọi API lần nữa.
+    """
+    message_id = record.assistant_message_id
+    yield f"data: {json.dumps({'type': 'init', 'assistant_message_id': message_id, 'conversation_id': record.conversation_id})}\n\n"
+    sent = ''
+    idle_since = time.time()
+    while True:
+        if content.startswith(sent) and len(content) > len(sent):
+            yield f"data: {json.dumps({'type': 'chunk', 'content': content[len(sent):]})}\n\n"
+            sent = content
+            idle_since = time.time()
+        
+        # Transaction mới mỗi lần đọc để thấy commit của worker đang stream
+        db.session.rollback()
+        msg = Message.query.get(message_id)
+        if msg is None or msg.status == 'cancelled':
+            yield f"data: {json.dumps({'type': 'cancelled', 'assistant_message_id': message_id})}\n\n"
+            return
+        content = msg.content
+        if msg.status == 'completed':
+            if len(content) > len(sent):
+                yield f"data: {json.dumps({'type': 'chunk', 'content': content[len(sent):]})}\n\n"
+            yield done_event(record, msg)
+            return
+        if time.time() - idle_since > CHAT_QUEUE_TIMEOUT + 60:
+            yield f"data: {json.dumps({'type': 'error', 'error': 'Hệ thống đang bận. Vui lòng thử lại sau.'})}\n\n"
+            return
+        yield ": keep-alive\n\n"
+        time.sleep(SAVED_MESSAGE_POLL_INTERVAL)
+
+
 @chat_bp.route("/api/reset", methods=["POST"])
 @login_required
 def reset():
@@ -2,44 +2,139 @@
 Conversation routes
 """
 
+import base64
+import hashlib
+import io
 import uuid
-from datetime import datetime, timedelta
+import zlib
+from datetime import datetime
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, make_response, Response, stream_with_context
 from flask_login import login_required, current_user
+from sqlalchemy import and_, func, or_
 
+from config import CONVERSATION_RESTORE_SECONDS
 from models import db, Conversation, Message
 from utils.security import sanitize_input, sanitize_html, validate_uuid
+from services.archive_service import rehydrate_conversation
+from services.generation_service import generation_registry, record_message_usage
+from services.export_service import iter_export, gzip_chunks, import_ndjson
 from utils.helpers import estimate_tokens
 
 
 conversation_bp = Blueprint('conversation', __name__)
 
+CONVERSATION_PAGE_SIZE = 50
+CONVERSATION_PAGE_MAX = 100
+MESSAGE_PAGE_SIZE = 50
+MESSAGE_PAGE_MAX = 200
+
+# Chỉ các cột cần cho sidebar (cùng key với Conversation.to_dict())
+CONVERSATION_LIST_COLUMNS = (
+    Conversation.id,
+    Conversation.title,
+    Conversation.total_tokens,
+    Conversation.message_count,
+    Conversation.last_message_at,
+    Conversation.last_message_preview,
+    Conversation.created_at,
+    Conversation.updated_at
+)
+
+
+def conversation_row_to_dict(row):
+    return {
+        'id': row.id,
+        'title': row.title,
+        'total_tokens': row.total_tokens,
+        'message_count': row.message_count or 0,
+        'last_message_at': row.last_message_at.isoformat() if row.last_message_at else None,
+        'last_message_preview': row.last_message_preview,
+        'created_at': row.created_at.isoformat(),
+        'updated_at': row.updated_at.isoformat()
+    }
+
+
+def encode_conversation_cursor(updated_at, conv_id):
+    """Cursor keyset (updated_at, id) của dòng cuối trang"""
+    raw = f"{updated_at.isoformat()}|{conv_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_conversation_cursor(cursor):
+    """Trả về (updated_at, id) hoặc None nếu cursor không hợp lệ"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        updated_at, conv_id = raw.split('|', 1)
+        updated_at = datetime.fromisoformat(updated_at)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not validate_uuid(conv_id):
+        return None
+    return updated_at, conv_id
+
+
+def conversation_list_etag(user_id, latest, total, revisions, cursor, limit):
+    stamp = latest.isoformat() if latest else ''
+    raw = f"{user_id}:{stamp}:{total}:{revisions}:{cursor}:{limit}"
+    return hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+
 
 @conversation_bp.route("/api/conversations", methods=["GET"])
 @login_required
 def get_conversations():
     """Lấy danh sách conversations của user (không bao gồm đã xóa)"""
-    # Cleanup: Hard delete conversations soft-deleted more than 15 seconds ago
-    cleanup_threshold = datetime.utcnow() - timedelta(seconds=15)
-    old_deleted = Conversation.query.filter(
-        Conversation.user_id == current_user.id,
-        Conversation.is_deleted == True,
-        Conversation.deleted_at < cleanup_threshold
-    ).all()
+    limit = request.args.get("limit", CONVERSATION_PAGE_SIZE, type=int)
+    limit = max(1, min(limit or CONVERSATION_PAGE_SIZE, CONVERSATION_PAGE_MAX))
+    cursor = request.args.get("cursor", "")
+    
+    after = None
+    if cursor:
+        after = decode_conversation_cursor(cursor)
+        if after is None:
+            return jsonify({"error": "Invalid cursor"}), 400
+    
+    # Tạo/xóa đổi số dòng, mọi UPDATE (đổi tên, chat, xóa mềm, khôi phục) tăng revision.
+    # Không dựa riêng vào updated_at: MySQL DATETIME chỉ tới giây, 2 lần sửa trong cùng
+    # 1 giây sẽ cho cùng max(updated_at) và client nhận 304 với danh sách cũ
+    latest, total, revisions = db.session.query(
+        func.max(Conversation.updated_at),
+        func.count(Conversation.id),
+        func.coalesce(func.sum(Conversation.revision), 0)
+    ).filter(Conversation.user_id == current_user.id).one()
+    etag = conversation_list_etag(current_user.id, latest, total, revisions, cursor, limit)
     
-    for conv in old_deleted:
-        db.session.delete(conv)
+    if request.if_none_match.contains_weak(etag):
+        response = make_response("", 304)
+        response.set_etag(etag, weak=True)
+        return response
+    
+    query = db.session.query(*CONVERSATION_LIST_COLUMNS).filter(
+        Conversation.user_id == current_user.id,
+        Conversation.is_deleted == False
+    )
+    if after:
+        updated_at, conv_id = after
+        query = query.filter(or_(
+            Conversation.updated_at < updated_at,
+            and_(Conversation.updated_at == updated_at, Conversation.id < conv_id)
+        ))
+    rows = query.order_by(
+        Conversation.updated_at.desc(),
+        Conversation.id.desc()
+    ).limit(limit + 1).all()
     
-    if old_deleted:
-        db.session.commit()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_conversation_cursor(rows[-1].updated_at, rows[-1].id)
     
-    # Get active conversations
-    convs = Conversation.query.filter_by(
-        user_id=current_user.id, 
-        is_deleted=False
-    ).order_by(Conversation.updated_at.desc()).all()
-    return jsonify({"conversations": [c.to_dict() for c in convs]})
+    response = jsonify({
+        "conversations": [conversation_row_to_dict(row) for row in rows],
+        "next_cursor": next_cursor
+    })
+    response.set_etag(etag, weak=True)
+    return response
 
 
 @conversation_bp.route("/api/conversations", methods=["POST"])
@@ -57,10 +152,46 @@ def create_conversation():
     return jsonify({"conversation": conv.to_dict()})
 
 
+@conversation_bp.route("/api/conversations/export", methods=["GET"])
+@login_required
+def export_conversations():
+    """Export toàn bộ conversations dạng NDJSON (stream, ?gzip=1 để nén)"""
+    use_gzip = request.args.get("gzip") in ("1", "true")
+    chunks = iter_export(current_user.id)
+    filename = f"conversations-{datetime.utcnow():%Y%m%d}.ndjson"
+    
+    if use_gzip:
+        body, mimetype, filename = gzip_chunks(chunks), 'application/gzip', filename + '.gz'
+    else:
+        body, mimetype = chunks, 'application/x-ndjson'
+    
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+@conversation_bp.route("/api/conversations/import", methods=["POST"])
+@login_required
+def import_conversations():
+    """Import NDJSON (hoặc NDJSON gzip) từ body request, đọc và insert theo batch"""
+    try:
+        stats = import_ndjson(current_user.id, io.BufferedReader(request.stream))
+    except (ValueError, OSError, EOFError, zlib.error) as e:
+        db.session.rollback()
+        return jsonify({"error": f"Dữ liệu import không hợp lệ: {str(e)[:100]}"}), 400
+    
+    return jsonify({"success": True, "imported": stats})
+
+
 @conversation_bp.route("/api/conversations/<conv_id>", methods=["GET"])
 @login_required
 def get_conversation(conv_id):
-    """Lấy chi tiết conversation với messages"""
+    """Lấy chi tiết conversation với 1 trang messages (chỉ đọc, trừ khi cần rehydrate archive)"""
     if not validate_uuid(conv_id):
         return jsonify({"error": "Invalid conversation ID"}), 400
     
@@ -68,26 +199,27 @@ def get_conversation(conv_id):
     if not conv:
         return jsonify({"error": "Không tìm thấy cuộc trò chuyện"}), 404
     
-    # Mark pending messages as cancelled
-    pending_messages = Message.query.filter_by(conversation_id=conv_id, status='pending').all()
-    for msg in pending_messages:
-        if msg.role == 'assistant' and msg.content:
-            msg.status = 'cancelled'
-            if msg.total_tokens == 0:
-                msg.completion_tokens = estimate_tokens(msg.content)
-                msg.prompt_tokens = msg.completion_tokens * 2
-                msg.total_tokens = msg.prompt_tokens + msg.completion_tokens
-                conv.total_tokens += msg.total_tokens
-                current_user.add_tokens_used(msg.total_tokens)
-        elif msg.role == 'user':
-            msg.status = 'cancelled'
-        else:
-            db.session.delete(msg)
+    if conv.is_archived:
+        rehydrate_conversation(conv)
+    
+    limit = request.args.get("limit", MESSAGE_PAGE_SIZE, type=int)
+    limit = max(1, min(limit or MESSAGE_PAGE_SIZE, MESSAGE_PAGE_MAX))
+    before = request.args.get("before", type=int)
+    
+    # Trang mới nhất trước; `before` = id message cũ nhất client đang có
+    query = Message.query.filter(Message.conversation_id == conv.id)
+    if before:
+        query = query.filter(Message.id < before)
+    messages = query.order_by(Message.id.desc()).limit(limit + 1).all()
     
-    if pending_messages:
-        db.session.commit()
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    messages.reverse()
     
-    return jsonify({"conversation": conv.to_dict(include_messages=True)})
+    data = conv.to_dict()
+    data['messages'] = [m.to_dict() for m in messages]
+    data['has_more'] = has_more
+    return jsonify({"conversation": data})
 
 
 @conversation_bp.route("/api/conversations/<conv_id>", methods=["DELETE"])
@@ -131,7 +263,7 @@ def rename_conversation(conv_id):
 @conversation_bp.route("/api/conversations/restore", methods=["POST"])
 @login_required
 def restore_conversation():
-    """Khôi phục conversation đã xóa mềm (trong vòng 15 giây)"""
+    """Khôi phục conversation đã xóa mềm (trong cửa sổ hoàn tác)"""
     data = request.json or {}
     conv_id = data.get("id")
     
@@ -149,7 +281,7 @@ def restore_conversation():
     
     if conv.deleted_at:
         time_diff = (datetime.utcnow() - conv.deleted_at).total_seconds()
-        if time_diff > 15:
+        if time_diff > CONVERSATION_RESTORE_SECONDS:
             return jsonify({"error": "Đã quá thời gian hoàn tác"}), 400
     
     conv.is_deleted = False
@@ -159,6 +291,26 @@ def restore_conversation():
     return jsonify({"success": True, "conversation": conv.to_dict()})
 
 
+@conversation_bp.route("/api/messages/<int:message_id>/cancel", methods=["POST"])
+@login_required
+def cancel_message(message_id):
+    """Hủy generation đang chạy: báo worker và đóng stream upstream ngay"""
+    msg = Message.query.get(message_id)
+    if not msg or msg.role != 'assistant':
+        return jsonify({"error": "Không tìm thấy tin nhắn"}), 404
+    
+    conv = Conversation.query.get(msg.conversation_id)
+    if not conv or conv.user_id != current_user.id:
+        return jsonify({"error": "Không có quyền"}), 403
+    
+    # Worker cùng process dừng ngay; worker ở process khác thấy status đổi ở lần lưu kế tiếp
+    signalled = generation_registry.cancel(message_id, current_user.id)
+    Message.query.filter_by(id=message_id, status='pending').update({'status': 'cancelled'})
+    db.session.commit()
+    
+    return jsonify({"success": True, "signalled": signalled})
+
+
 @conversation_bp.route("/api/messages/<int:message_id>/finalize", methods=["POST"])
 @login_required
 def finalize_message(message_id):
@@ -176,15 +328,13 @@ def finalize_message(message_id):
     if status not in ['completed', 'cancelled']:
         status = 'cancelled'
     
+    # Worker đang stream có thể đã ghi usage chính xác - chỉ ước tính nếu chưa có
+    prompt_tokens = completion_tokens = 0
     if msg.total_tokens == 0 and msg.content:
-        msg.prompt_tokens = estimate_tokens(msg.content) * 2
-        msg.completion_tokens = estimate_tokens(msg.content)
-        msg.total_tokens = msg.prompt_tokens + msg.completion_tokens
-        
-        conv.total_tokens += msg.total_tokens
-        current_user.add_tokens_used(msg.total_tokens)
-    
-    msg.status = status
+        completion_tokens = estimate_tokens(msg.content)
+        prompt_tokens = completion_tokens * 2
+    
+    record_message_usage(message_id, status, prompt_tokens, completion_tokens)
     db.session.commit()
     
     return jsonify({
@@ -0,0 +1,36 @@
+"""
+Search routes
+"""
+
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+
+from services.search_service import search_messages
+from utils.security import sanitize_input
+
+
+search_bp = Blueprint('search', __name__)
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_PAGE_MAX = 50
+SEARCH_MAX_OFFSET = 1000
+
+
+@search_bp.route("/api/search", methods=["GET"])
+@login_required
+def search():
+    """Tìm kiếm full-text trong các conversation (chưa xóa) của user"""
+    query = sanitize_input(request.args.get("q", ""), max_length=200)
+    if not query:
+        return jsonify({"error": "Từ khóa không được để trống"}), 400
+    
+    limit = request.args.get("limit", SEARCH_PAGE_SIZE, type=int)
+    limit = max(1, min(limit or SEARCH_PAGE_SIZE, SEARCH_PAGE_MAX))
+    offset = request.args.get("offset", 0, type=int)
+    offset = max(0, min(offset or 0, SEARCH_MAX_OFFSET))
+    
+    results, has_more = search_messages(current_user.id, query, limit=limit, offset=offset)
+    return jsonify({
+        "results": results,
+        "next_offset": offset + limit if has_more else None
+    })
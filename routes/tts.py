@@ -3,43 +3,23 @@ Text-to-Speech routes - Optimized for speed
 """
 
 import io
-import re
 
 from flask import Blueprint, request, jsonify, send_file, Response
 from flask_login import login_required
 
 from config import IS_PRODUCTION
 from services.tts_service import (
-    audio_cache, generate_tts_audio_simple,
+    audio_cache, generate_tts_audio_simple, get_tts_rate,
     get_user_voice_config, set_user_voice_config,
     AVAILABLE_VOICES, VALID_VOICE_IDS
 )
 from utils.security import sanitize_input, log_security_event
-from utils.helpers import get_cache_key
+from utils.helpers import get_cache_key, clean_text_for_tts
 
 
 tts_bp = Blueprint('tts', __name__)
 
 
-def clean_text_for_tts(text):
-    """Clean text for TTS - remove markdown and special chars"""
-    if not text:
-        return ""
-    # Remove markdown and special patterns
-    text = re.sub(r'[*#_`~]', '', text)
-    # Remove patterns like "A -", "B -", "C -" at the start
-    text = re.sub(r'^[A-Z]\s*-\s*', '', text)
-    # Remove double quotes
-    text = text.replace('"', '')
-    # Replace / with space
-    text = text.replace('/', ' ')
-    # Remove ellipsis
-    text = text.replace('...', ' ')
-    # Clean extra spaces
-    text = ' '.join(text.split())
-    return text.strip()
-
-
 @tts_bp.route("/api/voices", methods=["GET"])
 @login_required
 def get_voices():
@@ -108,7 +88,7 @@ def tts_single():
         if not text or len(text) < 2:
             return Response(b'', mimetype="audio/mpeg")  # Return empty audio instead of error
         
-        rate = "+15%" if lang == 'vi' else "+0%"
+        rate = get_tts_rate(lang)
         cache_key = get_cache_key(text, lang, rate)
         
         # Check cache first
@@ -147,7 +127,7 @@ def tts():
         if not text:
             return Response(b'', mimetype="audio/mpeg")
         
-        rate = "+15%" if lang == 'vi' else "+0%"
+        rate = get_tts_rate(lang)
         cache_key = get_cache_key(text, lang, rate)
         
         cached_audio = audio_cache.get(cache_key)
@@ -2,10 +2,21 @@
 Vocabulary routes
 """
 
-from flask import Blueprint, request, jsonify
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
 
+from sqlalchemy.exc import IntegrityError
+
 from models import db, Vocabulary
+from services.vocabulary_service import (
+    VOCAB_PAGE_SIZE, VOCAB_PAGE_MAX,
+    insert_vocabulary, list_vocabularies, normalize_word,
+    parse_vocabulary_import, import_vocabularies, iter_vocabulary_export,
+    REVIEW_PAGE_SIZE, REVIEW_PAGE_MAX, REVIEW_BATCH_MAX, REVIEW_MAX_GRADE,
+    due_vocabularies, submit_reviews
+)
 from utils.security import sanitize_input, sanitize_html
 
 
@@ -15,9 +26,86 @@ vocabulary_bp = Blueprint('vocabulary', __name__)
 @vocabulary_bp.route("/api/vocabularies", methods=["GET"])
 @login_required
 def get_vocabularies():
-    """Lấy danh sách từ vựng của user"""
-    vocabs = Vocabulary.query.filter_by(user_id=current_user.id).order_by(Vocabulary.created_at.desc()).all()
-    return jsonify({"vocabularies": [v.to_dict() for v in vocabs]})
+    """Lấy 1 trang từ vựng của user (?q= tìm theo prefix, ?cursor= trang tiếp)"""
+    limit = request.args.get("limit", VOCAB_PAGE_SIZE, type=int)
+    limit = max(1, min(limit or VOCAB_PAGE_SIZE, VOCAB_PAGE_MAX))
+    prefix = request.args.get("q", "")
+    cursor = request.args.get("cursor")
+    
+    vocabs, next_cursor = list_vocabularies(current_user.id, prefix, cursor, limit)
+    return jsonify({"vocabularies": vocabs, "next_cursor": next_cursor})
+
+
+@vocabulary_bp.route("/api/vocabularies/import", methods=["POST"])
+@login_required
+def import_vocabulary_list():
+    """Import nhiều từ 1 lần: JSON body, CSV body hoặc file upload (.csv/.json)"""
+    upload = request.files.get("file")
+    try:
+        if upload:
+            fmt = 'json' if (upload.filename or '').lower().endswith('.json') else 'csv'
+            items = parse_vocabulary_import(upload.read(), fmt)
+        elif request.is_json:
+            items = parse_vocabulary_import(request.get_json(silent=True), 'json')
+        else:
+            items = parse_vocabulary_import(request.get_data(), 'csv')
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": f"Dữ liệu import không hợp lệ: {str(e)[:100]}"}), 400
+    
+    stats = import_vocabularies(current_user.id, items)
+    db.session.commit()
+    return jsonify({"success": True, **stats})
+
+
+@vocabulary_bp.route("/api/vocabularies/export", methods=["GET"])
+@login_required
+def export_vocabulary_list():
+    """Export toàn bộ từ vựng (stream, ?format=csv|json)"""
+    fmt = 'json' if request.args.get("format") == 'json' else 'csv'
+    filename = f"vocabularies-{datetime.utcnow():%Y%m%d}.{fmt}"
+    return Response(
+        stream_with_context(iter_vocabulary_export(current_user.id, fmt)),
+        mimetype='application/json' if fmt == 'json' else 'text/csv',
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+@vocabulary_bp.route("/api/vocabularies/due", methods=["GET"])
+@login_required
+def get_due_vocabularies():
+    """N từ đến hạn ôn sớm nhất (?limit=)"""
+    limit = request.args.get("limit", REVIEW_PAGE_SIZE, type=int)
+    limit = max(1, min(limit or REVIEW_PAGE_SIZE, REVIEW_PAGE_MAX))
+    
+    vocabs, has_more = due_vocabularies(current_user.id, limit)
+    return jsonify({"vocabularies": vocabs, "has_more": has_more})
+
+
+@vocabulary_bp.route("/api/vocabularies/review", methods=["POST"])
+@login_required
+def review_vocabularies():
+    """Ghi kết quả ôn cho nhiều từ: {"reviews": [{"id": 1, "grade": 0-5}, ...]}"""
+    data = request.json or {}
+    entries = data.get("reviews")
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"error": "Danh sách ôn tập trống"}), 400
+    if len(entries) > REVIEW_BATCH_MAX:
+        return jsonify({"error": f"Tối đa {REVIEW_BATCH_MAX} từ mỗi lần"}), 400
+    
+    reviews = {}
+    for entry in entries:
+        vocab_id = entry.get("id") if isinstance(entry, dict) else None
+        grade = entry.get("grade") if isinstance(entry, dict) else None
+        if type(vocab_id) is not int or type(grade) is not int or not 0 <= grade <= REVIEW_MAX_GRADE:
+            return jsonify({"error": "Dữ liệu ôn tập không hợp lệ"}), 400
+        reviews[vocab_id] = grade
+    
+    updated = submit_reviews(current_user.id, reviews)
+    db.session.commit()
+    return jsonify({"success": True, "vocabularies": updated})
 
 
 @vocabulary_bp.route("/api/vocabularies", methods=["POST"])
@@ -28,16 +116,13 @@ def add_vocabulary():
     word = sanitize_html(sanitize_input(data.get("word", ""), max_length=200))
     note = sanitize_html(sanitize_input(data.get("note", ""), max_length=1000))
     
-    if not word:
+    if not word or not normalize_word(word):
         return jsonify({"error": "Từ vựng không được để trống"}), 400
     
-    existing = Vocabulary.query.filter_by(user_id=current_user.id, word=word).first()
-    if existing:
-        return jsonify({"error": "Từ này đã có trong danh sách", "vocabulary": existing.to_dict()}), 409
-    
-    vocab = Vocabulary(user_id=current_user.id, word=word, note=note)
-    db.session.add(vocab)
+    vocab, created = insert_vocabulary(current_user.id, word, note)
     db.session.commit()
+    if not created:
+        return jsonify({"error": "Từ này đã có trong danh sách", "vocabulary": vocab.to_dict()}), 409
     return jsonify({"success": True, "vocabulary": vocab.to_dict()})
 
 
@@ -66,7 +151,15 @@ def update_vocabulary(vocab_id):
     if "note" in data:
         vocab.note = sanitize_html(sanitize_input(data["note"], max_length=1000))
     if "word" in data:
-        vocab.word = sanitize_html(sanitize_input(data["word"], max_length=200))
+        word = sanitize_html(sanitize_input(data["word"], max_length=200))
+        if not normalize_word(word):
+            return jsonify({"error": "Từ vựng không được để trống"}), 400
+        vocab.word = word
+        vocab.word_normalized = normalize_word(word)
     
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "Từ này đã có trong danh sách"}), 409
     return jsonify({"success": True, "vocabulary": vocab.to_dict()})
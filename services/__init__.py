@@ -1,21 +1,89 @@
 """
 Service modules
+
+Re-export lười (PEP 562): `from services import chat_with_ai` chỉ import module chứa tên đó.
+Import `services.<module>` không kéo theo mọi service khác (TTS, AI client, search...).
 """
 
-from .tts_service import (
-    TTLCache,
-    audio_cache,
-    generate_tts_audio,
-    generate_tts_audio_async,
-    pre_generate_tts,
-    get_user_voice_config,
-    set_user_voice_config,
-    DEFAULT_VOICE_CONFIG,
-    AVAILABLE_VOICES,
-    VALID_VOICE_IDS
-)
-
-from .ai_service import (
-    client,
-    chat_with_ai
-)
+import importlib
+
+
+_EXPORTS = {
+    '.tts_service': (
+        'TTLCache',
+        'audio_cache',
+        'generate_tts_audio',
+        'generate_tts_audio_async',
+        'pre_generate_tts',
+        'get_user_voice_config',
+        'set_user_voice_config',
+        'DEFAULT_VOICE_CONFIG',
+        'AVAILABLE_VOICES',
+        'VALID_VOICE_IDS',
+    ),
+    '.ai_service': (
+        'get_client',
+        'chat_with_ai',
+    ),
+    '.admission_service': (
+        'AdmissionController',
+        'chat_admission',
+    ),
+    '.generation_service': (
+        'GenerationRegistry',
+        'generation_registry',
+        'record_message_usage',
+        'close_pending_messages',
+    ),
+    '.idempotency_service': (
+        'IdempotencyStore',
+        'IdempotencyConflict',
+        'IdempotencyInProgress',
+        'chat_idempotency',
+        'purge_expired_chat_requests',
+    ),
+    '.speculative_service': (
+        'SpeculativeStore',
+        'speculative_store',
+    ),
+    '.maintenance_service': (
+        'MaintenanceWorker',
+        'maintenance_worker',
+        'purge_deleted_conversations',
+        'close_stale_pending_messages',
+    ),
+    '.search_service': (
+        'ensure_search_index',
+        'search_messages',
+    ),
+    '.archive_service': (
+        'archive_inactive_conversations',
+        'rehydrate_conversation',
+    ),
+    '.vocabulary_service': (
+        'normalize_word',
+        'insert_vocabulary',
+        'list_vocabularies',
+    ),
+    '.user_cache_service': (
+        'UserCache',
+        'user_cache',
+    ),
+}
+
+_MODULE_BY_NAME = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = list(_MODULE_BY_NAME)
+
+
+def __getattr__(name):
+    module = _MODULE_BY_NAME.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
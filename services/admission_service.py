@@ -0,0 +1,154 @@
+"""
+Admission Service - fair concurrency control for LLM generation
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+from config import CHAT_MAX_CONCURRENT, CHAT_MAX_PER_USER, CHAT_MAX_QUEUED_PER_USER
+
+
+# ==================== ADMISSION TICKET ====================
+
+class AdmissionTicket:
+    """Chỗ của 1 request trong hàng đợi"""
+    __slots__ = ('user_id', 'granted', 'released', 'enqueued_at')
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.granted = False
+        self.released = False
+        self.enqueued_at = time.time()
+
+
+# ==================== ADMISSION CONTROLLER ====================
+
+class AdmissionController:
+    """
+    Thread-safe admission controller.
+
+    - Giới hạn tổng số generation chạy đồng thời (global cap)
+    - Giới hạn số generation của mỗi user (per-user cap)
+    - Hàng đợi round-robin giữa các user: mỗi user được cấp 1 slot theo lượt,
+      nên 1 user gửi nhiều request không chiếm hết worker của người khác
+    """
+    def __init__(self, max_concurrent=8, max_per_user=2, max_queued_per_user=4):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_queued_per_user = max_queued_per_user
+        self.cond = threading.Condition()
+        self.active = 0
+        self.active_per_user = {}
+        # user_id -> deque[AdmissionTicket], thứ tự key = thứ tự round-robin
+        self.waiting = OrderedDict()
+
+    def queued_count(self, user_id):
+        """Số request của user đang chờ"""
+        with self.cond:
+            return len(self.waiting.get(user_id, ()))
+
+    def try_enqueue(self, user_id):
+        """
+        Xếp 1 request vào hàng đợi, cấp slot ngay nếu còn chỗ.
+        Kiểm tra giới hạn hàng đợi và xếp vào trong cùng 1 lần giữ lock; trả về None nếu user
+        đã có đủ max_queued_per_user request đang chờ. Ticket trả về phải được release().
+        """
+        with self.cond:
+            queue = self.waiting.get(user_id)
+            if queue is not None and len(queue) >= self.max_queued_per_user:
+                return None
+            ticket = AdmissionTicket(user_id)
+            self.waiting.setdefault(user_id, deque()).append(ticket)
+            self._dispatch()
+            return ticket
+
+    def wait(self, ticket, timeout):
+        """Chờ tối đa `timeout` giây, trả về True nếu đã được cấp slot"""
+        with self.cond:
+            if not ticket.granted:
+                self.cond.wait_for(lambda: ticket.granted, timeout=timeout)
+            return ticket.granted
+
+    def position(self, ticket):
+        """Vị trí (1-based) của ticket theo thứ tự round-robin, 0 nếu đã được cấp"""
+        with self.cond:
+            if ticket.granted:
+                return 0
+            queue = self.waiting.get(ticket.user_id)
+            if not queue or ticket not in queue:
+                return 0
+            rank = queue.index(ticket)
+            ahead = rank
+            before = True
+            for user_id, other in self.waiting.items():
+                if user_id == ticket.user_id:
+                    before = False
+                    continue
+                # User đứng trước trong vòng được phục vụ thêm 1 lượt ở vòng hiện tại
+                ahead += min(len(other), rank + 1 if before else rank)
+            return ahead + 1
+
+    def release(self, ticket):
+        """Trả slot (hoặc rời hàng đợi) - gọi đúng 1 lần cho mỗi ticket"""
+        with self.cond:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket.granted:
+                self.active -= 1
+                remaining = self.active_per_user.get(ticket.user_id, 1) - 1
+                if remaining > 0:
+                    self.active_per_user[ticket.user_id] = remaining
+                else:
+                    self.active_per_user.pop(ticket.user_id, None)
+            else:
+                queue = self.waiting.get(ticket.user_id)
+                if queue and ticket in queue:
+                    queue.remove(ticket)
+                    if not queue:
+                        del self.waiting[ticket.user_id]
+            self._dispatch()
+
+    def stats(self):
+        with self.cond:
+            return {
+                'active': self.active,
+                'queued': sum(len(q) for q in self.waiting.values()),
+                'waiting_users': len(self.waiting),
+            }
+
+    def _dispatch(self):
+        """Cấp slot trống theo round-robin (gọi khi đang giữ lock)"""
+        granted_any = False
+        while self.active < self.max_concurrent and self.waiting:
+            chosen = None
+            for user_id in self.waiting:
+                if self.active_per_user.get(user_id, 0) < self.max_per_user:
+                    chosen = user_id
+                    break
+            if chosen is None:
+                break
+
+            queue = self.waiting[chosen]
+            ticket = queue.popleft()
+            # Đưa user xuống cuối vòng để nhường lượt cho user khác
+            del self.waiting[chosen]
+            if queue:
+                self.waiting[chosen] = queue
+
+            ticket.granted = True
+            self.active += 1
+            self.active_per_user[chosen] = self.active_per_user.get(chosen, 0) + 1
+            granted_any = True
+
+        if granted_any:
+            self.cond.notify_all()
+
+
+# Global admission controller cho /api/chat (per process)
+chat_admission = AdmissionController(
+    max_concurrent=CHAT_MAX_CONCURRENT,
+    max_per_user=CHAT_MAX_PER_USER,
+    max_queued_per_user=CHAT_MAX_QUEUED_PER_USER
+)
@@ -2,16 +2,27 @@
 AI Service - DeepSeek API integration
 """
 
-from openai import OpenAI
+import threading
 
 from config import DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL
 
 
-# Initialize DeepSeek client
-client = OpenAI(
-    api_key=DEEPSEEK_API_KEY,
-    base_url=DEEPSEEK_BASE_URL
-)
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """DeepSeek client, tạo lần đầu dùng (import openai tốn thời gian khởi động worker/CLI)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(
+                    api_key=DEEPSEEK_API_KEY,
+                    base_url=DEEPSEEK_BASE_URL
+                )
+    return _client
 
 
 def chat_with_ai(messages, model="deepseek-chat", temperature=0.7, max_tokens=2000, stream=True):
@@ -28,7 +39,7 @@ def chat_with_ai(messages, model="deepseek-chat", temperature=0.7, max_tokens=20
     Returns:
         Stream object if stream=True, else completion object
     """
-    return client.chat.completions.create(
+    return get_client().chat.completions.create(
         model=model,
         messages=messages,
         temperature=temperature,
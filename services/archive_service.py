@@ -0,0 +1,231 @@
+"""
+Archive Service - cold storage for messages of inactive conversations
+
+Conversation không cập nhật quá ARCHIVE_AFTER_DAYS ngày: messages được gom thành
+các block JSON nén zlib trong `message_archives` rồi xóa khỏi `messages`, nên bảng
+và index của đường nóng chỉ chứa hội thoại còn hoạt động.
+Mở lại conversation (xem, chat) thì rehydrate ngay trong request đó, message giữ nguyên id.
+SQLite: row FTS `message_search` được giữ khi archive (trigger bỏ qua conversation
+is_archived) nên message đã archive vẫn tìm được; MySQL FULLTEXT nằm trên `messages`
+nên chỉ tìm được sau khi rehydrate.
+Counter/preview trên conversation không đổi nên sidebar không cần rehydrate.
+Rehydrate ghi `rehydrated_at` (không đổi updated_at/thứ tự sidebar); job chỉ archive lại
+sau ARCHIVE_AFTER_DAYS ngày kể từ lần mở đó.
+"""
+
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, or_, select
+
+from config import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+from models import db, Conversation, Message, MessageArchive
+from services.search_service import delete_search_rows
+
+
+ARCHIVE_FORMAT_VERSION = 2  # v2: thêm id; block v1 vẫn đọc được (rehydrate cấp id mới)
+ARCHIVE_READABLE_VERSIONS = (1, 2)
+ARCHIVE_COMPRESSION_LEVEL = 9
+ARCHIVE_BLOCK_BYTES = 1024 * 1024  # Kích thước JSON (chưa nén) tối đa / block
+REHYDRATE_ID_CHUNK = 500  # Số id / câu IN khi kiểm tra id gốc còn trống
+
+ARCHIVE_MESSAGE_FIELDS = (
+    'id', 'role', 'content', 'segments', 'status',
+    'prompt_tokens', 'completion_tokens', 'total_tokens', 'created_at'
+)
+ARCHIVE_MESSAGE_COLUMNS = tuple(getattr(Message, field) for field in ARCHIVE_MESSAGE_FIELDS)
+
+
+# ==================== ENCODING ====================
+
+def encode_block(rows):
+    """Nén 1 block messages. Trả về (data, raw_size)"""
+    raw = json.dumps({
+        'v': ARCHIVE_FORMAT_VERSION,
+        'fields': ARCHIVE_MESSAGE_FIELDS,
+        'rows': rows
+    }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return zlib.compress(raw, ARCHIVE_COMPRESSION_LEVEL), len(raw)
+
+
+def decode_block(data):
+    """Giải nén 1 block thành list dict (created_at là datetime)"""
+    block = json.loads(zlib.decompress(data))
+    if block.get('v') not in ARCHIVE_READABLE_VERSIONS:
+        raise ValueError(f"Unsupported archive format: {block.get('v')}")
+    fields = block['fields']
+    messages = []
+    for row in block['rows']:
+        message = dict(zip(fields, row))
+        message['created_at'] = datetime.fromisoformat(message['created_at'])
+        messages.append(message)
+    return messages
+
+
+def pack_blocks(rows):
+    """Gom các dòng message (theo thứ tự) thành block ~ARCHIVE_BLOCK_BYTES"""
+    block, size = [], 0
+    for row in rows:
+        block.append([
+            row.id, row.role, row.content, row.segments, row.status,
+            row.prompt_tokens, row.completion_tokens, row.total_tokens,
+            row.created_at.isoformat()
+        ])
+        size += len(row.content) + len(row.segments or '')
+        if size >= ARCHIVE_BLOCK_BYTES:
+            yield block
+            block, size = [], 0
+    if block:
+        yield block
+
+
+# ==================== ARCHIVE / REHYDRATE ====================
+
+def inactive_since(threshold):
+    """Điều kiện conversation không hoạt động (không cập nhật, không mở lại) từ `threshold`"""
+    return [
+        Conversation.is_archived == False,
+        Conversation.is_deleted == False,
+        Conversation.updated_at < threshold,
+        or_(Conversation.rehydrated_at == None, Conversation.rehydrated_at < threshold)
+    ]
+
+
+def archive_conversation(conv_id, threshold):
+    """
+    Chuyển messages của 1 conversation vào archive nếu nó vẫn không hoạt động từ `threshold`.
+
+    Claim bằng UPDATE có điều kiện (giữ nguyên updated_at để thứ tự sidebar không đổi)
+    nên chạy song song ở nhiều process vẫn an toàn. Trả về số message đã archive. Caller tự commit.
+    """
+    claimed = Conversation.query.filter(
+        Conversation.id == conv_id,
+        *inactive_since(threshold)
+    ).update({
+        'is_archived': True,
+        'archived_at': datetime.utcnow(),
+        'updated_at': Conversation.updated_at
+    }, synchronize_session=False)
+    if not claimed:
+        return 0
+
+    rows = db.session.query(*ARCHIVE_MESSAGE_COLUMNS).filter(
+        Message.conversation_id == conv_id
+    ).order_by(Message.id).all()
+    if not rows:
+        return 0
+
+    archives = []
+    for index, block in enumerate(pack_blocks(rows)):
+        data, raw_size = encode_block(block)
+        archives.append({
+            'conversation_id': conv_id,
+            'block_index': index,
+            'message_count': len(block),
+            'raw_size': raw_size,
+            'data': data,
+            'created_at': datetime.utcnow()
+        })
+    db.session.execute(insert(MessageArchive), archives)
+
+    Message.query.filter(
+        Message.conversation_id == conv_id,
+        Message.id <= rows[-1].id
+    ).delete(synchronize_session=False)
+    return len(rows)
+
+
+def iter_archived_blocks(conv_id):
+    """Đọc từng block messages đã archive theo thứ tự gốc (không rehydrate)"""
+    blocks = db.session.query(MessageArchive.data).filter(
+        MessageArchive.conversation_id == conv_id
+    ).order_by(MessageArchive.block_index)
+    for block in blocks:
+        yield decode_block(block.data)
+
+
+def iter_archived_messages(conv_id):
+    for block in iter_archived_blocks(conv_id):
+        yield from block
+
+
+def restore_messages(conv_id, messages):
+    """
+    Insert lại messages đã archive, giữ id gốc (link, Idempotency-Key, row FTS vẫn trỏ đúng).
+    SQLite không AUTOINCREMENT có thể đã cấp lại id lớn nhất cho message mới: id gốc bị chiếm
+    (hoặc block v1 không có id) thì cả conversation nhận id mới để giữ thứ tự.
+    """
+    rows = [{'conversation_id': conv_id, **message} for message in messages]
+    ids = [row.get('id') for row in rows]
+    keep_ids = None not in ids
+    for start in range(0, len(ids), REHYDRATE_ID_CHUNK):
+        if not keep_ids:
+            break
+        keep_ids = db.session.execute(
+            select(Message.id).where(Message.id.in_(ids[start:start + REHYDRATE_ID_CHUNK])).limit(1)
+        ).first() is None
+
+    if not keep_ids:
+        # Row FTS còn giữ theo id gốc sẽ không còn message tương ứng
+        delete_search_rows([i for i in ids if i is not None], conversation_id=conv_id)
+        rows = [{k: v for k, v in row.items() if k != 'id'} for row in rows]
+    if rows:
+        db.session.execute(insert(Message), rows)
+
+
+def rehydrate_conversation(conv):
+    """
+    Đưa messages đã archive trở lại bảng `messages` (gọi trước khi đọc/ghi messages).
+
+    Message giữ id gốc nên thứ tự và các tham chiếu tới message không đổi.
+    Request khác rehydrate cùng lúc thì chỉ 1 bên claim được. Tự commit.
+    Trả về True nếu lần gọi này đã rehydrate.
+    """
+    if not conv.is_archived:
+        return False
+
+    claimed = Conversation.query.filter_by(id=conv.id, is_archived=True).update({
+        'is_archived': False,
+        'archived_at': None,
+        'rehydrated_at': datetime.utcnow(),
+        'updated_at': Conversation.updated_at
+    }, synchronize_session=False)
+    if claimed:
+        restore_messages(conv.id, iter_archived_messages(conv.id))
+        MessageArchive.query.filter_by(conversation_id=conv.id).delete(synchronize_session=False)
+
+    # Commit cũng expire `conv` nên caller đọc lại trạng thái mới
+    db.session.commit()
+    return bool(claimed)
+
+
+def archived_message_ids(conv_ids):
+    """Id các message đang nằm trong archive của các conversation (để xóa row FTS khi purge)"""
+    ids = []
+    for conv_id in conv_ids:
+        ids.extend(message['id'] for message in iter_archived_messages(conv_id) if message.get('id') is not None)
+    return ids
+
+
+# ==================== JOB ====================
+
+def archive_inactive_conversations(batch_size=ARCHIVE_BATCH_SIZE, inactive_days=ARCHIVE_AFTER_DAYS):
+    """
+    Archive tối đa `batch_size` conversation không hoạt động lâu nhất (1 transaction / conversation).
+    Trả về số conversation đã archive.
+    """
+    if inactive_days <= 0:
+        return 0
+
+    threshold = datetime.utcnow() - timedelta(days=inactive_days)
+    ids = [row.id for row in db.session.query(Conversation.id).filter(
+        *inactive_since(threshold)
+    ).order_by(Conversation.updated_at).limit(batch_size)]
+
+    archived = 0
+    for conv_id in ids:
+        if archive_conversation(conv_id, threshold):
+            archived += 1
+        db.session.commit()
+    return archived
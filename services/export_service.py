@@ -0,0 +1,298 @@
+"""
+Export Service - streaming NDJSON export/import of a user's conversations
+
+Format: mỗi dòng 1 JSON object
+    {"type": "conversation", "id": ..., "title": ..., "total_tokens": ..., "created_at": ..., "updated_at": ...}
+    {"type": "message", "conversation_id": ..., "role": ..., "content": ..., "status": ..., "tokens": {...}, "created_at": ...}
+Message của 1 conversation đứng liền sau dòng conversation đó (trước conversation kế tiếp).
+"""
+
+import gzip
+import json
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, insert, or_, update
+
+from models import db, Conversation, Message
+from services.archive_service import iter_archived_blocks
+from utils.message_parser import parse_message, dump_parsed, message_preview
+from utils.security import sanitize_input, sanitize_html
+
+
+EXPORT_BATCH_SIZE = 500
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_LINE_BYTES = 256 * 1024
+IMPORT_MAX_MESSAGES = 100000
+IMPORT_MAX_CONVERSATIONS = 10000
+GZIP_MAGIC = b'\x1f\x8b'
+
+EXPORT_CONVERSATION_COLUMNS = (
+    Conversation.id,
+    Conversation.title,
+    Conversation.total_tokens,
+    Conversation.is_archived,
+    Conversation.created_at,
+    Conversation.updated_at
+)
+EXPORT_MESSAGE_COLUMNS = (
+    Message.id,
+    Message.role,
+    Message.content,
+    Message.status,
+    Message.prompt_tokens,
+    Message.completion_tokens,
+    Message.total_tokens,
+    Message.created_at
+)
+
+
+# ==================== EXPORT ====================
+
+def iter_export(user_id, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Generator: mỗi phần tử là 1 batch dòng NDJSON (str).
+    Đọc theo keyset từng batch nên bộ nhớ không phụ thuộc kích thước tài khoản.
+    """
+    last_created, last_id = None, None
+    while True:
+        query = db.session.query(*EXPORT_CONVERSATION_COLUMNS).filter(
+            Conversation.user_id == user_id,
+            Conversation.is_deleted == False
+        )
+        if last_id is not None:
+            query = query.filter(or_(
+                Conversation.created_at > last_created,
+                and_(Conversation.created_at == last_created, Conversation.id > last_id)
+            ))
+        convs = query.order_by(Conversation.created_at, Conversation.id).limit(batch_size).all()
+        if not convs:
+            return
+
+        for conv in convs:
+            yield json.dumps({
+                'type': 'conversation',
+                'id': conv.id,
+                'title': conv.title,
+                'total_tokens': conv.total_tokens,
+                'created_at': conv.created_at.isoformat(),
+                'updated_at': conv.updated_at.isoformat()
+            }, ensure_ascii=False) + '\n'
+            if conv.is_archived:
+                yield from iter_export_archived_messages(conv.id)
+            else:
+                yield from iter_export_messages(conv.id, batch_size)
+
+        last_created, last_id = convs[-1].created_at, convs[-1].id
+
+
+def export_message_line(conv_id, msg):
+    return json.dumps({
+        'type': 'message',
+        'conversation_id': conv_id,
+        'role': msg['role'],
+        'content': msg['content'],
+        'status': msg['status'],
+        'tokens': {
+            'prompt_tokens': msg['prompt_tokens'],
+            'completion_tokens': msg['completion_tokens'],
+            'total_tokens': msg['total_tokens']
+        },
+        'created_at': msg['created_at'].isoformat()
+    }, ensure_ascii=False) + '\n'
+
+
+def iter_export_messages(conv_id, batch_size):
+    last_id = 0
+    while True:
+        messages = db.session.query(*EXPORT_MESSAGE_COLUMNS).filter(
+            Message.conversation_id == conv_id,
+            Message.id > last_id,
+            Message.status != 'pending'
+        ).order_by(Message.id).limit(batch_size).all()
+        if not messages:
+            return
+
+        yield ''.join(export_message_line(conv_id, msg._mapping) for msg in messages)
+
+        last_id = messages[-1].id
+
+
+def iter_export_archived_messages(conv_id):
+    """Conversation đã archive: đọc thẳng từ block nén, không rehydrate"""
+    for block in iter_archived_blocks(conv_id):
+        yield ''.join(export_message_line(conv_id, msg) for msg in block if msg['status'] != 'pending')
+
+
+def gzip_chunks(chunks, level=6):
+    """Nén gzip on-the-fly từng chunk (không buffer toàn bộ output)"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# ==================== IMPORT ====================
+
+def open_import_stream(stream):
+    """Tự nhận diện gzip theo magic bytes"""
+    head = stream.peek(2)[:2] if hasattr(stream, 'peek') else b''
+    if head == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    return stream
+
+
+def to_token_count(value):
+    try:
+        return max(0, int(value or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def parse_timestamp(value):
+    """ISO 8601 -> datetime UTC naive (như cột DB); có timezone thì đổi về UTC"""
+    try:
+        parsed = datetime.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        parsed = None
+    if parsed is None:
+        return datetime.utcnow()
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def import_ndjson(user_id, stream, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Import NDJSON (có thể gzip) vào tài khoản user, insert nhiều dòng mỗi batch.
+
+    Conversation luôn được tạo mới (id mới), không ghi đè dữ liệu có sẵn.
+    Token được giữ để hiển thị nhưng không tính vào quota của user.
+    Cả lần import là 1 transaction: batch chỉ được gửi xuống DB, commit 1 lần ở cuối;
+    gặp lỗi (ValueError, lỗi DB) thì rollback toàn bộ, không để lại import dở dang.
+    Message chỉ gắn vào conversation ngay trước nó (đúng thứ tự của export) nên bộ nhớ
+    chỉ giữ counter của conversation đang đọc, không phụ thuộc kích thước file.
+    Trả về dict thống kê: conversations, messages, skipped.
+    """
+    stats = {'conversations': 0, 'messages': 0, 'skipped': 0}
+    current_source_id = None
+    current_id = None
+    current_updated_at = None
+    conv_rows = []
+    message_rows = []
+    counters = {}
+
+    def flush():
+        if conv_rows:
+            db.session.execute(insert(Conversation), conv_rows)
+            conv_rows.clear()
+        if message_rows:
+            db.session.execute(insert(Message), message_rows)
+            message_rows.clear()
+        if counters:
+            db.session.execute(update(Conversation), [{
+                'id': conv_id,
+                'message_count': counter['message_count'],
+                'completed_count': counter['completed_count'],
+                'last_message_at': counter['last_message_at'],
+                'last_message_preview': message_preview(counter['last_content']) or None,
+                # Giữ updated_at của file (nếu không onupdate đặt thành thời điểm import)
+                'updated_at': counter['updated_at']
+            } for conv_id, counter in counters.items()])
+            # Conversation đã đóng không nhận thêm message: chỉ giữ counter của conversation đang đọc
+            for conv_id in [conv_id for conv_id in counters if conv_id != current_id]:
+                del counters[conv_id]
+
+    try:
+        source = open_import_stream(stream)
+        while True:
+            line = source.readline(IMPORT_MAX_LINE_BYTES)
+            if not line:
+                break
+            if not line.endswith(b'\n') and len(line) >= IMPORT_MAX_LINE_BYTES:
+                raise ValueError("Dòng dữ liệu quá dài")
+            if not line.strip():
+                continue
+
+            try:
+                record = json.loads(line)
+            except ValueError:
+                stats['skipped'] += 1
+                continue
+            if not isinstance(record, dict):
+                stats['skipped'] += 1
+                continue
+
+            if record.get('type') == 'conversation':
+                if stats['conversations'] >= IMPORT_MAX_CONVERSATIONS:
+                    raise ValueError("Vượt quá số cuộc trò chuyện tối đa cho 1 lần import")
+                current_source_id = str(record.get('id'))
+                current_id = str(uuid.uuid4())
+                created_at = parse_timestamp(record.get('created_at'))
+                current_updated_at = parse_timestamp(record.get('updated_at')) if record.get('updated_at') else created_at
+                conv_rows.append({
+                    'id': current_id,
+                    'user_id': user_id,
+                    'title': sanitize_html(sanitize_input(record.get('title'), max_length=200)) or 'Cuộc trò chuyện mới',
+                    'total_tokens': to_token_count(record.get('total_tokens')),
+                    'created_at': created_at,
+                    'updated_at': current_updated_at,
+                    'is_deleted': False
+                })
+                stats['conversations'] += 1
+
+            elif record.get('type') == 'message':
+                role = record.get('role')
+                content = sanitize_input(record.get('content'), max_length=20000)
+                if (current_id is None or str(record.get('conversation_id')) != current_source_id
+                        or role not in ('user', 'assistant') or not content):
+                    stats['skipped'] += 1
+                    continue
+                if stats['messages'] >= IMPORT_MAX_MESSAGES:
+                    raise ValueError("Vượt quá số message tối đa cho 1 lần import")
+
+                tokens = record.get('tokens') if isinstance(record.get('tokens'), dict) else {}
+                prompt_tokens = to_token_count(tokens.get('prompt_tokens'))
+                completion_tokens = to_token_count(tokens.get('completion_tokens'))
+                status = 'cancelled' if record.get('status') == 'cancelled' else 'completed'
+                created_at = parse_timestamp(record.get('created_at'))
+                message_rows.append({
+                    'conversation_id': current_id,
+                    'role': role,
+                    'content': content,
+                    'segments': dump_parsed(parse_message(content)) if role == 'assistant' else None,
+                    'status': status,
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens,
+                    'created_at': created_at
+                })
+                stats['messages'] += 1
+
+                counter = counters.setdefault(current_id, {
+                    'message_count': 0, 'completed_count': 0, 'last_message_at': None, 'last_content': '',
+                    'updated_at': current_updated_at
+                })
+                counter['message_count'] += 1
+                if status == 'completed':
+                    counter['completed_count'] += 1
+                    if counter['last_message_at'] is None or created_at >= counter['last_message_at']:
+                        counter['last_message_at'] = created_at
+                        counter['last_content'] = content
+
+            else:
+                stats['skipped'] += 1
+                continue
+
+            if len(conv_rows) + len(message_rows) >= batch_size:
+                flush()
+
+        flush()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return stats
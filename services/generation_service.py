@@ -0,0 +1,201 @@
+"""
+Generation Service - track in-flight LLM streams so they can be cancelled
+"""
+
+import threading
+import time
+
+from models import User, Conversation, Message
+from utils.helpers import estimate_tokens
+from utils.message_parser import message_preview
+
+
+# ==================== ACTIVE GENERATIONS ====================
+
+class ActiveGeneration:
+    """
+    1 stream LLM đang chạy cho 1 assistant message.
+
+    Các SSE event đã gửi được giữ lại để request trùng (Idempotency-Key)
+    có thể phát lại từ đầu rồi theo dõi tiếp thay vì gọi API lần nữa.
+    """
+    __slots__ = ('message_id', 'user_id', 'cancelled', 'stream', 'events', 'finished', 'cond')
+
+    def __init__(self, message_id, user_id):
+        self.message_id = message_id
+        self.user_id = user_id
+        self.cancelled = threading.Event()
+        self.stream = None
+        self.events = []
+        self.finished = False
+        self.cond = threading.Condition()
+
+    def publish(self, event):
+        with self.cond:
+            self.events.append(event)
+            self.cond.notify_all()
+
+    def finish(self):
+        with self.cond:
+            self.finished = True
+            self.cond.notify_all()
+
+    def follow(self, idle_timeout=120, poll_interval=1.0):
+        """Generator: phát lại các event đã có rồi chờ event mới tới khi stream kết thúc"""
+        index = 0
+        idle_since = time.time()
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: index < len(self.events) or self.finished, timeout=poll_interval)
+                pending = self.events[index:]
+                finished = self.finished
+            index += len(pending)
+            for event in pending:
+                yield event
+            if finished:
+                return
+            if pending:
+                idle_since = time.time()
+            elif time.time() - idle_since > idle_timeout:
+                return
+            else:
+                yield ": keep-alive\n\n"
+
+    def attach(self, stream):
+        """Gắn stream upstream; đóng ngay nếu đã bị hủy trước đó"""
+        self.stream = stream
+        if self.cancelled.is_set():
+            self.close()
+
+    def cancel(self):
+        self.cancelled.set()
+        self.close()
+
+    def close(self):
+        """Đóng HTTP response upstream để DeepSeek ngừng sinh token"""
+        stream = self.stream
+        if stream is None:
+            return
+        try:
+            stream.response.close()
+        except Exception:
+            pass
+
+
+class GenerationRegistry:
+    """Thread-safe registry: assistant message id -> ActiveGeneration (per process)"""
+    def __init__(self):
+        self.active = {}
+        self.lock = threading.Lock()
+
+    def register(self, message_id, user_id):
+        generation = ActiveGeneration(message_id, user_id)
+        with self.lock:
+            self.active[message_id] = generation
+        return generation
+
+    def get(self, message_id):
+        with self.lock:
+            return self.active.get(message_id)
+
+    def unregister(self, generation):
+        with self.lock:
+            if self.active.get(generation.message_id) is generation:
+                del self.active[generation.message_id]
+
+    def cancel(self, message_id, user_id):
+        """Hủy generation nếu nó đang chạy trong process này"""
+        with self.lock:
+            generation = self.active.get(message_id)
+        if generation is None or generation.user_id != user_id:
+            return False
+        generation.cancel()
+        return True
+
+
+# Global registry cho /api/chat
+generation_registry = GenerationRegistry()
+
+
+# ==================== USAGE ACCOUNTING ====================
+
+def record_message_usage(message_id, status, prompt_tokens, completion_tokens, content=None, segments=None):
+    """
+    Ghi usage cho 1 assistant message và cộng vào conversation/user đúng 1 lần.
+
+    Claim bằng UPDATE ... WHERE total_tokens = 0 nên worker đang stream,
+    endpoint cancel và endpoint finalize có thể gọi song song mà không tính trùng.
+    Counter completed/preview của conversation cũng chỉ đổi khi status thực sự đổi.
+    Trả về True nếu lần gọi này là lần tính token. Caller tự commit.
+    """
+    total_tokens = prompt_tokens + completion_tokens
+    values = {'status': status}
+    if content is not None:
+        values['content'] = content
+    if segments is not None:
+        values['segments'] = segments
+
+    # Vào/ra trạng thái 'completed' (UPDATE có điều kiện nên chỉ 1 caller thấy)
+    if status == 'completed':
+        transition = Message.status != 'completed'
+    else:
+        transition = Message.status == 'completed'
+    changed = Message.query.filter(Message.id == message_id, transition).update(values)
+    if not changed:
+        Message.query.filter_by(id=message_id).update(values)
+
+    claimed = 0
+    if total_tokens > 0:
+        claimed = Message.query.filter(
+            Message.id == message_id,
+            Message.total_tokens == 0
+        ).update({
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': total_tokens
+        })
+
+    if not claimed and not changed:
+        return False
+
+    msg = Message.query.get(message_id)
+    conv = Conversation.query.get(msg.conversation_id) if msg else None
+    if conv and changed:
+        if status == 'completed':
+            conv.record_message_completed(msg.created_at, message_preview(msg.content))
+        else:
+            conv.completed_count = max(0, (conv.completed_count or 0) - 1)
+    if conv and claimed:
+        conv.total_tokens += total_tokens
+        user = User.query.get(conv.user_id)
+        if user:
+            user.add_tokens_used(total_tokens)
+    return bool(claimed)
+
+
+def close_pending_messages(message_ids):
+    """
+    Đóng các message còn 'pending' của lượt chat đã kết thúc mà không hoàn tất
+    (lỗi, hết thời gian chờ, client ngắt trước khi stream bắt đầu, process chết).
+
+    - user: cancelled (client hiển thị nút thử lại)
+    - assistant có nội dung: cancelled + usage ước tính
+    - assistant rỗng: xóa
+    Caller tự commit.
+    """
+    pending = Message.query.filter(
+        Message.id.in_(message_ids),
+        Message.status == 'pending'
+    ).all()
+    
+    for msg in pending:
+        if msg.role == 'user':
+            Message.query.filter_by(id=msg.id, status='pending').update({'status': 'cancelled'})
+        elif msg.content:
+            completion_tokens = estimate_tokens(msg.content)
+            record_message_usage(msg.id, 'cancelled', completion_tokens * 2, completion_tokens)
+        elif Message.query.filter_by(id=msg.id, status='pending').delete():
+            conv = Conversation.query.get(msg.conversation_id)
+            if conv:
+                conv.add_messages(-1)
+    return len(pending)
@@ -0,0 +1,127 @@
+"""
+Idempotency Service - dedupe duplicate /api/chat submissions
+
+Key lưu trong bảng chat_requests (unique (user_id, key)) nên mọi worker gunicorn thấy cùng 1
+bản ghi: INSERT thành công = chạy generation, INSERT trùng = phát lại kết quả lần đầu.
+Hash body của lần đầu được lưu kèm; cùng key nhưng nội dung khác là lỗi của client (422).
+"""
+
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from config import CHAT_IDEMPOTENCY_TTL
+from models import db, ChatRequest
+
+
+class IdempotencyConflict(Exception):
+    """Key đã dùng cho request có body khác - caller trả 422"""
+
+
+class IdempotencyInProgress(Exception):
+    """Lần submit đầu chưa tạo xong message sau thời gian chờ - caller trả 409"""
+
+
+# ==================== IDEMPOTENCY STORE ====================
+
+class IdempotencyStore:
+    """
+    Store dùng chung giữa các process, TTL cố định tính từ lần submit đầu.
+
+    Record là row ChatRequest: assistant_message_id NULL nghĩa là lần submit đầu đang
+    tạo message; bind() gắn id để request trùng phát lại, release() xóa để chạy lại.
+    """
+    def __init__(self, ttl_seconds=600, poll_interval=0.1):
+        self.ttl = ttl_seconds
+        self.poll_interval = poll_interval
+
+    @staticmethod
+    def key_digest(key):
+        return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def request_hash(*parts):
+        """Hash các trường xác định 1 request (message, conversation, retry...)"""
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode()).hexdigest()
+
+    def reserve(self, user_id, key, request_hash):
+        """
+        Giữ chỗ cho key (commit ngay để worker khác thấy). Trả về (record, created):
+        created=False nghĩa là key đã được dùng trong cửa sổ TTL.
+        Raise IdempotencyConflict nếu lần dùng trước có body khác.
+        """
+        digest = self.key_digest(key)
+        for _ in range(2):
+            now = datetime.utcnow()
+            # Key hết hạn coi như chưa dùng
+            ChatRequest.query.filter(
+                ChatRequest.user_id == user_id,
+                ChatRequest.key_digest == digest,
+                ChatRequest.expires_at <= now
+            ).delete(synchronize_session='fetch')
+            record = ChatRequest(
+                user_id=user_id, key_digest=digest, request_hash=request_hash,
+                expires_at=now + timedelta(seconds=self.ttl)
+            )
+            db.session.add(record)
+            try:
+                db.session.commit()
+                return record, True
+            except IntegrityError:
+                db.session.rollback()
+
+            record = ChatRequest.query.filter_by(user_id=user_id, key_digest=digest).first()
+            if record is None:
+                # Bị release giữa INSERT và SELECT - giữ chỗ lại
+                continue
+            if record.request_hash != request_hash:
+                raise IdempotencyConflict()
+            return record, False
+        raise IdempotencyInProgress()
+
+    def bind(self, record, conversation_id, user_message_id, assistant_message_id):
+        ChatRequest.query.filter_by(id=record.id).update({
+            'conversation_id': conversation_id,
+            'user_message_id': user_message_id,
+            'assistant_message_id': assistant_message_id
+        }, synchronize_session=False)
+        db.session.commit()
+
+    def release(self, record):
+        """Bỏ key (lần submit thất bại) để request sau được chạy lại"""
+        ChatRequest.query.filter_by(id=record.id).delete(synchronize_session=False)
+        db.session.commit()
+
+    def wait_bound(self, record_id, timeout):
+        """
+        Chờ lần submit đầu (có thể ở worker khác) gắn message id.
+        Trả về row đã bind, None nếu record đã bị release; raise IdempotencyInProgress khi hết giờ.
+        """
+        table = ChatRequest.__table__
+        deadline = time.monotonic() + timeout
+        while True:
+            # Connection riêng mỗi lần đọc: transaction mới thấy commit của worker khác (MySQL REPEATABLE READ)
+            with db.engine.connect() as conn:
+                row = conn.execute(select(table).where(table.c.id == record_id)).first()
+            if row is None or row.assistant_message_id is not None:
+                return row
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgress()
+            time.sleep(self.poll_interval)
+
+
+def purge_expired_chat_requests():
+    """Xóa key quá TTL. Trả về số row đã xóa"""
+    purged = ChatRequest.query.filter(
+        ChatRequest.expires_at < datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return purged
+
+
+# Global store cho /api/chat
+chat_idempotency = IdempotencyStore(ttl_seconds=CHAT_IDEMPOTENCY_TTL)
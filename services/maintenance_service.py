@@ -0,0 +1,128 @@
+"""
+Maintenance Service - periodic background jobs (purging deleted conversations, stale pending messages,
+cold archive, expired chat Idempotency-Keys)
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+from config import (
+    CONVERSATION_RESTORE_SECONDS, MAINTENANCE_INTERVAL, PURGE_BATCH_SIZE,
+    PENDING_MESSAGE_TIMEOUT
+)
+from models import db, Conversation, Message, MessageArchive
+from services.archive_service import archive_inactive_conversations, archived_message_ids
+from services.generation_service import close_pending_messages
+from services.idempotency_service import purge_expired_chat_requests
+from services.search_service import delete_search_rows
+from utils.security import log_security_event
+
+
+# ==================== JOBS ====================
+
+def purge_deleted_conversations(batch_size=PURGE_BATCH_SIZE, grace_seconds=CONVERSATION_RESTORE_SECONDS):
+    """
+    Xóa hẳn conversations đã xóa mềm quá cửa sổ hoàn tác (mọi user).
+
+    Dùng DELETE theo tập (messages rồi conversations) từng batch, không load
+    ORM object nên conversation lớn cũng không làm chậm request nào.
+    Trả về số conversation đã xóa.
+    """
+    threshold = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    purged = 0
+
+    while True:
+        ids = [row.id for row in db.session.query(Conversation.id).filter(
+            Conversation.is_deleted == True,
+            Conversation.deleted_at < threshold
+        ).limit(batch_size)]
+        if not ids:
+            break
+
+        # Row FTS của message đã archive không bị trigger xóa theo
+        delete_search_rows(archived_message_ids(ids))
+        Message.query.filter(Message.conversation_id.in_(ids)).delete(synchronize_session=False)
+        MessageArchive.query.filter(MessageArchive.conversation_id.in_(ids)).delete(synchronize_session=False)
+        Conversation.query.filter(
+            Conversation.id.in_(ids),
+            Conversation.is_deleted == True
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+        purged += len(ids)
+        if len(ids) < batch_size:
+            break
+
+    return purged
+
+
+def close_stale_pending_messages(batch_size=PURGE_BATCH_SIZE, max_age_seconds=PENDING_MESSAGE_TIMEOUT):
+    """
+    Đóng message 'pending' quá cũ mà không worker nào hoàn tất
+    (client ngắt trước khi stream bắt đầu, process bị kill giữa chừng).
+    Trả về số message đã xử lý.
+    """
+    threshold = datetime.utcnow() - timedelta(seconds=max_age_seconds)
+    closed = 0
+
+    while True:
+        ids = [row.id for row in db.session.query(Message.id).filter(
+            Message.status == 'pending',
+            Message.created_at < threshold
+        ).order_by(Message.id).limit(batch_size)]
+        if not ids:
+            break
+
+        close_pending_messages(ids)
+        db.session.commit()
+
+        closed += len(ids)
+        if len(ids) < batch_size:
+            break
+
+    return closed
+
+
+MAINTENANCE_JOBS = [
+    purge_deleted_conversations, close_stale_pending_messages, archive_inactive_conversations,
+    purge_expired_chat_requests
+]
+
+
+# ==================== WORKER ====================
+
+class MaintenanceWorker:
+    """Daemon thread chạy MAINTENANCE_JOBS mỗi `interval` giây trong app context"""
+    def __init__(self, jobs, interval=60):
+        self.jobs = jobs
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self, app):
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._loop, args=(app,), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run_once(self, app):
+        with app.app_context():
+            for job in self.jobs:
+                try:
+                    job()
+                except Exception as e:
+                    db.session.rollback()
+                    log_security_event('MAINTENANCE_ERROR', f"{job.__name__} failed: {str(e)[:100]}")
+                finally:
+                    db.session.remove()
+
+    def _loop(self, app):
+        while not self.stopped.wait(self.interval):
+            self.run_once(app)
+
+
+# Global worker (per process) - các job đều idempotent nên nhiều process chạy song song vẫn an toàn
+maintenance_worker = MaintenanceWorker(MAINTENANCE_JOBS, interval=MAINTENANCE_INTERVAL)
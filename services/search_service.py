@@ -0,0 +1,191 @@
+"""
+Search Service - full-text search over the user's conversation history
+
+SQLite: bảng FTS5 `message_search` (rowid = messages.id) được trigger đồng bộ
+khi message chuyển sang 'completed' và xóa theo khi message bị xóa - trừ khi message
+được chuyển vào archive (conversation is_archived): row FTS giữ lại để vẫn tìm được,
+rehydrate insert lại đúng id đó, purge xóa bằng delete_search_rows().
+Cột `owner` chứa token 'u<user_id>' nên MATCH chỉ duyệt message của user đang tìm
+(từ phổ biến không phải xếp hạng message của mọi user); conversation_id/role/created_at
+lưu UNINDEXED để không phải join `messages` cho từng kết quả.
+MySQL: FULLTEXT index trên messages.content, chỉ lọc message 'completed'.
+"""
+
+import re
+
+from sqlalchemy import text
+
+from config import DB_TYPE
+from models import db
+
+
+SEARCH_TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+SEARCH_MAX_TERMS = 8
+SNIPPET_TOKENS = 16
+
+# Giữ đồng bộ với migration 016_scope_message_search, 017_keep_archived_message_search
+SQLITE_SEARCH_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS message_search USING fts5(
+        owner, content, conversation_id UNINDEXED, role UNINDEXED, created_at UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS message_search_complete
+    AFTER UPDATE OF status, content ON messages WHEN new.status = 'completed'
+    BEGIN
+        DELETE FROM message_search WHERE rowid = new.id;
+        INSERT INTO message_search (rowid, owner, content, conversation_id, role, created_at)
+        SELECT new.id, 'u' || c.user_id, new.content, new.conversation_id, new.role, new.created_at
+        FROM conversations c WHERE c.id = new.conversation_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS message_search_insert
+    AFTER INSERT ON messages WHEN new.status = 'completed'
+    BEGIN
+        DELETE FROM message_search WHERE rowid = new.id;
+        INSERT INTO message_search (rowid, owner, content, conversation_id, role, created_at)
+        SELECT new.id, 'u' || c.user_id, new.content, new.conversation_id, new.role, new.created_at
+        FROM conversations c WHERE c.id = new.conversation_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS message_search_delete
+    AFTER DELETE ON messages
+    WHEN NOT EXISTS (SELECT 1 FROM conversations WHERE id = old.conversation_id AND is_archived = 1)
+    BEGIN
+        DELETE FROM message_search WHERE rowid = old.id;
+    END""",
+)
+SQLITE_SEARCH_BACKFILL = (
+    "INSERT INTO message_search (rowid, owner, content, conversation_id, role, created_at) "
+    "SELECT m.id, 'u' || c.user_id, m.content, m.conversation_id, m.role, m.created_at "
+    "FROM messages m JOIN conversations c ON c.id = m.conversation_id WHERE m.status = 'completed'"
+)
+
+MYSQL_FULLTEXT_INDEX = 'ft_messages_content'
+
+
+# ==================== INDEX ====================
+
+def ensure_search_index():
+    """Tạo index full-text nếu chưa có (db.create_all() không tạo được FTS5/FULLTEXT)"""
+    if DB_TYPE == 'mysql':
+        exists = db.session.execute(
+            text("SHOW INDEX FROM messages WHERE Key_name = :name"),
+            {'name': MYSQL_FULLTEXT_INDEX}
+        ).first()
+        if not exists:
+            db.session.execute(text(f"ALTER TABLE messages ADD FULLTEXT INDEX {MYSQL_FULLTEXT_INDEX} (content)"))
+        db.session.commit()
+        return
+
+    columns = {row.name for row in db.session.execute(text("PRAGMA table_info(message_search)"))}
+    exists = bool(columns)
+    # Trigger luôn tạo lại theo định nghĩa hiện tại
+    for name in ('message_search_delete', 'message_search_insert', 'message_search_complete'):
+        db.session.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+    if exists and 'owner' not in columns:
+        # Bảng cũ (trước 016) không lọc được theo user: tạo lại
+        db.session.execute(text("DROP TABLE message_search"))
+        exists = False
+    for statement in SQLITE_SEARCH_DDL:
+        db.session.execute(text(statement))
+    if not exists:
+        db.session.execute(text(SQLITE_SEARCH_BACKFILL))
+    db.session.commit()
+
+
+def delete_search_rows(message_ids, conversation_id=None, chunk_size=500):
+    """
+    Xóa row FTS theo id message (message đã archive không còn trong `messages` để trigger xóa).
+    conversation_id: chỉ xóa row của conversation đó (id có thể đã được cấp lại cho message khác).
+    """
+    if DB_TYPE == 'mysql' or not message_ids:
+        return
+    condition = " AND conversation_id = :conversation_id" if conversation_id else ""
+    for start in range(0, len(message_ids), chunk_size):
+        chunk = message_ids[start:start + chunk_size]
+        db.session.execute(
+            text(f"DELETE FROM message_search WHERE rowid IN ({', '.join(str(int(i)) for i in chunk)}){condition}"),
+            {'conversation_id': conversation_id}
+        )
+
+
+# ==================== QUERY ====================
+
+def search_terms(query):
+    """Tách query thành các từ (bỏ ký tự đặc biệt của cú pháp FTS)"""
+    return SEARCH_TOKEN_PATTERN.findall(query or '')[:SEARCH_MAX_TERMS]
+
+
+def build_match_query(terms, user_id=None):
+    """
+    AND giữa các từ, từ cuối match theo prefix (gõ tới đâu tìm tới đó).
+    SQLite: thêm token owner của user để FTS5 chỉ giao với danh sách message của user đó.
+    """
+    if DB_TYPE == 'mysql':
+        return ' '.join([f'+{term}' for term in terms[:-1]] + [f'+{terms[-1]}*'])
+    query = ' '.join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+    if user_id is None:
+        return query
+    return f'owner:"u{int(user_id)}" AND content:({query})'
+
+
+def format_timestamp(value):
+    # Raw SQL trên SQLite trả về chuỗi 'YYYY-MM-DD HH:MM:SS.ffffff'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value).replace(' ', 'T')
+
+
+def search_messages(user_id, query, limit=20, offset=0):
+    """
+    Tìm message đã hoàn tất trong các conversation chưa xóa của user, xếp theo độ liên quan.
+    Trả về (results, has_more).
+    """
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+
+    params = {
+        'match': build_match_query(terms, user_id),
+        'user_id': user_id,
+        'limit': limit + 1,
+        'offset': offset
+    }
+
+    if DB_TYPE == 'mysql':
+        sql = text("""
+            SELECT m.id, m.conversation_id, m.role, m.created_at, c.title,
+                   SUBSTRING(m.content, 1, 300) AS snippet,
+                   MATCH(m.content) AGAINST (:match IN BOOLEAN MODE) AS score
+            FROM messages m
+            JOIN conversations c ON c.id = m.conversation_id
+            WHERE MATCH(m.content) AGAINST (:match IN BOOLEAN MODE)
+              AND m.status = 'completed'
+              AND c.user_id = :user_id AND c.is_deleted = 0
+            ORDER BY score DESC, m.id DESC
+            LIMIT :limit OFFSET :offset
+        """)
+    else:
+        # Cột owner có weight 0: chỉ dùng để lọc, không ảnh hưởng điểm bm25
+        sql = text(f"""
+            SELECT message_search.rowid AS id, message_search.conversation_id,
+                   message_search.role, message_search.created_at, c.title,
+                   snippet(message_search, 1, '', '', '…', {SNIPPET_TOKENS}) AS snippet,
+                   bm25(message_search, 0.0, 1.0) AS score
+            FROM message_search
+            JOIN conversations c ON c.id = message_search.conversation_id
+            WHERE message_search MATCH :match
+              AND c.user_id = :user_id AND c.is_deleted = 0
+            ORDER BY score, message_search.rowid DESC
+            LIMIT :limit OFFSET :offset
+        """)
+
+    rows = db.session.execute(sql, params).fetchall()
+    has_more = len(rows) > limit
+    results = [{
+        'message_id': row.id,
+        'conversation_id': row.conversation_id,
+        'conversation_title': row.title,
+        'role': row.role,
+        'snippet': row.snippet,
+        'created_at': format_timestamp(row.created_at)
+    } for row in rows[:limit]]
+    return results, has_more
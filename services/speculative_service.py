@@ -0,0 +1,213 @@
+"""
+Speculative Service - pre-generate the reply to the top suggested action
+"""
+
+import threading
+import time
+
+from config import (
+    SPECULATIVE_MAX_TOKENS, SPECULATIVE_MAX_CONCURRENT,
+    SPECULATIVE_TIMEOUT, SPECULATIVE_TTL
+)
+from prompts import TEACHER_PROMPT
+from services.ai_service import get_client
+from services.tts_service import pre_generate_tts
+from utils.helpers import estimate_tokens
+from utils.message_parser import parse_message
+from utils.security import log_security_event
+
+
+# ==================== METRICS ====================
+
+class SpeculativeMetrics:
+    """Thread-safe counters cho speculative generation"""
+    FIELDS = (
+        'started', 'skipped_quota', 'skipped_busy', 'failed', 'truncated',
+        'hits', 'misses', 'expired', 'tokens_served', 'tokens_wasted'
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(self.FIELDS, 0)
+
+    def incr(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def snapshot(self):
+        with self.lock:
+            data = dict(self.counters)
+        finished = data['hits'] + data['misses'] + data['expired']
+        data['hit_rate'] = round(data['hits'] / finished, 3) if finished else 0.0
+        return data
+
+
+# ==================== SPECULATION ====================
+
+class Speculation:
+    """Reply được sinh trước cho 1 action, gắn với assistant message đã gợi ý nó"""
+    __slots__ = (
+        'user_id', 'conversation_id', 'base_message_id', 'action', 'created_at',
+        'ready', 'discarded', 'content', 'parsed', 'prompt_tokens', 'completion_tokens'
+    )
+
+    def __init__(self, user_id, conversation_id, base_message_id, action):
+        self.user_id = user_id
+        self.conversation_id = conversation_id
+        self.base_message_id = base_message_id
+        self.action = action
+        self.created_at = time.time()
+        self.ready = threading.Event()
+        self.discarded = False
+        self.content = None
+        self.parsed = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+
+class SpeculativeStore:
+    """
+    Mỗi conversation giữ tối đa 1 speculation (cho reply mới nhất).
+
+    - start(): chạy nền với budget max_tokens/timeout, bỏ qua nếu hết slot
+    - take(): user gửi đúng action -> trả kết quả; gửi tin khác -> discard (miss)
+    """
+    def __init__(self, max_concurrent=2, max_tokens=600, timeout=20, ttl_seconds=600):
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.ttl = ttl_seconds
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.speculations = {}
+        self.lock = threading.Lock()
+        self.metrics = SpeculativeMetrics()
+
+    def start(self, user_id, conversation_id, base_message_id, action, messages, tokens_remaining, voice_config=None):
+        """Bắt đầu sinh trước reply cho `action`. Trả về False nếu bị bỏ qua."""
+        self.discard(user_id, conversation_id)
+        self.expire()
+
+        prompt_tokens = estimate_tokens(TEACHER_PROMPT + str(messages))
+        if tokens_remaining < prompt_tokens + self.max_tokens:
+            self.metrics.incr('skipped_quota')
+            return False
+
+        if not self.slots.acquire(blocking=False):
+            self.metrics.incr('skipped_busy')
+            return False
+
+        speculation = Speculation(user_id, conversation_id, base_message_id, action)
+        with self.lock:
+            self.speculations[(user_id, conversation_id)] = speculation
+        self.metrics.incr('started')
+
+        thread = threading.Thread(
+            target=self._run,
+            args=(speculation, messages, voice_config),
+            daemon=True
+        )
+        thread.start()
+        return True
+
+    def has(self, user_id, conversation_id):
+        with self.lock:
+            return (user_id, conversation_id) in self.speculations
+
+    def take(self, user_id, conversation_id, base_message_id, message):
+        """
+        Lấy speculation nếu `message` đúng là action đã sinh trước cho reply mới nhất.
+        Mọi trường hợp khác đều discard speculation của conversation.
+        """
+        with self.lock:
+            speculation = self.speculations.pop((user_id, conversation_id), None)
+        if speculation is None:
+            return None
+
+        if speculation.base_message_id != base_message_id or speculation.action != message:
+            self._drop(speculation, 'misses')
+            return None
+
+        # Còn đang sinh: chờ phần budget thời gian còn lại
+        remaining = self.timeout - (time.time() - speculation.created_at)
+        if not speculation.ready.wait(timeout=max(0, remaining)) or not speculation.content:
+            self._drop(speculation, 'misses')
+            return None
+
+        self.metrics.incr('hits')
+        self.metrics.incr('tokens_served', speculation.total_tokens)
+        return speculation
+
+    def discard(self, user_id, conversation_id):
+        with self.lock:
+            speculation = self.speculations.pop((user_id, conversation_id), None)
+        if speculation is not None:
+            self._drop(speculation, 'misses')
+
+    def expire(self):
+        """Bỏ các speculation quá TTL (gọi định kỳ hoặc khi start)"""
+        now = time.time()
+        with self.lock:
+            expired = [key for key, spec in self.speculations.items() if now - spec.created_at > self.ttl]
+            dropped = [self.speculations.pop(key) for key in expired]
+        for speculation in dropped:
+            self._drop(speculation, 'expired')
+
+    def _drop(self, speculation, reason):
+        self.metrics.incr(reason)
+        # Token đã bị tính phí upstream; nếu chưa sinh xong thì _run sẽ ghi nhận
+        with self.lock:
+            speculation.discarded = True
+            finished = speculation.ready.is_set()
+        if finished:
+            self.metrics.incr('tokens_wasted', speculation.total_tokens)
+
+    def _run(self, speculation, messages, voice_config):
+        try:
+            response = get_client().with_options(timeout=self.timeout).chat.completions.create(
+                model="deepseek-chat",
+                messages=[
+                    {"role": "system", "content": TEACHER_PROMPT},
+                    *messages,
+                    {"role": "user", "content": speculation.action}
+                ],
+                temperature=0.7,
+                max_tokens=self.max_tokens,
+                stream=False
+            )
+            choice = response.choices[0]
+            content = choice.message.content or ''
+            usage = response.usage
+            speculation.prompt_tokens = getattr(usage, 'prompt_tokens', 0) or estimate_tokens(TEACHER_PROMPT + str(messages))
+            speculation.completion_tokens = getattr(usage, 'completion_tokens', 0) or estimate_tokens(content)
+
+            # Reply bị cắt bởi budget thì không dùng được
+            if choice.finish_reason == 'length':
+                self.metrics.incr('truncated')
+            else:
+                speculation.parsed = parse_message(content)
+                speculation.content = content
+        except Exception as e:
+            self.metrics.incr('failed')
+            log_security_event('SPECULATIVE_ERROR', f"Speculative generation failed: {str(e)[:100]}", speculation.user_id)
+        finally:
+            with self.lock:
+                speculation.ready.set()
+                discarded = speculation.discarded
+            self.slots.release()
+
+        if discarded:
+            self.metrics.incr('tokens_wasted', speculation.total_tokens)
+        elif speculation.content:
+            pre_generate_tts(speculation.parsed['tts'], voice_config)
+
+
+# Global store cho /api/chat (per process)
+speculative_store = SpeculativeStore(
+    max_concurrent=SPECULATIVE_MAX_CONCURRENT,
+    max_tokens=SPECULATIVE_MAX_TOKENS,
+    timeout=SPECULATIVE_TIMEOUT,
+    ttl_seconds=SPECULATIVE_TTL
+)
@@ -8,10 +8,8 @@ import threading
 import time
 from collections import OrderedDict
 
-import edge_tts
-
 from utils.security import log_security_event
-from utils.helpers import get_cache_key, split_by_language
+from utils.helpers import get_cache_key
 
 
 # ==================== TTL CACHE ====================
@@ -108,6 +106,8 @@ def set_user_voice_config(config):
 async def generate_tts_audio_async(text, lang, rate="+0%", voice=None):
     """Tạo audio từ text sử dụng edge-tts (async) - optimized"""
     try:
+        import edge_tts  # Import lần đầu tạo audio, không làm chậm khởi động
+        
         if voice is None:
             voice_config = get_user_voice_config()
             voice = voice_config.get(lang, DEFAULT_VOICE_CONFIG[lang])
@@ -159,13 +159,13 @@ def generate_tts_audio(text, lang, rate="+0%"):
             return None
 
 
-def generate_tts_audio_simple(text, lang, rate="+0%"):
+def generate_tts_audio_simple(text, lang, rate="+0%", voice=None):
     """Simple sync TTS generation - most reliable"""
     try:
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         try:
-            return loop.run_until_complete(generate_tts_audio_async(text, lang, rate))
+            return loop.run_until_complete(generate_tts_audio_async(text, lang, rate, voice))
         finally:
             loop.close()
     except Exception as e:
@@ -173,18 +173,29 @@ def generate_tts_audio_simple(text, lang, rate="+0%"):
         return None
 
 
-def pre_generate_tts(text, rate="+0%"):
-    """Pre-generate TTS cho tất cả segments trong background"""
-    segments = split_by_language(text)
+def get_tts_rate(lang):
+    """Tốc độ đọc theo ngôn ngữ (dùng chung cho route TTS và pre-generate)"""
+    return "+15%" if lang == 'vi' else "+0%"
+
+
+def pre_generate_tts(tts_chunks, voice_config=None):
+    """
+    Pre-generate TTS cho các chunk ([lang, text]) của utils.message_parser trong background.
+
+    Chạy ngoài request context nên voice_config phải được truyền vào từ request.
+    Chunk đã được chia và clean giống hệt client nên /api/tts/single sẽ hit cache.
+    """
+    voice_config = voice_config or DEFAULT_VOICE_CONFIG
     
-    for seg in segments:
-        cache_key = get_cache_key(seg['text'], seg['lang'], rate)
+    for lang, chunk_text in tts_chunks:
+        rate = get_tts_rate(lang)
+        cache_key = get_cache_key(chunk_text, lang, rate)
         
         if audio_cache.get(cache_key):
             continue
         
-        seg_rate = "+15%" if seg['lang'] == 'vi' else "+0%"
-        audio_data = generate_tts_audio_simple(seg['text'], seg['lang'], seg_rate)
+        voice = voice_config.get(lang, DEFAULT_VOICE_CONFIG[lang])
+        audio_data = generate_tts_audio_simple(chunk_text, lang, rate, voice)
         
         if audio_data:
             audio_cache.set(cache_key, audio_data)
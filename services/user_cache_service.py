@@ -0,0 +1,127 @@
+"""
+User Cache Service - short-TTL identity cache for the Flask-Login user loader
+
+Mỗi request có đăng nhập (kể cả từng segment TTS) gọi load_user; cache giữ giá trị
+các cột của User vài giây nên phần lớn request chỉ cần đọc 1 cột theo primary key
+thay vì load cả row User.
+Mọi UPDATE User (lockout, khóa tài khoản, đổi mật khẩu, token usage) tăng users.cache_version
+trong chính câu UPDATE. Hit chỉ được dùng khi cache_version trong DB khớp bản đã cache nên
+thay đổi từ worker khác có hiệu lực ngay ở request kế tiếp; trong cùng process entry còn
+bị invalidate sau khi commit. UPDATE bằng SQL tay phải tự tăng cache_version.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+from config import USER_CACHE_TTL, USER_CACHE_MAX_SIZE
+from models import db, User, CHANGED_USER_IDS_KEY, mark_user_changed
+
+
+USER_COLUMNS = tuple(attr.key for attr in inspect(User).column_attrs)
+
+
+class UserCache:
+    """
+    Thread-safe: user_id -> dict giá trị cột (per process).
+
+    Generation theo user chống ghi đè bằng dữ liệu cũ: request đọc DB trước khi
+    request khác commit + invalidate sẽ không được set lại vào cache.
+    """
+    def __init__(self, ttl_seconds=30, max_size=10000):
+        self.ttl = ttl_seconds
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.generations = {}
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            values, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return values
+
+    def generation(self, user_id):
+        with self.lock:
+            return self.generations.get(user_id, 0)
+
+    def set(self, user_id, values, generation):
+        with self.lock:
+            if self.generations.get(user_id, 0) != generation:
+                return
+            self.entries.pop(user_id, None)
+            if len(self.entries) >= self.max_size:
+                self.entries.popitem(last=False)
+            self.entries[user_id] = (values, time.monotonic() + self.ttl)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+            self.generations[user_id] = self.generations.get(user_id, 0) + 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.generations.clear()
+
+    def load(self, user_id):
+        """User cho request hiện tại, gắn vào db.session (chỉ SELECT cache_version nếu cache còn hạn)"""
+        if self.ttl <= 0:
+            return User.query.get(user_id)
+
+        values = self.get(user_id)
+        if values is not None:
+            current = db.session.execute(
+                select(User.cache_version).where(User.id == user_id)
+            ).scalar()
+            if current != values['cache_version']:
+                # Worker khác đã đổi/xóa user: bỏ entry, load lại từ DB
+                self.invalidate(user_id)
+                values = None
+        if values is not None:
+            user = User(**values)
+            make_transient_to_detached(user)
+            return db.session.merge(user, load=False)
+
+        generation = self.generation(user_id)
+        user = User.query.get(user_id)
+        if user is not None:
+            self.set(user_id, {key: getattr(user, key) for key in USER_COLUMNS}, generation)
+        return user
+
+
+# Global cache cho load_user (per process)
+user_cache = UserCache(ttl_seconds=USER_CACHE_TTL, max_size=USER_CACHE_MAX_SIZE)
+
+
+# ==================== INVALIDATION ====================
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def on_user_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        mark_user_changed(session, target.id)
+    # Invalidate ngay để request khác không set lại giá trị đang đổi
+    user_cache.invalidate(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_committed_users(session):
+    # Lần 2 sau commit: xóa entry do request đọc DB (giá trị cũ) giữa flush và commit set vào
+    for user_id in session.info.pop(CHANGED_USER_IDS_KEY, ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_changed_users(session):
+    session.info.pop(CHANGED_USER_IDS_KEY, None)
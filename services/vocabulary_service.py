@@ -0,0 +1,365 @@
+"""
+Vocabulary Service - normalized, conflict-safe inserts, keyset-paginated listing,
+bulk import/export, spaced-repetition review queue
+"""
+
+import base64
+import csv
+import io
+import json
+import unicodedata
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from config import DB_TYPE
+from models import db, Vocabulary
+from utils.security import sanitize_input, sanitize_html_batch
+
+
+VOCAB_PAGE_SIZE = 50
+VOCAB_PAGE_MAX = 200
+VOCAB_PREFIX_MAX_LENGTH = 100
+VOCAB_IMPORT_MAX_ROWS = 5000
+VOCAB_EXPORT_BATCH_SIZE = 500
+VOCAB_LOOKUP_BATCH_SIZE = 500  # Giới hạn số tham số của IN (...)
+
+REVIEW_PAGE_SIZE = 20
+REVIEW_PAGE_MAX = 100
+REVIEW_BATCH_MAX = 200
+REVIEW_MIN_EASE = 1.3
+REVIEW_MAX_GRADE = 5  # SM-2: 0-2 quên, 3 khó, 4 tốt, 5 dễ
+
+REVIEW_COLUMNS = (
+    Vocabulary.id,
+    Vocabulary.word,
+    Vocabulary.note,
+    Vocabulary.due_at,
+    Vocabulary.interval_days,
+    Vocabulary.ease,
+    Vocabulary.reps
+)
+
+VOCAB_LIST_COLUMNS = (
+    Vocabulary.id,
+    Vocabulary.word,
+    Vocabulary.word_normalized,
+    Vocabulary.note,
+    Vocabulary.created_at
+)
+
+
+def normalize_word(word):
+    """Khóa so trùng: NFKC, không phân biệt hoa thường, gộp khoảng trắng"""
+    return ' '.join(unicodedata.normalize('NFKC', word or '').casefold().split())
+
+
+def vocabulary_row_to_dict(row):
+    return {
+        'id': row.id,
+        'word': row.word,
+        'note': row.note,
+        'created_at': row.created_at.isoformat()
+    }
+
+
+# ==================== INSERT ====================
+
+def insert_ignore_duplicates(rows):
+    """
+    INSERT nhiều dòng, bỏ qua dòng trùng (user_id, word_normalized) ngay trong DB
+    nên 2 request thêm cùng 1 từ song song không tạo bản trùng. Trả về số dòng đã insert.
+    """
+    if not rows:
+        return 0
+    # Insert trên Table (Core): bulk insert qua ORM entity không trả về rowcount
+    table = Vocabulary.__table__
+    if DB_TYPE == 'mysql':
+        statement = mysql_insert(table).prefix_with('IGNORE')
+    else:
+        statement = sqlite_insert(table).on_conflict_do_nothing(
+            index_elements=['user_id', 'word_normalized']
+        )
+    return db.session.execute(statement, rows).rowcount
+
+
+def insert_vocabulary(user_id, word, note=''):
+    """Thêm 1 từ. Trả về (vocabulary, created); created=False nếu từ đã có. Caller tự commit."""
+    normalized = normalize_word(word)
+    inserted = insert_ignore_duplicates([{
+        'user_id': user_id,
+        'word': word,
+        'word_normalized': normalized,
+        'note': note
+    }])
+    vocab = Vocabulary.query.filter_by(user_id=user_id, word_normalized=normalized).first()
+    return vocab, inserted > 0
+
+
+# ==================== LIST ====================
+
+def encode_vocabulary_cursor(value):
+    return base64.urlsafe_b64encode(str(value).encode()).decode().rstrip('=')
+
+
+def decode_vocabulary_cursor(cursor):
+    try:
+        return base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def prefix_filter(prefix):
+    """Điều kiện prefix dùng được unique index (user_id, word_normalized)"""
+    if DB_TYPE == 'mysql':
+        escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return Vocabulary.word_normalized.like(escaped + '%')
+    # SQLite chỉ tối ưu LIKE với cột NOCASE -> dùng range (so sánh BINARY theo byte UTF-8)
+    return and_(
+        Vocabulary.word_normalized >= prefix,
+        Vocabulary.word_normalized < prefix + '\U0010ffff'
+    )
+
+
+def list_vocabularies(user_id, prefix='', cursor=None, limit=VOCAB_PAGE_SIZE):
+    """
+    1 trang từ vựng của user. Trả về (items, next_cursor).
+
+    - Không có prefix: mới nhất trước, keyset theo id (index user_id)
+    - Có prefix: theo thứ tự chữ cái, range scan trên unique index (user_id, word_normalized)
+    """
+    query = db.session.query(*VOCAB_LIST_COLUMNS).filter(Vocabulary.user_id == user_id)
+    after = decode_vocabulary_cursor(cursor) if cursor else None
+    prefix = normalize_word(prefix)[:VOCAB_PREFIX_MAX_LENGTH]
+
+    if prefix:
+        query = query.filter(prefix_filter(prefix))
+        if after is not None:
+            query = query.filter(Vocabulary.word_normalized > after)
+        rows = query.order_by(Vocabulary.word_normalized).limit(limit + 1).all()
+        last_key = lambda row: row.word_normalized
+    else:
+        if after is not None:
+            if not after.isdigit():
+                return [], None
+            query = query.filter(Vocabulary.id < int(after))
+        rows = query.order_by(Vocabulary.id.desc()).limit(limit + 1).all()
+        last_key = lambda row: row.id
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_vocabulary_cursor(last_key(rows[-1]))
+    return [vocabulary_row_to_dict(row) for row in rows], next_cursor
+
+
+# ==================== BULK IMPORT ====================
+
+def parse_vocabulary_import(raw, fmt):
+    """
+    Đọc file import thành list (word, note).
+
+    - json: ["word", ...] | [{"word": ..., "note": ...}, ...] | {"vocabularies": [...]}
+    - csv: cột word, note (dòng header "word" được bỏ qua)
+    Raise ValueError nếu sai định dạng hoặc quá VOCAB_IMPORT_MAX_ROWS.
+    """
+    if isinstance(raw, bytes):
+        raw = raw.decode('utf-8-sig')
+
+    items = []
+    if fmt == 'json':
+        data = json.loads(raw) if isinstance(raw, str) else raw
+        if isinstance(data, dict):
+            data = data.get('vocabularies')
+        if not isinstance(data, list):
+            raise ValueError("JSON phải là danh sách từ vựng")
+        for entry in data:
+            if isinstance(entry, dict):
+                items.append((entry.get('word'), entry.get('note')))
+            else:
+                items.append((entry, None))
+    else:
+        for index, row in enumerate(csv.reader(io.StringIO(raw))):
+            if not row or (index == 0 and row[0].strip().lower() == 'word'):
+                continue
+            items.append((row[0], row[1] if len(row) > 1 else None))
+
+    if len(items) > VOCAB_IMPORT_MAX_ROWS:
+        raise ValueError(f"Tối đa {VOCAB_IMPORT_MAX_ROWS} từ mỗi lần import")
+    return items
+
+
+def existing_normalized_words(user_id, normalized):
+    """Các word_normalized đã có của user trong tập `normalized` (1 query / batch)"""
+    existing = set()
+    normalized = list(normalized)
+    for start in range(0, len(normalized), VOCAB_LOOKUP_BATCH_SIZE):
+        existing.update(row.word_normalized for row in db.session.query(Vocabulary.word_normalized).filter(
+            Vocabulary.user_id == user_id,
+            Vocabulary.word_normalized.in_(normalized[start:start + VOCAB_LOOKUP_BATCH_SIZE])
+        ))
+    return existing
+
+
+def import_vocabularies(user_id, items):
+    """
+    Import nhiều từ trong 1 transaction:
+    sanitize theo batch -> dedupe trong file và với DB theo tập -> 1 lệnh INSERT nhiều dòng.
+    Trả về dict thống kê: inserted, duplicates, rejected. Caller tự commit.
+    """
+    words = [sanitize_input(word if isinstance(word, str) else '', max_length=200) for word, _ in items]
+    notes = [sanitize_input(note if isinstance(note, str) else '', max_length=1000) for _, note in items]
+    cleaned = sanitize_html_batch(words + notes)
+    words, notes = cleaned[:len(items)], cleaned[len(items):]
+
+    stats = {'inserted': 0, 'duplicates': 0, 'rejected': 0}
+    rows = {}
+    for word, note in zip(words, notes):
+        normalized = normalize_word(word)
+        if not normalized:
+            stats['rejected'] += 1
+        elif normalized in rows:
+            stats['duplicates'] += 1
+        else:
+            rows[normalized] = {
+                'user_id': user_id,
+                'word': word,
+                'word_normalized': normalized,
+                'note': note
+            }
+
+    existing = existing_normalized_words(user_id, rows.keys())
+    new_rows = [row for normalized, row in rows.items() if normalized not in existing]
+
+    # Request song song có thể chen giữa SELECT và INSERT -> DB tự bỏ qua dòng trùng
+    inserted = insert_ignore_duplicates(new_rows)
+    stats['inserted'] = inserted
+    stats['duplicates'] += len(rows) - inserted
+    return stats
+
+
+# ==================== EXPORT ====================
+
+def iter_vocabulary_export(user_id, fmt='csv', batch_size=VOCAB_EXPORT_BATCH_SIZE):
+    """Generator: export theo keyset từng batch (csv hoặc mảng json), cũ nhất trước"""
+    if fmt == 'json':
+        yield '['
+    else:
+        yield 'word,note,created_at\r\n'
+
+    first = True
+    last_id = 0
+    while True:
+        rows = db.session.query(*VOCAB_LIST_COLUMNS).filter(
+            Vocabulary.user_id == user_id,
+            Vocabulary.id > last_id
+        ).order_by(Vocabulary.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        if fmt == 'json':
+            chunk = ','.join(json.dumps({
+                'word': row.word,
+                'note': row.note,
+                'created_at': row.created_at.isoformat()
+            }, ensure_ascii=False) for row in rows)
+            yield chunk if first else ',' + chunk
+        else:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerows((row.word, row.note or '', row.created_at.isoformat()) for row in rows)
+            yield buffer.getvalue()
+
+        first = False
+        last_id = rows[-1].id
+
+    if fmt == 'json':
+        yield ']'
+
+
+# ==================== REVIEW ====================
+
+def review_row_to_dict(row):
+    return {
+        'id': row.id,
+        'word': row.word,
+        'note': row.note,
+        'review': {
+            'due_at': row.due_at.isoformat(),
+            'interval': row.interval_days,
+            'ease': row.ease,
+            'reps': row.reps
+        }
+    }
+
+
+def schedule_review(interval_days, ease, reps, grade, now):
+    """SM-2: trả về (interval_days, ease, reps, due_at) sau 1 lần ôn với điểm `grade`"""
+    if grade < 3:
+        reps, interval_days = 0, 1
+    else:
+        reps += 1
+        if reps == 1:
+            interval_days = 1
+        elif reps == 2:
+            interval_days = 6
+        else:
+            interval_days = max(1, round(interval_days * ease))
+    lapse = REVIEW_MAX_GRADE - grade
+    ease = max(REVIEW_MIN_EASE, round(ease + 0.1 - lapse * (0.08 + lapse * 0.02), 3))
+    return interval_days, ease, reps, now + timedelta(days=interval_days)
+
+
+def due_vocabularies(user_id, limit=REVIEW_PAGE_SIZE, now=None):
+    """
+    N từ đến hạn sớm nhất: 1 range scan trên index (user_id, due_at).
+    Trả về (items, has_more).
+    """
+    rows = db.session.query(*REVIEW_COLUMNS).filter(
+        Vocabulary.user_id == user_id,
+        Vocabulary.due_at <= (now or datetime.utcnow())
+    ).order_by(Vocabulary.due_at, Vocabulary.id).limit(limit + 1).all()
+    return [review_row_to_dict(row) for row in rows[:limit]], len(rows) > limit
+
+
+def submit_reviews(user_id, reviews, now=None):
+    """
+    Ghi kết quả ôn cho nhiều từ: 1 SELECT các từ liên quan + 1 UPDATE executemany.
+    `reviews`: {vocab_id: grade}. Trả về list từ đã cập nhật. Caller tự commit.
+    """
+    if not reviews:
+        return []
+    now = now or datetime.utcnow()
+    rows = db.session.query(*REVIEW_COLUMNS).filter(
+        Vocabulary.user_id == user_id,
+        Vocabulary.id.in_(list(reviews))
+    ).all()
+
+    updates = []
+    for row in rows:
+        interval_days, ease, reps, due_at = schedule_review(
+            row.interval_days, row.ease, row.reps, reviews[row.id], now
+        )
+        updates.append({
+            'id': row.id,
+            'interval_days': interval_days,
+            'ease': ease,
+            'reps': reps,
+            'due_at': due_at
+        })
+    if updates:
+        db.session.execute(update(Vocabulary), updates)
+
+    by_id = {row.id: row for row in rows}
+    return [{
+        'id': item['id'],
+        'word': by_id[item['id']].word,
+        'review': {
+            'due_at': item['due_at'].isoformat(),
+            'interval': item['interval_days'],
+            'ease': item['ease'],
+            'reps': item['reps']
+        }
+    } for item in updates]
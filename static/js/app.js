@@ -60,13 +60,26 @@ let isProcessing = false;
 let recognition = null;
 let currentConversationId = null;
 let conversations = {};
+let conversationsEtag = null; // Weak ETag của trang đầu - server trả 304 nếu danh sách không đổi
+let conversationsCursor = null; // Cursor trang kế tiếp (null = hết)
+let isLoadingMoreConversations = false;
 let vocabularies = [];
+let vocabQuery = ''; // Prefix đang tìm (server-side)
+let vocabCursor = null; // Cursor trang kế tiếp (null = hết)
+let isLoadingMoreVocab = false;
+let vocabRequestId = 0; // Bỏ response của lần tìm cũ
+let vocabSearchTimer = null;
+const VOCAB_SEARCH_DELAY = 250;
 let selectedText = '';
 let streamAbortController = null;
 let currentStreamReader = null;
+let currentAssistantMsgId = null; // Assistant message đang được stream (để hủy phía server)
+let pendingSend = null; // Lần gửi chưa nhận 'done': { message, conversationId, retryMessageId, key }
+let pendingCancel = null; // Request /cancel đang chạy - finalize phải chờ server hủy xong
 let accumulatedText = '';
 let isAutoSendMode = false;
 let isAutoPlayMode = false; // Tự động phát khi trả lời - mặc định TẮT
+let isSpeculativeEnabled = false; // Server sinh trước câu trả lời cho gợi ý đầu tiên - mặc định TẮT
 
 // Audio state
 let currentAudio = null;
@@ -115,13 +128,34 @@ function generateId() {
     return Date.now().toString(36) + Math.random().toString(36).substr(2);
 }
 
+// Idempotency-Key theo lần gửi logic: gửi lại cùng nội dung chưa hoàn thành
+// (double-click, Enter + click, gửi lại sau lỗi mạng) dùng lại key để server dedupe
+function idempotencyKeyFor(message, conversationId, retryMessageId = null) {
+    if (!pendingSend || pendingSend.message !== message ||
+        pendingSend.conversationId !== conversationId || pendingSend.retryMessageId !== retryMessageId) {
+        pendingSend = { message, conversationId, retryMessageId, key: generateId() };
+    }
+    return pendingSend.key;
+}
+
 // ==================== VOCABULARY FUNCTIONS ====================
+function vocabularyUrl(cursor) {
+    const params = new URLSearchParams();
+    if (vocabQuery) params.set('q', vocabQuery);
+    if (cursor) params.set('cursor', cursor);
+    const query = params.toString();
+    return query ? `/api/vocabularies?${query}` : '/api/vocabularies';
+}
+
 async function loadVocabularies() {
+    const requestId = ++vocabRequestId;
     try {
-        const res = await secureFetch('/api/vocabularies');
+        const res = await secureFetch(vocabularyUrl(null));
         if (res.ok) {
             const data = await res.json();
+            if (requestId !== vocabRequestId) return;
             vocabularies = data.vocabularies;
+            vocabCursor = data.next_cursor;
             renderVocabList();
         }
     } catch (err) {
@@ -129,16 +163,45 @@ async function loadVocabularies() {
     }
 }
 
+async function loadMoreVocabularies() {
+    if (!vocabCursor || isLoadingMoreVocab) return;
+    isLoadingMoreVocab = true;
+    const requestId = vocabRequestId;
+    try {
+        const res = await secureFetch(vocabularyUrl(vocabCursor));
+        if (res.ok) {
+            const data = await res.json();
+            if (requestId !== vocabRequestId) return;
+            vocabularies = vocabularies.concat(data.vocabularies);
+            vocabCursor = data.next_cursor;
+            renderVocabList();
+        }
+    } catch (err) {
+        console.error('Load more vocabularies error:', err);
+    } finally {
+        isLoadingMoreVocab = false;
+    }
+}
+
+// Load the next page when the vocabulary list is scrolled near the bottom
+vocabList.addEventListener('scroll', () => {
+    if (vocabList.scrollTop + vocabList.clientHeight >= vocabList.scrollHeight - 100) {
+        loadMoreVocabularies();
+    }
+});
+
 function renderVocabList() {
     if (vocabularies.length === 0) {
-        vocabList.innerHTML = '<div class="vocab-empty">Chưa có từ vựng nào được lưu</div>';
+        vocabList.innerHTML = vocabQuery
+            ? '<div class="vocab-empty">Không tìm thấy từ vựng phù hợp</div>'
+            : '<div class="vocab-empty">Chưa có từ vựng nào được lưu</div>';
         return;
     }
 
     vocabList.innerHTML = vocabularies.map(v => `
         <div class="vocab-item" data-id="${v.id}">
             <div class="vocab-header">
-                <span class="vocab-word" onclick="speakEnglish('${v.word.replace(/'/g, "\\'")}')">${v.word}</span>
+                <span class="vocab-word" onclick="speakEnglish('${v.word.replace(/'/g, "\\'")}')">${highlightMatch(v.word, vocabQuery)}</span>
                 <button class="btn-delete-vocab" onclick="deleteVocab(${v.id})" title="Xóa">
                     <svg width="14" height="14" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
                         <path d="M3 6h18M19 6v14a2 2 0 0 1-2 2H7a2 2 0 0 1-2-2V6m3 0V4a2 2 0 0 1 2-2h4a2 2 0 0 1 2 2v2"/>
@@ -205,48 +268,22 @@ function toggleVocabPanel() {
     vocabPanel.classList.toggle('active');
     if (!vocabPanel.classList.contains('active')) {
         document.getElementById('vocabSearchInput').value = '';
-        renderVocabList();
+        if (vocabQuery) {
+            vocabQuery = '';
+            loadVocabularies();
+        }
     }
 }
 
 function filterVocabularies() {
-    const query = document.getElementById('vocabSearchInput').value.toLowerCase().trim();
-
-    if (!query) {
-        renderVocabList();
-        return;
-    }
-
-    const filtered = vocabularies.filter(v =>
-        v.word.toLowerCase().includes(query) ||
-        (v.note && v.note.toLowerCase().includes(query))
-    );
-
-    if (filtered.length === 0) {
-        vocabList.innerHTML = '<div class="vocab-empty">Không tìm thấy từ vựng phù hợp</div>';
-        return;
-    }
-
-    vocabList.innerHTML = filtered.map(v => `
-        <div class="vocab-item" data-id="${v.id}">
-            <div class="vocab-header">
-                <span class="vocab-word" onclick="speakEnglish('${v.word.replace(/'/g, "\\'")}')">${highlightMatch(v.word, query)}</span>
-                <button class="btn-delete-vocab" onclick="deleteVocab(${v.id})" title="Xóa">
-                    <svg width="14" height="14" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
-                        <path d="M3 6h18M19 6v14a2 2 0 0 1-2 2H7a2 2 0 0 1-2-2V6m3 0V4a2 2 0 0 1 2-2h4a2 2 0 0 1 2 2v2"/>
-                    </svg>
-                </button>
-            </div>
-            <div class="vocab-note-section">
-                ${v.note
-            ? `<div class="vocab-note">${highlightMatch(v.note, query)}</div>
-                       <button class="btn-edit-note" onclick="editVocabNote(${v.id})">Sửa nghĩa</button>`
-            : `<button class="btn-add-note" onclick="editVocabNote(${v.id})">+ Thêm nghĩa</button>`
-        }
-            </div>
-            <div class="vocab-date">${new Date(v.created_at).toLocaleDateString('vi-VN')}</div>
-        </div>
-    `).join('');
+    // Tìm theo prefix trên server (debounce để không gọi API mỗi phím)
+    clearTimeout(vocabSearchTimer);
+    vocabSearchTimer = setTimeout(() => {
+        const query = document.getElementById('vocabSearchInput').value.trim();
+        if (query === vocabQuery) return;
+        vocabQuery = query;
+        loadVocabularies();
+    }, VOCAB_SEARCH_DELAY);
 }
 
 function highlightMatch(text, query) {
@@ -305,6 +342,30 @@ async function deleteVocab(id) {
     }
 }
 
+async function importVocabFile(input) {
+    const file = input.files[0];
+    input.value = '';
+    if (!file) return;
+
+    try {
+        const isJson = file.name.toLowerCase().endsWith('.json');
+        const res = await secureFetch('/api/vocabularies/import', {
+            method: 'POST',
+            headers: { 'Content-Type': isJson ? 'application/json' : 'text/csv' },
+            body: file
+        });
+        const data = await res.json();
+        if (!res.ok) {
+            alert(data.error || 'Không thể nhập từ vựng');
+            return;
+        }
+        alert(`Đã thêm ${data.inserted} từ, ${data.duplicates} từ trùng, ${data.rejected} dòng không hợp lệ.`);
+        loadVocabularies();
+    } catch (err) {
+        console.error('Import vocab error:', err);
+    }
+}
+
 function handleTextSelection() {
     const selection = window.getSelection();
     const text = selection.toString().trim();
@@ -327,21 +388,32 @@ function handleTextSelection() {
 
 
 // ==================== CONVERSATION FUNCTIONS ====================
+function addConversationSummaries(list) {
+    list.forEach(conv => {
+        conversations[conv.id] = {
+            id: conv.id,
+            title: conv.title,
+            messages: [],
+            createdAt: new Date(conv.created_at).getTime(),
+            updatedAt: new Date(conv.updated_at).getTime(),
+            totalTokens: conv.total_tokens,
+            messageCount: conv.message_count || 0,
+            lastMessagePreview: conv.last_message_preview || ''
+        };
+    });
+}
+
 async function loadConversations() {
     try {
-        const res = await secureFetch('/api/conversations');
+        const headers = conversationsEtag ? { 'If-None-Match': conversationsEtag } : {};
+        const res = await secureFetch('/api/conversations', { headers, cache: 'no-store' });
+        if (res.status === 304) return;
         if (res.ok) {
             const data = await res.json();
+            conversationsEtag = res.headers.get('ETag');
+            conversationsCursor = data.next_cursor;
             conversations = {};
-            data.conversations.forEach(conv => {
-                conversations[conv.id] = {
-                    id: conv.id,
-                    title: conv.title,
-                    messages: [],
-                    createdAt: new Date(conv.created_at).getTime(),
-                    totalTokens: conv.total_tokens
-                };
-            });
+            addConversationSummaries(data.conversations);
             renderConversationList();
         }
     } catch (e) {
@@ -349,6 +421,31 @@ async function loadConversations() {
     }
 }
 
+async function loadMoreConversations() {
+    if (!conversationsCursor || isLoadingMoreConversations) return;
+    isLoadingMoreConversations = true;
+    try {
+        const res = await secureFetch(`/api/conversations?cursor=${encodeURIComponent(conversationsCursor)}`);
+        if (res.ok) {
+            const data = await res.json();
+            conversationsCursor = data.next_cursor;
+            addConversationSummaries(data.conversations);
+            renderConversationList();
+        }
+    } catch (e) {
+        console.error('Failed to load more conversations:', e);
+    } finally {
+        isLoadingMoreConversations = false;
+    }
+}
+
+// Load the next page when the sidebar is scrolled near the bottom
+conversationList.addEventListener('scroll', () => {
+    if (conversationList.scrollTop + conversationList.clientHeight >= conversationList.scrollHeight - 100) {
+        loadMoreConversations();
+    }
+});
+
 // Default greeting message (no API call needed)
 const DEFAULT_GREETING = `[Vietsub] Chào bạn! Mình là Teacher Da Vinci, giáo viên tiếng Anh của bạn.
 [Vietsub] Mình sẽ giúp bạn học tiếng Anh một cách tự nhiên và thú vị. Bạn có thể hỏi mình về từ vựng, ngữ pháp, cách phát âm, hoặc luyện hội thoại.
@@ -370,6 +467,7 @@ async function createNewConversation() {
                 title: conv.title,
                 messages: [],
                 createdAt: new Date(conv.created_at).getTime(),
+                updatedAt: new Date(conv.updated_at).getTime(),
                 totalTokens: 0
             };
 
@@ -414,14 +512,10 @@ async function loadConversation(id, forceReload = false) {
             conversations[id] = {
                 id: conv.id,
                 title: conv.title,
-                messages: conv.messages.map(m => ({
-                    id: m.id,
-                    role: m.role,
-                    content: m.content,
-                    status: m.status || 'completed',
-                    tokens: m.tokens
-                })),
+                messages: conv.messages.map(toMessageState),
+                hasMore: conv.has_more,
                 createdAt: new Date(conv.created_at).getTime(),
+                updatedAt: new Date(conv.updated_at).getTime(),
                 totalTokens: conv.total_tokens
             };
 
@@ -434,17 +528,61 @@ async function loadConversation(id, forceReload = false) {
     }
 }
 
-function renderConversationUI(conv) {
+function toMessageState(m) {
+    return {
+        id: m.id,
+        role: m.role,
+        content: m.content,
+        status: m.status || 'completed',
+        tokens: m.tokens,
+        segments: m.segments
+    };
+}
+
+// Server returns the newest page first; older pages are fetched with ?before=<oldest id>
+async function loadOlderMessages() {
+    const conv = conversations[currentConversationId];
+    if (!conv || !conv.hasMore || conv.messages.length === 0) return;
+
+    try {
+        const res = await secureFetch(`/api/conversations/${conv.id}?before=${conv.messages[0].id}`);
+        if (res.ok) {
+            const data = await res.json();
+            if (conversations[currentConversationId] !== conv) return;
+
+            conv.messages = data.conversation.messages.map(toMessageState).concat(conv.messages);
+            conv.hasMore = data.conversation.has_more;
+
+            // Keep the current message in place after prepending
+            const offsetFromBottom = document.body.scrollHeight - window.scrollY;
+            renderConversationUI(conv, false);
+            window.scrollTo({ top: document.body.scrollHeight - offsetFromBottom, behavior: 'instant' });
+        }
+    } catch (e) {
+        console.error('Failed to load older messages:', e);
+    }
+}
+
+function renderConversationUI(conv, scrollToBottom = true) {
     chatMessages.innerHTML = '';
     if (conv.messages.length > 0) {
         welcomeSection.style.display = 'none';
         chatMessages.classList.add('active');
+        if (conv.hasMore) {
+            const olderBtn = document.createElement('button');
+            olderBtn.className = 'btn-continue btn-load-older';
+            olderBtn.textContent = 'Xem tin nhắn cũ hơn';
+            olderBtn.onclick = loadOlderMessages;
+            chatMessages.appendChild(olderBtn);
+        }
         conv.messages.forEach(msg => {
-            addMessageToUI(msg.content, msg.role, msg.tokens || null, msg.status || 'completed', msg.id);
+            addMessageToUI(msg.content, msg.role, msg.tokens || null, msg.status || 'completed', msg.id, msg.segments);
         });
-        setTimeout(() => {
-            window.scrollTo({ top: document.body.scrollHeight, behavior: 'instant' });
-        }, 50);
+        if (scrollToBottom) {
+            setTimeout(() => {
+                window.scrollTo({ top: document.body.scrollHeight, behavior: 'instant' });
+            }, 50);
+        }
     } else {
         // Show default greeting for empty conversation
         showDefaultGreeting();
@@ -547,10 +685,12 @@ async function undoDeleteConversation() {
 }
 
 function renderConversationList() {
-    const sorted = Object.values(conversations).sort((a, b) => b.createdAt - a.createdAt);
+    // Same order as the server pages (updated_at DESC)
+    const sorted = Object.values(conversations).sort((a, b) => b.updatedAt - a.updatedAt);
     conversationList.innerHTML = sorted.map(conv => `
         <div class="conversation-item ${conv.id === currentConversationId ? 'active' : ''}" 
-             onclick="loadConversation('${conv.id}')" data-id="${conv.id}">
+             onclick="loadConversation('${conv.id}')" data-id="${conv.id}"
+             title="${escapeHtml(conv.lastMessagePreview || '').replace(/"/g, '&quot;')}">
             <svg width="18" height="18" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
                 <path d="M21 15a2 2 0 0 1-2 2H7l-4 4V5a2 2 0 0 1 2-2h14a2 2 0 0 1 2 2z"/>
             </svg>
@@ -804,6 +944,12 @@ function toggleAutoPlay() {
     toggle.classList.toggle('active', isAutoPlayMode);
 }
 
+function toggleSpeculative() {
+    isSpeculativeEnabled = !isSpeculativeEnabled;
+    const toggle = document.getElementById('speculativeToggle');
+    toggle.classList.toggle('active', isSpeculativeEnabled);
+}
+
 function toggleStreamVoice() {
     isStreamVoiceEnabled = !isStreamVoiceEnabled;
     const toggle = document.getElementById('streamVoiceToggle');
@@ -1123,41 +1269,28 @@ async function prefetchAudio(text, lang) {
     return null;
 }
 
-async function processStreamVoice(text) {
+// Queue a spoken segment as soon as the stream renderer closes it
+function queueStreamVoiceSegment(seg, index) {
     if (!isStreamVoiceEnabled || streamVoiceAborted) return;
     
-    const segments = splitByLanguage(text);
-    if (segments.length === 0) return;
+    const queueKey = `seg_${index}`;
+    if (queuedSegmentKeys.has(queueKey)) return;
     
-    // Check for completed segments
-    const tagPattern = /\[(Vietsub|Engsub)\]/gi;
-    const tags = text.match(tagPattern) || [];
-    const completedSegments = Math.max(0, tags.length - 1);
+    queuedSegmentKeys.add(queueKey);
     
-    // Queue new segments
-    for (let i = 0; i < completedSegments && i < segments.length; i++) {
-        const seg = segments[i];
-        if (!seg.text || seg.text.trim().length < 2) continue;
-        
-        const queueKey = `seg_${i}`;
-        if (queuedSegmentKeys.has(queueKey)) continue;
-        
-        queuedSegmentKeys.add(queueKey);
-        
-        // Split into chunks and queue sequentially
-        const chunks = splitIntoChunks(seg.text, seg.lang);
-        
-        for (let j = 0; j < chunks.length; j++) {
-            streamVoiceQueue.push({
-                key: `seg_${i}_chunk_${j}`,
-                segIndex: i,
-                chunkIndex: j,
-                text: chunks[j].text,
-                lang: chunks[j].lang,
-                fetching: false,
-                ready: false
-            });
-        }
+    // Split into chunks and queue sequentially
+    const chunks = splitIntoChunks(seg.text, seg.lang);
+    
+    for (let j = 0; j < chunks.length; j++) {
+        streamVoiceQueue.push({
+            key: `seg_${index}_chunk_${j}`,
+            segIndex: index,
+            chunkIndex: j,
+            text: chunks[j].text,
+            lang: chunks[j].lang,
+            fetching: false,
+            ready: false
+        });
     }
     
     if (!isPlayingStreamVoice && streamVoiceQueue.length > 0) {
@@ -1262,46 +1395,6 @@ async function playStreamVoiceQueue() {
     activeFetches = 0;
 }
 
-// Queue final segment when stream completes
-async function queueFinalStreamVoiceSegment(text) {
-    if (!isStreamVoiceEnabled || streamVoiceAborted) return;
-    
-    const segments = splitByLanguage(text);
-    if (segments.length === 0) return;
-    
-    const lastIndex = segments.length - 1;
-    const seg = segments[lastIndex];
-    if (seg && seg.text && seg.text.trim().length >= 2) {
-        const queueKey = `seg_${lastIndex}`;
-        
-        if (!queuedSegmentKeys.has(queueKey)) {
-            queuedSegmentKeys.add(queueKey);
-            
-            // Split into chunks
-            const chunks = splitIntoChunks(seg.text, seg.lang);
-            
-            for (let j = 0; j < chunks.length; j++) {
-                const chunk = chunks[j];
-                const chunkKey = `seg_${lastIndex}_chunk_${j}`;
-                
-                prefetchAudio(chunk.text, chunk.lang);
-                
-                streamVoiceQueue.push({
-                    key: chunkKey,
-                    index: lastIndex,
-                    chunkIndex: j,
-                    text: chunk.text,
-                    lang: chunk.lang
-                });
-            }
-        }
-    }
-    
-    if (!isPlayingStreamVoice && streamVoiceQueue.length > 0) {
-        playStreamVoiceQueue();
-    }
-}
-
 async function speakEnglish(text) {
     stopSpeaking();
     isSpeaking = true;
@@ -1369,7 +1462,12 @@ function stopSpeaking() {
     }
 }
 
-async function speakTextWithCallback(text, onComplete, btn) {
+// Pre-parsed message from the server (Message.segments), null if missing or outdated
+function usableParsed(parsed) {
+    return parsed && parsed.v === 1 ? parsed : null;
+}
+
+async function speakTextWithCallback(text, onComplete, btn, ttsChunks = null) {
     stopSpeaking();
 
     isSpeaking = true;
@@ -1379,9 +1477,18 @@ async function speakTextWithCallback(text, onComplete, btn) {
         btn.classList.add('playing');
     }
 
-    const segments = splitByLanguage(text);
+    // Flatten segments into chunks (max 10 words each), or use server-computed chunks
+    const allChunks = [];
+    if (ttsChunks) {
+        ttsChunks.forEach(([lang, chunkText]) => allChunks.push({ text: chunkText, lang: lang }));
+    } else {
+        for (const seg of splitByLanguage(text)) {
+            if (!seg.text || seg.text.trim().length < 2) continue;
+            allChunks.push(...splitIntoChunks(seg.text, seg.lang));
+        }
+    }
 
-    if (segments.length === 0) {
+    if (allChunks.length === 0) {
         isSpeaking = false;
         if (btn) {
             btn.innerHTML = svgIcons.play;
@@ -1392,14 +1499,6 @@ async function speakTextWithCallback(text, onComplete, btn) {
         return;
     }
 
-    // Flatten segments into chunks (max 10 words each)
-    const allChunks = [];
-    for (const seg of segments) {
-        if (!seg.text || seg.text.trim().length < 2) continue;
-        const chunks = splitIntoChunks(seg.text, seg.lang);
-        allChunks.push(...chunks);
-    }
-
     // Look-ahead fetch: fetch next chunks while playing current
     // Pipeline fetch - keep 2 concurrent requests, fetch next when one completes
     let fetchIndex = 0;
@@ -1522,11 +1621,11 @@ async function speakTextWithCallback(text, onComplete, btn) {
     if (onComplete) onComplete();
 }
 
-function toggleAudio(text, btn) {
+function toggleAudio(text, btn, ttsChunks = null) {
     if (currentPlayingBtn === btn && isSpeaking) {
         stopSpeaking();
     } else {
-        speakTextWithCallback(text, null, btn);
+        speakTextWithCallback(text, null, btn, ttsChunks);
     }
 }
 
@@ -1762,179 +1861,335 @@ function formatList(content) {
     return html;
 }
 
-function formatMessageContent(content, isStreaming = false) {
+function formatMessageContent(content, isStreaming = false, parsed = null) {
     const cleanContent = removeActionsTag(content);
 
     // Updated pattern to include [Table], [Tip], and [List] tags
     const pattern = /\[(Vietsub|Engsub|Table|Tip|List)\]\s*([^[\]]*?)(?=\[(Vietsub|Engsub|Table|Tip|List)\]|$)/gi;
-    let result = '';
-    let hasTag = false;
-    let lastVietnamese = '';
-    let inList = false;
+    const state = createFormatState();
 
     const matches = [];
-    let match;
-    while ((match = pattern.exec(cleanContent)) !== null) {
-        matches.push({ tag: match[1].toLowerCase(), text: match[2].trim() });
+    if (usableParsed(parsed)) {
+        // Untagged replies come back as a single 'text' segment -> fallback below
+        parsed.segments.forEach(([tag, text]) => {
+            if (tag !== 'text') matches.push({ tag: tag, text: text });
+        });
+    } else {
+        let match;
+        while ((match = pattern.exec(cleanContent)) !== null) {
+            matches.push({ tag: match[1].toLowerCase(), text: match[2].trim() });
+        }
     }
 
     for (let i = 0; i < matches.length; i++) {
-        const { tag, text } = matches[i];
-        hasTag = true;
+        formatSegment(state, matches[i], matches[i + 1], isStreaming);
+    }
 
-        if (!text) continue;
+    if (matches.length === 0) {
+        return `<span class="vietnamese-text">${formatMarkdown(cleanContent)}</span>`;
+    }
 
-        // Handle [Tip] tag
-        if (tag === 'tip') {
-            // Flush any pending Vietnamese text
-            if (lastVietnamese) {
-                result += `<span class="vietnamese-text">${formatMarkdown(lastVietnamese)}</span>`;
-                lastVietnamese = '';
-            }
-            result += `<div class="tip-box">
-                <div class="tip-icon">
-                    <svg width="18" height="18" viewBox="0 0 24 24" fill="currentColor">
-                        <path d="M9 21c0 .5.4 1 1 1h4c.6 0 1-.5 1-1v-1H9v1zm3-19C8.1 2 5 5.1 5 9c0 2.4 1.2 4.5 3 5.7V17c0 .5.4 1 1 1h6c.6 0 1-.5 1-1v-2.3c1.8-1.3 3-3.4 3-5.7 0-3.9-3.1-7-7-7z"/>
-                    </svg>
-                </div>
-                <span class="tip-text">${text}</span>
-            </div>`;
-        }
-        // Handle [Table] tag
-        else if (tag === 'table') {
-            // Flush any pending Vietnamese text
-            if (lastVietnamese) {
-                result += `<span class="vietnamese-text">${formatMarkdown(lastVietnamese)}</span>`;
-                lastVietnamese = '';
-            }
-            result += formatTable(text, isStreaming);
-        } else if (tag === 'list') {
-            // Flush any pending Vietnamese text
-            if (lastVietnamese) {
-                result += `<span class="vietnamese-text">${formatMarkdown(lastVietnamese)}</span>`;
-                lastVietnamese = '';
-            }
-            result += formatList(text);
-        } else if (tag === 'engsub') {
-            const isGrammarPattern = text.includes('+');
-            const cleanText = text.replace(/\*\*/g, '');
-
-            if (isGrammarPattern) {
-                if (lastVietnamese) {
-                    result += `<span class="vietnamese-text">${formatMarkdown(lastVietnamese)}</span>`;
-                    lastVietnamese = '';
-                }
-                const formattedText = text.replace(/\*\*(.+?)\*\*/g, '<strong>$1</strong>');
-                result += `<span class="english-grammar">${formattedText}</span> `;
-            } else {
-                const nextMatch = matches[i + 1];
-                const nextStartsWithColon = nextMatch && nextMatch.tag === 'vietsub' && /^:/.test(nextMatch.text);
+    return finishFormatState(state);
+}
 
-                const endsWithColon = cleanText.trim().endsWith(':');
-                const hasSentenceEnding = /[.!?](?:\s|$)/.test(cleanText) && !/\.(js|ts|py|go|rs|rb|php|css|html|json|xml|yaml|yml|md|txt|sh|bash|c|cpp|h|java|kt|swift|vue|jsx|tsx)$/i.test(cleanText);
-                const isShort = endsWithColon || nextStartsWithColon || (cleanText.split(' ').length <= 6 && !hasSentenceEnding);
+// Formatting state carried between tag segments (pending Vietnamese text, open vocab list)
+function createFormatState() {
+    return { result: '', lastVietnamese: '', inList: false };
+}
 
-                // Use data-speak attribute to avoid escape issues with special characters
-                const speakText = cleanText.replace(/\.\.\./g, '').trim();
+function copyFormatState(state) {
+    return { result: state.result, lastVietnamese: state.lastVietnamese, inList: state.inList };
+}
 
-                if (isShort) {
-                    if (lastVietnamese) {
-                        result += `<span class="vietnamese-text">${formatMarkdown(lastVietnamese)}</span>`;
-                        lastVietnamese = '';
-                    }
-                    result += `<span class="english-word" data-speak="${encodeURIComponent(speakText)}">${cleanText}</span> `;
-                } else {
-                    if (lastVietnamese) {
-                        result += `<span class="vietnamese-text">${formatMarkdown(lastVietnamese)}</span>`;
-                        lastVietnamese = '';
-                    }
-                    const displayText = text.replace(/\*\*(.+?)\*\*/g, '<strong>$1</strong>');
-                    result += `<span class="english-sentence" data-speak="${encodeURIComponent(speakText)}">${displayText}</span>`;
-                }
+// State with nothing pending: state.result is well-formed HTML on its own
+function isFormatStateSettled(state) {
+    return !state.lastVietnamese && !state.inList;
+}
+
+// Append the HTML of one tag segment; `next` is the following segment (if any)
+function formatSegment(state, current, next, isStreaming = false) {
+    const { tag, text } = current;
+    if (!text) return;
+
+    // Handle [Tip] tag
+    if (tag === 'tip') {
+        // Flush any pending Vietnamese text
+        if (state.lastVietnamese) {
+            state.result += `<span class="vietnamese-text">${formatMarkdown(state.lastVietnamese)}</span>`;
+            state.lastVietnamese = '';
+        }
+        state.result += `<div class="tip-box">
+            <div class="tip-icon">
+                <svg width="18" height="18" viewBox="0 0 24 24" fill="currentColor">
+                    <path d="M9 21c0 .5.4 1 1 1h4c.6 0 1-.5 1-1v-1H9v1zm3-19C8.1 2 5 5.1 5 9c0 2.4 1.2 4.5 3 5.7V17c0 .5.4 1 1 1h6c.6 0 1-.5 1-1v-2.3c1.8-1.3 3-3.4 3-5.7 0-3.9-3.1-7-7-7z"/>
+                </svg>
+            </div>
+            <span class="tip-text">${text}</span>
+        </div>`;
+    }
+    // Handle [Table] tag
+    else if (tag === 'table') {
+        // Flush any pending Vietnamese text
+        if (state.lastVietnamese) {
+            state.result += `<span class="vietnamese-text">${formatMarkdown(state.lastVietnamese)}</span>`;
+            state.lastVietnamese = '';
+        }
+        state.result += formatTable(text, isStreaming);
+    } else if (tag === 'list') {
+        // Flush any pending Vietnamese text
+        if (state.lastVietnamese) {
+            state.result += `<span class="vietnamese-text">${formatMarkdown(state.lastVietnamese)}</span>`;
+            state.lastVietnamese = '';
+        }
+        state.result += formatList(text);
+    } else if (tag === 'engsub') {
+        const isGrammarPattern = text.includes('+');
+        const cleanText = text.replace(/\*\*/g, '');
+
+        if (isGrammarPattern) {
+            if (state.lastVietnamese) {
+                state.result += `<span class="vietnamese-text">${formatMarkdown(state.lastVietnamese)}</span>`;
+                state.lastVietnamese = '';
             }
+            const formattedText = text.replace(/\*\*(.+?)\*\*/g, '<strong>$1</strong>');
+            state.result += `<span class="english-grammar">${formattedText}</span> `;
         } else {
-            const listMatch = text.match(/^(\d+)\.\s*/);
-            const isNewSection = text.startsWith('**');
-            const hasDialogue = /\*\*[^*]+:\*\*/.test(text);
-
-            if (text.includes('***')) {
-                if (inList) {
-                    if (lastVietnamese) result += `<span class="vietnamese-text">${formatMarkdown(lastVietnamese)}</span></li>`;
-                    result += '</ul>';
-                    inList = false;
-                    lastVietnamese = '';
-                }
-                const parts = text.split('***');
-                if (lastVietnamese) {
-                    lastVietnamese += ' ' + parts[0].trim();
-                    result += `<span class="vietnamese-text">${formatMarkdown(lastVietnamese)}</span>`;
-                } else if (parts[0].trim()) {
-                    result += `<span class="vietnamese-text">${formatMarkdown(parts[0].trim())}</span>`;
-                }
-                result += '<br><hr class="divider">';
-                lastVietnamese = parts[1] ? parts[1].trim() : '';
-            } else if (hasDialogue) {
-                if (inList) {
-                    if (lastVietnamese) result += `<span class="vietnamese-text">${formatMarkdown(lastVietnamese)}</span></li>`;
-                    result += '</ul>';
-                    inList = false;
+            const nextStartsWithColon = next && next.tag === 'vietsub' && /^:/.test(next.text);
+
+            const endsWithColon = cleanText.trim().endsWith(':');
+            const hasSentenceEnding = /[.!?](?:\s|$)/.test(cleanText) && !/\.(js|ts|py|go|rs|rb|php|css|html|json|xml|yaml|yml|md|txt|sh|bash|c|cpp|h|java|kt|swift|vue|jsx|tsx)$/i.test(cleanText);
+            const isShort = endsWithColon || nextStartsWithColon || (cleanText.split(' ').length <= 6 && !hasSentenceEnding);
+
+            // Use data-speak attribute to avoid escape issues with special characters
+            const speakText = cleanText.replace(/\.\.\./g, '').trim();
+
+            if (isShort) {
+                if (state.lastVietnamese) {
+                    state.result += `<span class="vietnamese-text">${formatMarkdown(state.lastVietnamese)}</span>`;
+                    state.lastVietnamese = '';
                 }
-                if (lastVietnamese) {
-                    result += `<span class="vietnamese-text">${formatMarkdown(lastVietnamese)}</span><br><br>`;
-                    lastVietnamese = '';
+                state.result += `<span class="english-word" data-speak="${encodeURIComponent(speakText)}">${cleanText}</span> `;
+            } else {
+                if (state.lastVietnamese) {
+                    state.result += `<span class="vietnamese-text">${formatMarkdown(state.lastVietnamese)}</span>`;
+                    state.lastVietnamese = '';
                 }
-                const dialogueFormatted = text.replace(/\*\*([^*]+):\*\*/g, '<br><strong>$1:</strong>');
-                const cleanDialogue = dialogueFormatted.replace(/^<br>/, '');
-                result += `<span class="vietnamese-text">${cleanDialogue}</span><br>`;
-            } else if (listMatch) {
-                if (!inList) {
-                    if (lastVietnamese) {
-                        result += `<span class="vietnamese-text">${formatMarkdown(lastVietnamese)}</span>`;
-                        lastVietnamese = '';
-                    }
-                    result += '<ul class="vocab-list">';
-                    inList = true;
-                } else if (lastVietnamese) {
-                    result += `<span class="vietnamese-text">${formatMarkdown(lastVietnamese)}</span></li>`;
-                    lastVietnamese = '';
+                const displayText = text.replace(/\*\*(.+?)\*\*/g, '<strong>$1</strong>');
+                state.result += `<span class="english-sentence" data-speak="${encodeURIComponent(speakText)}">${displayText}</span>`;
+            }
+        }
+    } else {
+        const listMatch = text.match(/^(\d+)\.\s*/);
+        const isNewSection = text.startsWith('**');
+        const hasDialogue = /\*\*[^*]+:\*\*/.test(text);
+
+        if (text.includes('***')) {
+            if (state.inList) {
+                if (state.lastVietnamese) state.result += `<span class="vietnamese-text">${formatMarkdown(state.lastVietnamese)}</span></li>`;
+                state.result += '</ul>';
+                state.inList = false;
+                state.lastVietnamese = '';
+            }
+            const parts = text.split('***');
+            if (state.lastVietnamese) {
+                state.lastVietnamese += ' ' + parts[0].trim();
+                state.result += `<span class="vietnamese-text">${formatMarkdown(state.lastVietnamese)}</span>`;
+            } else if (parts[0].trim()) {
+                state.result += `<span class="vietnamese-text">${formatMarkdown(parts[0].trim())}</span>`;
+            }
+            state.result += '<br><hr class="divider">';
+            state.lastVietnamese = parts[1] ? parts[1].trim() : '';
+        } else if (hasDialogue) {
+            if (state.inList) {
+                if (state.lastVietnamese) state.result += `<span class="vietnamese-text">${formatMarkdown(state.lastVietnamese)}</span></li>`;
+                state.result += '</ul>';
+                state.inList = false;
+            }
+            if (state.lastVietnamese) {
+                state.result += `<span class="vietnamese-text">${formatMarkdown(state.lastVietnamese)}</span><br><br>`;
+                state.lastVietnamese = '';
+            }
+            const dialogueFormatted = text.replace(/\*\*([^*]+):\*\*/g, '<br><strong>$1:</strong>');
+            const cleanDialogue = dialogueFormatted.replace(/^<br>/, '');
+            state.result += `<span class="vietnamese-text">${cleanDialogue}</span><br>`;
+        } else if (listMatch) {
+            if (!state.inList) {
+                if (state.lastVietnamese) {
+                    state.result += `<span class="vietnamese-text">${formatMarkdown(state.lastVietnamese)}</span>`;
+                    state.lastVietnamese = '';
                 }
-                result += `<li><span class="list-num">${listMatch[1]}.</span> `;
-                lastVietnamese = text.replace(/^\d+\.\s*/, '');
-            } else if (isNewSection) {
-                if (inList) {
-                    if (lastVietnamese) {
-                        result += `<span class="vietnamese-text">${formatMarkdown(lastVietnamese)}</span></li>`;
-                    }
-                    result += '</ul><br>';
-                    inList = false;
-                    lastVietnamese = '';
-                } else if (lastVietnamese) {
-                    result += `<span class="vietnamese-text">${formatMarkdown(lastVietnamese)}</span><br><br>`;
-                    lastVietnamese = '';
+                state.result += '<ul class="vocab-list">';
+                state.inList = true;
+            } else if (state.lastVietnamese) {
+                state.result += `<span class="vietnamese-text">${formatMarkdown(state.lastVietnamese)}</span></li>`;
+                state.lastVietnamese = '';
+            }
+            state.result += `<li><span class="list-num">${listMatch[1]}.</span> `;
+            state.lastVietnamese = text.replace(/^\d+\.\s*/, '');
+        } else if (isNewSection) {
+            if (state.inList) {
+                if (state.lastVietnamese) {
+                    state.result += `<span class="vietnamese-text">${formatMarkdown(state.lastVietnamese)}</span></li>`;
                 }
-                lastVietnamese = text;
-            } else {
-                lastVietnamese += (lastVietnamese ? ' ' : '') + text;
+                state.result += '</ul><br>';
+                state.inList = false;
+                state.lastVietnamese = '';
+            } else if (state.lastVietnamese) {
+                state.result += `<span class="vietnamese-text">${formatMarkdown(state.lastVietnamese)}</span><br><br>`;
+                state.lastVietnamese = '';
             }
+            state.lastVietnamese = text;
+        } else {
+            state.lastVietnamese += (state.lastVietnamese ? ' ' : '') + text;
         }
     }
+}
 
-    if (lastVietnamese) {
-        result += `<span class="vietnamese-text">${formatMarkdown(lastVietnamese)}</span>`;
-        if (inList) result += '</li>';
+function finishFormatState(state) {
+    let result = state.result;
+    if (state.lastVietnamese) {
+        result += `<span class="vietnamese-text">${formatMarkdown(state.lastVietnamese)}</span>`;
+        if (state.inList) result += '</li>';
     }
-    if (inList) result += '</ul>';
+    if (state.inList) result += '</ul>';
+    return result;
+}
 
-    if (!hasTag) {
-        return `<span class="vietnamese-text">${formatMarkdown(cleanContent)}</span>`;
+// ==================== STREAM RENDERING ====================
+// Renders a streamed reply incrementally: closed tag segments are formatted once and
+// appended to a stable element; only the last open segment (plus anything still
+// pending, e.g. an unfinished vocab list) is re-rendered on each chunk.
+const STREAM_TAG_PATTERN = /\[(Vietsub|Engsub|Table|Tip|List|Actions)\]/gi;
+const STREAM_TAG_MAX_LENGTH = 9; // '[Vietsub]', '[Actions]'
+
+function createStreamRenderer(container, onSpokenSegment = null) {
+    const stableEl = document.createElement('div');
+    const tailEl = document.createElement('div');
+    const state = createFormatState();
+    const pending = []; // closed segments waiting for the next one (engsub looks ahead)
+
+    let content = '';
+    let mounted = false;
+    let sawTag = false;
+    let ended = false; // reached [Actions]: the rest is not rendered
+    let openTag = null;
+    let openStart = 0;
+    let scanFrom = 0;
+    let committedLength = 0;
+    let spokenCount = 0;
+
+    function emitSpoken(tag, text) {
+        if (!onSpokenSegment) return;
+        const lang = SPOKEN_SEGMENT_LANGS[tag];
+        const spokenText = lang ? cleanSpokenText(tag, text) : '';
+        if (spokenText) onSpokenSegment({ text: spokenText, lang: lang }, spokenCount++);
+    }
+
+    function closeSegment(tag, rawText) {
+        const text = rawText.trim();
+        emitSpoken(tag, text);
+        // formatMessageContent's pattern skips segments containing brackets as well
+        if (/[[\]]/.test(text)) return;
+        pending.push({ tag: tag, text: text });
+    }
+
+    function openSegment() {
+        if (!openTag || ended) return null;
+        // Hide a tag that is still being streamed, e.g. "[Engs"
+        const text = content.slice(openStart).replace(/\[[A-Za-z]*$/, '').trim();
+        if (/[[\]]/.test(text)) return null;
+        return { tag: openTag, text: text };
+    }
+
+    function scanTags() {
+        // Start a few chars back so a tag split across chunks is still found
+        STREAM_TAG_PATTERN.lastIndex = scanFrom;
+        let match;
+        while ((match = STREAM_TAG_PATTERN.exec(content)) !== null) {
+            sawTag = true;
+            if (openTag) closeSegment(openTag, content.slice(openStart, match.index));
+            const tag = match[1].toLowerCase();
+            if (tag === 'actions') {
+                ended = true;
+                openTag = null;
+                return;
+            }
+            openTag = tag;
+            openStart = match.index + match[0].length;
+            scanFrom = openStart;
+        }
+        scanFrom = Math.max(scanFrom, content.length - STREAM_TAG_MAX_LENGTH + 1);
     }
 
-    return result;
+    function commit() {
+        const open = openSegment();
+        while (pending.length > 1 || (pending.length === 1 && open && open.text)) {
+            const current = pending.shift();
+            formatSegment(state, current, pending[0] || open, true);
+        }
+        // Only settled HTML is appended - an open <ul>/pending text stays in the tail
+        if (isFormatStateSettled(state) && state.result.length > committedLength) {
+            stableEl.insertAdjacentHTML('beforeend', state.result.slice(committedLength));
+            committedLength = state.result.length;
+        }
+    }
+
+    function renderTail() {
+        let html;
+        if (!sawTag) {
+            html = `<span class="vietnamese-text">${formatMarkdown(removeActionsTag(content))}</span>`;
+        } else {
+            const preview = copyFormatState(state);
+            const rest = pending.slice();
+            const open = openSegment();
+            if (open) rest.push(open);
+            rest.forEach((seg, i) => formatSegment(preview, seg, rest[i + 1], true));
+            html = finishFormatState(preview).slice(committedLength);
+        }
+        tailEl.innerHTML = html + '<span class="streaming-cursor"></span>';
+    }
+
+    return {
+        append(chunk) {
+            if (!mounted) {
+                container.innerHTML = '';
+                container.appendChild(stableEl);
+                container.appendChild(tailEl);
+                mounted = true;
+            }
+            content += chunk;
+            if (!ended) scanTags();
+            commit();
+            renderTail();
+        },
+
+        // Stream completed: close the last segment so its voice can be queued
+        finish() {
+            if (openTag && !ended) {
+                closeSegment(openTag, content.slice(openStart));
+                openTag = null;
+            }
+            if (!sawTag) emitSpoken('text', removeActionsTag(content));
+        }
+    };
+}
+
+// Same cleanup as spoken_segments() in utils/message_parser.py so TTS cache keys match
+const SPOKEN_SEGMENT_LANGS = { vietsub: 'vi', engsub: 'en', text: 'vi' };
+
+function cleanSpokenText(tag, text) {
+    let content = text.replace(/\*\*([^*]+)\*\*/g, '$1').replace(/[*#_`~]/g, '');
+    if (tag === 'text') content = content.replace(/\[[^\]]*\]/g, '');
+    content = content.trim().replace(/^[A-Z]\s*-\s*/, '');
+    content = content.replace(/"/g, '').replace(/\//g, ' ').trim();
+    return content.length >= 2 ? content : '';
 }
 
 
 // ==================== MESSAGE UI ====================
-function addMessageToUI(content, role, tokenInfo = null, status = 'completed', messageId = null) {
+function addMessageToUI(content, role, tokenInfo = null, status = 'completed', messageId = null, parsed = null) {
+    parsed = usableParsed(parsed);
+
     welcomeSection.style.display = 'none';
     chatMessages.classList.add('active');
 
@@ -1951,7 +2206,7 @@ function addMessageToUI(content, role, tokenInfo = null, status = 'completed', m
 
     if (role === 'assistant') {
         contentDiv.classList.add('formatted-content');
-        contentDiv.innerHTML = formatMessageContent(content);
+        contentDiv.innerHTML = formatMessageContent(content, false, parsed);
 
         if (status === 'cancelled') {
             const cancelledDiv = document.createElement('div');
@@ -1972,7 +2227,7 @@ function addMessageToUI(content, role, tokenInfo = null, status = 'completed', m
         }
 
         if (status === 'completed') {
-            const suggestedActions = extractActions(content);
+            const suggestedActions = parsed ? parsed.actions : extractActions(content);
             if (suggestedActions.length > 0) {
                 const actionsContainer = document.createElement('div');
                 actionsContainer.className = 'suggested-actions';
@@ -2027,7 +2282,7 @@ function addMessageToUI(content, role, tokenInfo = null, status = 'completed', m
         audioBtn.className = 'btn-audio-toggle';
         audioBtn.innerHTML = svgIcons.play;
         audioBtn.title = 'Nghe';
-        audioBtn.onclick = () => toggleAudio(removeActionsTag(content), audioBtn);
+        audioBtn.onclick = () => toggleAudio(removeActionsTag(content), audioBtn, parsed ? parsed.tts : null);
         actions.appendChild(audioBtn);
 
         if (tokenInfo && tokenInfo.total_tokens) {
@@ -2078,6 +2333,11 @@ function hideStopButton() {
 }
 
 async function stopStreaming() {
+    if (currentAssistantMsgId) {
+        // Báo server đóng stream upstream ngay, không chờ lần yield kế tiếp.
+        // Không chờ ở đây để UI dừng ngay; finalize (catch của send/retry) chờ response này
+        pendingCancel = secureFetch(`/api/messages/${currentAssistantMsgId}/cancel`, { method: 'POST' }).catch(() => null);
+    }
     if (streamAbortController) {
         streamAbortController.abort();
     }
@@ -2088,12 +2348,22 @@ async function stopStreaming() {
     }
 }
 
+async function waitForPendingCancel() {
+    const cancel = pendingCancel;
+    pendingCancel = null;
+    if (cancel) await cancel;
+}
+
 function continueChat() {
     messageInput.focus();
 }
 
 
 // ==================== SEND MESSAGE ====================
+function renderQueueStatus(position) {
+    return `<span class="queue-status">Đang xếp hàng... (vị trí ${parseInt(position, 10) || 1})</span><span class="streaming-cursor"></span>`;
+}
+
 async function retryMessage(messageId, content) {
     if (isProcessing) return;
 
@@ -2108,6 +2378,7 @@ async function retryMessage(messageId, content) {
     clearTTSCache(); // Clear cache for new response
 
     streamAbortController = new AbortController();
+    const idempotencyKey = idempotencyKeyFor(content, currentConversationId, messageId);
 
     const streamDiv = document.createElement('div');
     streamDiv.className = 'message assistant';
@@ -2120,6 +2391,7 @@ async function retryMessage(messageId, content) {
     const contentDiv = document.createElement('div');
     contentDiv.className = 'message-content formatted-content';
     contentDiv.innerHTML = '<span class="streaming-cursor"></span>';
+    const streamRenderer = createStreamRenderer(contentDiv, queueStreamVoiceSegment);
 
     streamDiv.appendChild(avatar);
     streamDiv.appendChild(contentDiv);
@@ -2128,16 +2400,18 @@ async function retryMessage(messageId, content) {
 
     let fullResponse = '';
     let tokenInfo = {};
+    let parsedReply = null;
     let assistantMsgId = null;
 
     try {
         const res = await fetch('/api/chat', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'Idempotency-Key': idempotencyKey },
             body: JSON.stringify({
                 message: content,
                 conversation_id: currentConversationId,
-                retry_message_id: messageId
+                retry_message_id: messageId,
+                speculative: isSpeculativeEnabled
             }),
             signal: streamAbortController.signal
         });
@@ -2165,20 +2439,24 @@ async function retryMessage(messageId, content) {
 
                         if (data.type === 'init') {
                             assistantMsgId = data.assistant_message_id;
+                            currentAssistantMsgId = assistantMsgId;
                             if (data.conversation_id && data.conversation_id !== currentConversationId) {
                                 currentConversationId = data.conversation_id;
                             }
+                        } else if (data.type === 'queued') {
+                            contentDiv.innerHTML = renderQueueStatus(data.position);
                         } else if (data.type === 'chunk') {
                             fullResponse += data.content;
-                            contentDiv.innerHTML = formatMessageContent(fullResponse, true) + '<span class="streaming-cursor"></span>';
+                            // Stream voice: segments are queued by the renderer as they complete
+                            streamRenderer.append(data.content);
                             window.scrollTo({ top: document.body.scrollHeight, behavior: 'smooth' });
-                            // Stream voice: play audio as segments complete
-                            processStreamVoice(fullResponse);
                         } else if (data.type === 'done') {
+                            pendingSend = null; // Lần gửi sau (kể cả cùng nội dung) là request mới
                             tokenInfo = data.tokens || {};
+                            parsedReply = data.segments || null;
                             assistantMsgId = data.assistant_message_id;
                             // Queue final segment for stream voice
-                            queueFinalStreamVoiceSegment(fullResponse);
+                            streamRenderer.finish();
                         } else if (data.type === 'error') {
                             throw new Error(data.error);
                         }
@@ -2192,7 +2470,7 @@ async function retryMessage(messageId, content) {
         }
 
         streamDiv.remove();
-        addMessageToUI(fullResponse, 'assistant', tokenInfo);
+        addMessageToUI(fullResponse, 'assistant', tokenInfo, 'completed', null, parsedReply);
         loadConversations();
 
         // Don't auto play again since stream voice already played
@@ -2204,6 +2482,8 @@ async function retryMessage(messageId, content) {
         if (streamMsg) streamMsg.remove();
 
         if (e.name === 'AbortError' || e.message.includes('body stream')) {
+            // Server phải hủy generation (status 'cancelled') trước khi finalize ghi usage ước tính
+            await waitForPendingCancel();
             if (fullResponse && assistantMsgId) {
                 try {
                     const finalizeRes = await secureFetch(`/api/messages/${assistantMsgId}/finalize`, {
@@ -2232,6 +2512,8 @@ async function retryMessage(messageId, content) {
         hideStopButton();
         streamAbortController = null;
         currentStreamReader = null;
+        currentAssistantMsgId = null;
+        pendingCancel = null;
     }
 }
 
@@ -2266,6 +2548,7 @@ async function sendMessage() {
     clearTTSCache(); // Clear cache for new response
 
     streamAbortController = new AbortController();
+    const idempotencyKey = idempotencyKeyFor(msg, currentConversationId);
 
     addMessageToUI(msg, 'user');
 
@@ -2283,6 +2566,7 @@ async function sendMessage() {
     const contentDiv = document.createElement('div');
     contentDiv.className = 'message-content formatted-content';
     contentDiv.innerHTML = '<span class="streaming-cursor"></span>';
+    const streamRenderer = createStreamRenderer(contentDiv, queueStreamVoiceSegment);
 
     streamDiv.appendChild(avatar);
     streamDiv.appendChild(contentDiv);
@@ -2291,13 +2575,14 @@ async function sendMessage() {
 
     let fullResponse = '';
     let tokenInfo = {};
+    let parsedReply = null;
     let assistantMsgId = null;
 
     try {
         const res = await fetch('/api/chat', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ message: msg, conversation_id: currentConversationId }),
+            headers: { 'Content-Type': 'application/json', 'Idempotency-Key': idempotencyKey },
+            body: JSON.stringify({ message: msg, conversation_id: currentConversationId, speculative: isSpeculativeEnabled }),
             signal: streamAbortController.signal
         });
 
@@ -2325,21 +2610,25 @@ async function sendMessage() {
 
                         if (data.type === 'init') {
                             assistantMsgId = data.assistant_message_id;
+                            currentAssistantMsgId = assistantMsgId;
                             if (data.conversation_id && data.conversation_id !== currentConversationId) {
                                 currentConversationId = data.conversation_id;
                                 history.replaceState({ conversationId: currentConversationId }, '', `?c=${currentConversationId}`);
                             }
+                        } else if (data.type === 'queued') {
+                            contentDiv.innerHTML = renderQueueStatus(data.position);
                         } else if (data.type === 'chunk') {
                             fullResponse += data.content;
-                            contentDiv.innerHTML = formatMessageContent(fullResponse) + '<span class="streaming-cursor"></span>';
+                            // Stream voice: segments are queued by the renderer as they complete
+                            streamRenderer.append(data.content);
                             window.scrollTo({ top: document.body.scrollHeight, behavior: 'smooth' });
-                            // Stream voice: play audio as segments complete
-                            processStreamVoice(fullResponse);
                         } else if (data.type === 'done') {
+                            pendingSend = null; // Lần gửi sau (kể cả cùng nội dung) là request mới
                             tokenInfo = data.tokens || {};
+                            parsedReply = data.segments || null;
                             assistantMsgId = data.assistant_message_id;
                             // Queue final segment for stream voice
-                            queueFinalStreamVoiceSegment(fullResponse);
+                            streamRenderer.finish();
 
                             if (data.conversation_id && data.conversation_id !== currentConversationId) {
                                 currentConversationId = data.conversation_id;
@@ -2358,7 +2647,7 @@ async function sendMessage() {
         }
 
         streamDiv.remove();
-        addMessageToUI(fullResponse, 'assistant', tokenInfo);
+        addMessageToUI(fullResponse, 'assistant', tokenInfo, 'completed', null, parsedReply);
 
         if (conversations[currentConversationId]) {
             conversations[currentConversationId].messages.push(
@@ -2382,6 +2671,8 @@ async function sendMessage() {
         stopStreamVoice();
 
         if (e.name === 'AbortError' || e.message.includes('body stream')) {
+            // Server phải hủy generation (status 'cancelled') trước khi finalize ghi usage ước tính
+            await waitForPendingCancel();
             if (fullResponse && assistantMsgId) {
                 try {
                     const finalizeRes = await secureFetch(`/api/messages/${assistantMsgId}/finalize`, {
@@ -2410,6 +2701,8 @@ async function sendMessage() {
         hideStopButton();
         streamAbortController = null;
         currentStreamReader = null;
+        currentAssistantMsgId = null;
+        pendingCancel = null;
     }
 }
 
@@ -2653,7 +2946,7 @@ window.addEventListener('resize', checkMobileView);
     if (urlConvId && conversations[urlConvId]) {
         await loadConversation(urlConvId, true);
     } else if (Object.keys(conversations).length > 0) {
-        const latest = Object.values(conversations).sort((a, b) => b.createdAt - a.createdAt)[0];
+        const latest = Object.values(conversations).sort((a, b) => b.updatedAt - a.updatedAt)[0];
         await loadConversation(latest.id, true);
     } else {
         resetChatUI();
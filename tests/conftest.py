@@ -0,0 +1,50 @@
+"""
+Fixtures dùng chung: app Flask tối thiểu + SQLite in-memory (không qua create_app)
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def require_app_deps():
+    pytest.importorskip('flask_sqlalchemy')
+    pytest.importorskip('dotenv')
+
+
+def make_test_app(database_uri='sqlite://'):
+    require_app_deps()
+    from flask import Flask
+    from models import db
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+@pytest.fixture
+def app():
+    require_app_deps()
+    from models import db
+
+    app = make_test_app()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def user(app):
+    from models import db, User
+
+    user = User(username='learner', email='learner@example.com', password_hash='x', total_tokens_used=0)
+    db.session.add(user)
+    db.session.commit()
+    return user
@@ -0,0 +1,157 @@
+"""
+AdmissionController: round-robin giữa các user, giới hạn per-user, hàng đợi và vị trí chờ
+"""
+
+import threading
+import time
+
+import pytest
+
+from services.admission_service import AdmissionController
+
+
+def grant_order(controller, tickets):
+    """Release lần lượt ticket đang chạy, trả về thứ tự được cấp slot"""
+    order = [t for t in tickets if t.granted]
+    while len(order) < len(tickets):
+        controller.release(order[-1])
+        order += [t for t in tickets if t.granted and t not in order]
+    return order
+
+
+def test_round_robin_between_users():
+    controller = AdmissionController(max_concurrent=1, max_per_user=1, max_queued_per_user=5)
+    # a1 chạy ngay; a2, a3 vào hàng đợi trước b và c
+    a1, a2, a3 = (controller.try_enqueue('a') for _ in range(3))
+    b1 = controller.try_enqueue('b')
+    c1, c2 = controller.try_enqueue('c'), controller.try_enqueue('c')
+
+    assert grant_order(controller, [a1, a2, a3, b1, c1, c2]) == [a1, a2, b1, c1, a3, c2]
+
+
+@pytest.mark.parametrize('max_concurrent, max_per_user, expected_active', [
+    (4, 1, {'a': 1, 'b': 1}),
+    (4, 2, {'a': 2, 'b': 1}),
+    (2, 2, {'a': 2}),
+])
+def test_per_user_and_global_caps(max_concurrent, max_per_user, expected_active):
+    controller = AdmissionController(max_concurrent=max_concurrent, max_per_user=max_per_user, max_queued_per_user=5)
+    for user_id in ['a', 'a', 'a', 'b']:
+        controller.try_enqueue(user_id)
+
+    assert controller.active_per_user == expected_active
+    assert controller.stats()['active'] == sum(expected_active.values())
+    assert controller.stats()['queued'] == 4 - sum(expected_active.values())
+
+
+def test_queue_cap_counts_only_waiting_tickets():
+    controller = AdmissionController(max_concurrent=1, max_per_user=1, max_queued_per_user=2)
+    running = controller.try_enqueue('a')
+    queued = [controller.try_enqueue('a'), controller.try_enqueue('a')]
+    assert running.granted and all(queued)
+    assert controller.try_enqueue('a') is None
+    # User khác không bị ảnh hưởng
+    assert controller.try_enqueue('b') is not None
+
+    controller.release(queued[0])
+    assert controller.try_enqueue('a') is not None
+
+
+def test_concurrent_try_enqueue_never_exceeds_queue_cap():
+    controller = AdmissionController(max_concurrent=0, max_per_user=1, max_queued_per_user=3)
+    barrier = threading.Barrier(32)
+    results = []
+
+    def submit():
+        barrier.wait()
+        results.append(controller.try_enqueue('a'))
+
+    threads = [threading.Thread(target=submit) for _ in range(32)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(ticket is not None for ticket in results) == 3
+    assert controller.stats()['queued'] == 3
+
+
+def test_position_follows_round_robin_order():
+    controller = AdmissionController(max_concurrent=1, max_per_user=1, max_queued_per_user=5)
+    running = controller.try_enqueue('a')
+    a2, a3 = controller.try_enqueue('a'), controller.try_enqueue('a')
+    b1, b2 = controller.try_enqueue('b'), controller.try_enqueue('b')
+
+    assert controller.position(running) == 0
+    # Hàng đợi: a2, b1, a3, b2
+    assert [controller.position(t) for t in (a2, b1, a3, b2)] == [1, 2, 3, 4]
+
+    controller.release(b1)
+    assert [controller.position(t) for t in (a2, b2, a3)] == [1, 2, 3]
+    controller.release(running)
+    assert controller.position(a2) == 0
+    assert controller.position(b2) == 1
+
+
+def test_wait_times_out_without_free_slot():
+    controller = AdmissionController(max_concurrent=1, max_per_user=1, max_queued_per_user=5)
+    running = controller.try_enqueue('a')
+    waiting = controller.try_enqueue('b')
+
+    started = time.monotonic()
+    assert controller.wait(waiting, timeout=0.1) is False
+    assert time.monotonic() - started >= 0.1
+
+    threading.Timer(0.05, controller.release, args=(running,)).start()
+    assert controller.wait(waiting, timeout=5) is True
+
+
+def test_release_is_idempotent_and_frees_queued_ticket():
+    controller = AdmissionController(max_concurrent=1, max_per_user=1, max_queued_per_user=5)
+    running = controller.try_enqueue('a')
+    waiting = controller.try_enqueue('b')
+
+    controller.release(waiting)
+    controller.release(waiting)
+    assert controller.stats() == {'active': 1, 'queued': 0, 'waiting_users': 0}
+
+    controller.release(running)
+    controller.release(running)
+    assert controller.stats() == {'active': 0, 'queued': 0, 'waiting_users': 0}
+    assert controller.active_per_user == {}
+
+
+# ==================== /api/chat ====================
+
+@pytest.fixture
+def chat_queue(app, user, monkeypatch):
+    """Controller riêng cho route: không có slot nào, hàng đợi 1 request/user, hết giờ chờ ngay"""
+    import routes.chat
+    from test_idempotency_service import make_chat_client
+
+    controller = AdmissionController(max_concurrent=0, max_per_user=1, max_queued_per_user=1)
+    monkeypatch.setattr(routes.chat, 'chat_admission', controller)
+    monkeypatch.setattr(routes.chat, 'CHAT_QUEUE_TIMEOUT', 0)
+    return controller, make_chat_client(app, user.id)
+
+
+def test_chat_releases_ticket_after_stream(chat_queue):
+    from models import Message
+
+    controller, client = chat_queue
+    response = client.post('/api/chat', json={'message': 'Hello'})
+    assert response.status_code == 200
+    assert '"type": "error"' in response.get_data(as_text=True)
+    assert controller.stats() == {'active': 0, 'queued': 0, 'waiting_users': 0}
+    assert Message.query.filter_by(role='assistant', status='pending').count() == 0
+
+
+def test_chat_rejects_request_when_queue_is_full(chat_queue, user):
+    from models import Conversation
+
+    controller, client = chat_queue
+    controller.try_enqueue(user.id)
+    response = client.post('/api/chat', json={'message': 'Hello'})
+    assert response.status_code == 429
+    assert Conversation.query.count() == 0
+    assert controller.stats()['queued'] == 1
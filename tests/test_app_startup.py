@@ -0,0 +1,60 @@
+"""
+Khởi động: import app không kéo module nặng, create_app() không chạm DB và không start thread nền
+(Flask CLI gọi create_app() cho mọi lệnh). Chạy trong process mới để sys.modules sạch.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('openai', 'edge_tts', 'bleach')
+
+STARTUP_PROBE = """
+import json, sys, threading
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+round_trips = []
+event.listen(Engine, 'before_cursor_execute', lambda *args: round_trips.append('execute'))
+event.listen(Pool, 'connect', lambda *args: round_trips.append('connect'))
+
+import app
+after_import = sorted(m for m in %(heavy)r if m in sys.modules)
+threads_before = threading.active_count()
+app.create_app()
+print(json.dumps({
+    'heavy_after_import': after_import,
+    'round_trips': round_trips,
+    'new_threads': threading.active_count() - threads_before,
+}))
+"""
+
+
+@pytest.fixture(scope='module')
+def startup():
+    for module in ('flask', 'flask_sqlalchemy', 'flask_login', 'flask_migrate', 'flask_wtf', 'flask_cors', 'dotenv'):
+        pytest.importorskip(module)
+    result = subprocess.run(
+        [sys.executable, '-c', STARTUP_PROBE % {'heavy': HEAVY_MODULES}],
+        cwd=ROOT, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_app_does_not_load_heavy_modules(startup):
+    assert startup['heavy_after_import'] == []
+
+
+def test_create_app_makes_no_database_round_trips(startup):
+    assert startup['round_trips'] == []
+
+
+def test_create_app_does_not_start_background_threads(startup):
+    assert startup['new_threads'] == 0
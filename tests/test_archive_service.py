@@ -0,0 +1,204 @@
+"""
+Cold archive: archive -> rehydrate -> archive không được archive lại conversation vừa mở,
+message giữ id và vẫn tìm được khi đang archive; dung lượng / thời gian archive-rehydrate
+"""
+
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+
+def make_inactive_conversation(user, days=200, messages=6):
+    from models import db, Conversation, Message
+
+    old = datetime.utcnow() - timedelta(days=days)
+    conv = Conversation(id=str(uuid.uuid4()), user_id=user.id, created_at=old, updated_at=old)
+    db.session.add(conv)
+    for i in range(messages):
+        db.session.add(Message(
+            conversation_id=conv.id, role='user' if i % 2 == 0 else 'assistant',
+            content=f"[Vietsub] Câu số {i} [Engsub] Sentence number {i}", status='completed',
+            created_at=old + timedelta(seconds=i)
+        ))
+    db.session.commit()
+    # onupdate=utcnow không chạy cho INSERT, nhưng đặt lại cho chắc
+    Conversation.query.filter_by(id=conv.id).update({'updated_at': old}, synchronize_session=False)
+    db.session.commit()
+    return conv.id
+
+
+def test_rehydrated_conversation_is_not_archived_again(app, user):
+    from models import Conversation, Message, MessageArchive
+    from services.archive_service import archive_inactive_conversations, rehydrate_conversation
+
+    conv_id = make_inactive_conversation(user)
+
+    assert archive_inactive_conversations(inactive_days=90) == 1
+    assert Message.query.filter_by(conversation_id=conv_id).count() == 0
+    assert MessageArchive.query.filter_by(conversation_id=conv_id).count() >= 1
+
+    conv = Conversation.query.get(conv_id)
+    updated_at = conv.updated_at
+    assert rehydrate_conversation(conv) is True
+    message_ids = [m.id for m in Message.query.filter_by(conversation_id=conv_id).order_by(Message.id)]
+    assert len(message_ids) == 6
+
+    # Lần chạy job tiếp theo: no-op
+    assert archive_inactive_conversations(inactive_days=90) == 0
+    conv = Conversation.query.get(conv_id)
+    assert conv.is_archived is False
+    assert conv.updated_at == updated_at  # Thứ tự sidebar không đổi
+    assert MessageArchive.query.filter_by(conversation_id=conv_id).count() == 0
+    assert [m.id for m in Message.query.filter_by(conversation_id=conv_id).order_by(Message.id)] == message_ids
+
+
+def test_rehydrated_conversation_archives_again_after_inactivity(app, user):
+    from models import db, Conversation
+    from services.archive_service import archive_inactive_conversations, rehydrate_conversation
+
+    conv_id = make_inactive_conversation(user)
+    archive_inactive_conversations(inactive_days=90)
+    rehydrate_conversation(Conversation.query.get(conv_id))
+
+    Conversation.query.filter_by(id=conv_id).update({
+        'rehydrated_at': datetime.utcnow() - timedelta(days=100),
+        'updated_at': Conversation.updated_at
+    }, synchronize_session=False)
+    db.session.commit()
+
+    assert archive_inactive_conversations(inactive_days=90) == 1
+
+
+def search_ids(user_id, query):
+    from services.search_service import search_messages
+    results, _ = search_messages(user_id, query, limit=50)
+    return sorted(r['message_id'] for r in results)
+
+
+def test_archived_messages_stay_searchable_and_keep_ids(app, user):
+    from models import Conversation, Message
+    from services.archive_service import archive_inactive_conversations, rehydrate_conversation
+    from services.search_service import ensure_search_index
+
+    ensure_search_index()
+    conv_id = make_inactive_conversation(user)
+    message_ids = [m.id for m in Message.query.filter_by(conversation_id=conv_id).order_by(Message.id)]
+    assert search_ids(user.id, 'sentence') == message_ids
+
+    assert archive_inactive_conversations(inactive_days=90) == 1
+    assert Message.query.count() == 0
+    assert search_ids(user.id, 'sentence') == message_ids
+
+    rehydrate_conversation(Conversation.query.get(conv_id))
+    assert [m.id for m in Message.query.filter_by(conversation_id=conv_id).order_by(Message.id)] == message_ids
+    assert search_ids(user.id, 'sentence') == message_ids
+
+
+def test_rehydrate_falls_back_to_new_id_when_original_was_reused(app, user):
+    from models import db, Conversation, Message
+    from services.archive_service import archive_inactive_conversations, rehydrate_conversation
+    from services.search_service import ensure_search_index
+
+    ensure_search_index()
+    conv_id = make_inactive_conversation(user, messages=4)
+    archive_inactive_conversations(inactive_days=90)
+
+    # SQLite không AUTOINCREMENT: message mới nhận lại id lớn nhất vừa bị archive
+    active = Conversation(id=str(uuid.uuid4()), user_id=user.id)
+    db.session.add(active)
+    reused = Message(conversation_id=active.id, role='user', content='airport', status='completed')
+    db.session.add(reused)
+    db.session.commit()
+
+    assert reused.id == 1
+    rehydrate_conversation(Conversation.query.get(conv_id))
+    contents = [m.content for m in Message.query.filter_by(conversation_id=conv_id).order_by(Message.id)]
+    assert contents == [f"[Vietsub] Câu số {i} [Engsub] Sentence number {i}" for i in range(4)]
+    assert db.session.get(Message, reused.id).content == 'airport'
+    # Không còn row FTS mồ côi theo id gốc
+    assert search_ids(user.id, 'sentence') == [m.id for m in Message.query.filter_by(conversation_id=conv_id).order_by(Message.id)]
+    assert search_ids(user.id, 'airport') == [reused.id]
+
+
+def test_version_1_block_rehydrates_with_new_ids(app, user):
+    import json
+    import zlib
+    from models import db, Conversation, Message, MessageArchive
+    from services.archive_service import rehydrate_conversation
+
+    conv = Conversation(id=str(uuid.uuid4()), user_id=user.id, is_archived=True)
+    db.session.add(conv)
+    fields = ('role', 'content', 'segments', 'status', 'prompt_tokens', 'completion_tokens', 'total_tokens', 'created_at')
+    raw = json.dumps({'v': 1, 'fields': fields, 'rows': [
+        ['user', 'Hello', None, 'completed', 0, 0, 0, '2026-01-01T00:00:00'],
+        ['assistant', 'Xin chào', None, 'completed', 3, 4, 7, '2026-01-01T00:00:01'],
+    ]}).encode()
+    db.session.add(MessageArchive(conversation_id=conv.id, message_count=2, raw_size=len(raw), data=zlib.compress(raw)))
+    db.session.commit()
+
+    assert rehydrate_conversation(conv) is True
+    assert [m.content for m in Message.query.filter_by(conversation_id=conv.id).order_by(Message.id)] == ['Hello', 'Xin chào']
+
+
+def test_purge_removes_search_rows_of_archived_conversation(app, user):
+    from sqlalchemy import text
+    from models import db, Conversation
+    from services.archive_service import archive_inactive_conversations
+    from services.maintenance_service import purge_deleted_conversations
+    from services.search_service import ensure_search_index
+
+    ensure_search_index()
+    conv_id = make_inactive_conversation(user)
+    kept_id = make_inactive_conversation(user, messages=2)
+    archive_inactive_conversations(inactive_days=90)
+    Conversation.query.filter_by(id=conv_id).update({
+        'is_deleted': True, 'deleted_at': datetime.utcnow() - timedelta(days=1)
+    }, synchronize_session=False)
+    db.session.commit()
+
+    assert purge_deleted_conversations(grace_seconds=0) == 1
+    rows = db.session.execute(text("SELECT conversation_id FROM message_search")).scalars().all()
+    assert rows == [kept_id, kept_id]
+
+
+# Dung lượng / thời gian (ngưỡng rộng để không flaky; số đo thực tế ghi trong commit)
+ARCHIVE_MIN_COMPRESSION_RATIO = 3
+ARCHIVE_MAX_SECONDS = 2.0
+
+
+def test_archive_space_and_latency(app, user):
+    from models import db, Conversation, Message, MessageArchive
+    from services.archive_service import archive_inactive_conversations, rehydrate_conversation
+    from services.search_service import ensure_search_index
+
+    ensure_search_index()
+    rng = random.Random(38)
+    words = ("I have been living here for three years . Tôi đã sống ở đây ba năm rồi . "
+             "present perfect continuous thì hiện tại hoàn thành tiếp diễn airport hotel check-in").split()
+    conv_id = make_inactive_conversation(user, messages=0)
+    old = datetime.utcnow() - timedelta(days=200)
+    db.session.add_all([Message(
+        conversation_id=conv_id, role='user' if i % 2 == 0 else 'assistant', status='completed',
+        content=' '.join(rng.choice(words) for _ in range(rng.randint(20, 200))), created_at=old
+    ) for i in range(2000)])
+    db.session.commit()
+    message_ids = [m.id for m in Message.query.order_by(Message.id)]
+
+    started = time.perf_counter()
+    assert archive_inactive_conversations(inactive_days=90) == 1
+    archive_seconds = time.perf_counter() - started
+
+    blocks = MessageArchive.query.filter_by(conversation_id=conv_id).all()
+    raw_size = sum(block.raw_size for block in blocks)
+    stored_size = sum(len(block.data) for block in blocks)
+    assert sum(block.message_count for block in blocks) == 2000
+    assert raw_size / stored_size >= ARCHIVE_MIN_COMPRESSION_RATIO
+
+    started = time.perf_counter()
+    assert rehydrate_conversation(Conversation.query.get(conv_id)) is True
+    rehydrate_seconds = time.perf_counter() - started
+
+    assert [m.id for m in Message.query.order_by(Message.id)] == message_ids
+    assert archive_seconds < ARCHIVE_MAX_SECONDS
+    assert rehydrate_seconds < ARCHIVE_MAX_SECONDS
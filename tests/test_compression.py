@@ -0,0 +1,75 @@
+"""
+Response compression: JSON/HTML lớn được nén, response nhỏ / stream / client không nhận nén giữ nguyên
+"""
+
+import gzip
+import json
+
+import pytest
+
+
+@pytest.fixture
+def client():
+    pytest.importorskip('flask')
+    pytest.importorskip('dotenv')
+    from flask import Flask, Response, jsonify
+    from config import RESPONSE_COMPRESS_MIN_SIZE
+    from utils.compression import compress_response
+
+    app = Flask(__name__)
+    app.after_request(compress_response)
+    large_items = [{'id': i, 'word': 'vocabulary', 'meaning': 'từ vựng'} for i in range(200)]
+
+    @app.route('/large.json')
+    def large_json():
+        return jsonify(items=large_items)
+
+    @app.route('/large.html')
+    def large_html():
+        return '<ul>' + '<li>Hôm nay học thì hiện tại hoàn thành</li>' * 100 + '</ul>'
+
+    @app.route('/small.json')
+    def small_json():
+        return jsonify(ok=True)
+
+    @app.route('/stream')
+    def stream():
+        return Response(('x' * RESPONSE_COMPRESS_MIN_SIZE for _ in range(3)), mimetype='text/plain')
+
+    return app.test_client()
+
+
+@pytest.mark.parametrize('path', ['/large.json', '/large.html'])
+def test_large_response_is_gzipped(client, path):
+    plain = client.get(path)
+    compressed = client.get(path, headers={'Accept-Encoding': 'gzip'})
+
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert len(compressed.data) < len(plain.data)
+    assert int(compressed.headers['Content-Length']) == len(compressed.data)
+    assert gzip.decompress(compressed.data) == plain.data
+
+
+def test_large_response_without_accept_encoding_is_unchanged(client):
+    response = client.get('/large.json')
+    assert 'Content-Encoding' not in response.headers
+    assert len(json.loads(response.data)['items']) == 200
+
+
+def test_below_threshold_response_is_unchanged(client):
+    from config import RESPONSE_COMPRESS_MIN_SIZE
+
+    plain = client.get('/small.json')
+    response = client.get('/small.json', headers={'Accept-Encoding': 'gzip'})
+    assert len(response.data) < RESPONSE_COMPRESS_MIN_SIZE
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == plain.data
+
+
+def test_streamed_response_is_not_compressed(client):
+    from config import RESPONSE_COMPRESS_MIN_SIZE
+
+    response = client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == b'x' * (3 * RESPONSE_COMPRESS_MIN_SIZE)
@@ -0,0 +1,130 @@
+"""
+GET /api/conversations: keyset pagination và ETag/304 (kể cả 2 lần sửa trong cùng 1 giây như DATETIME của MySQL)
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def client(app, user):
+    from flask_login import LoginManager
+    from models import db, User
+    from routes.conversation import conversation_bp
+
+    app.secret_key = 'test'
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda uid: db.session.get(User, int(uid)))
+    app.register_blueprint(conversation_bp)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user.id)
+        sess['_fresh'] = True
+    return client
+
+
+def add_conversations(user_id, count, updated_at=datetime(2026, 3, 1, 8, 0)):
+    """count conversation, 2 cái liền nhau cùng updated_at để thử tie-break theo id"""
+    from models import db, Conversation
+
+    ids = []
+    for i in range(count):
+        conv = Conversation(id=str(uuid.uuid4()), user_id=user_id, title=f'Chat {i}',
+                            updated_at=updated_at - timedelta(minutes=i // 2))
+        db.session.add(conv)
+        ids.append(conv.id)
+    db.session.commit()
+    return ids
+
+
+def truncate_updated_at(conv_id, stamp):
+    """Giả lập DATETIME của MySQL: ghi đè updated_at bằng giá trị đã cắt tới giây, giữ nguyên revision"""
+    from models import db, Conversation
+
+    table = Conversation.__table__
+    db.session.execute(table.update().where(table.c.id == conv_id).values(
+        updated_at=stamp, revision=table.c.revision
+    ))
+    db.session.commit()
+
+
+def test_pagination_walks_every_conversation_once(client, user):
+    from models import db, Conversation
+
+    add_conversations(user.id, 7)
+    expected = [row.id for row in db.session.query(Conversation.id).order_by(
+        Conversation.updated_at.desc(), Conversation.id.desc()
+    )]
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        response = client.get('/api/conversations', query_string={'limit': 3, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        body = response.get_json()
+        seen += [conv['id'] for conv in body['conversations']]
+        pages += 1
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+
+    assert seen == expected
+    assert pages == 3
+
+
+def test_pagination_hides_deleted_and_rejects_bad_cursor(client, user):
+    from models import db, Conversation
+
+    ids = add_conversations(user.id, 3)
+    db.session.get(Conversation, ids[0]).is_deleted = True
+    db.session.commit()
+
+    body = client.get('/api/conversations').get_json()
+    assert {conv['id'] for conv in body['conversations']} == set(ids[1:])
+    assert body['next_cursor'] is None
+    assert client.get('/api/conversations', query_string={'cursor': '!!'}).status_code == 400
+
+
+def test_unchanged_list_returns_304(client, user):
+    add_conversations(user.id, 2)
+    first = client.get('/api/conversations')
+    etag = first.headers['ETag']
+
+    again = client.get('/api/conversations', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag
+    # ETag gắn với từng trang
+    assert client.get('/api/conversations', query_string={'limit': 1},
+                      headers={'If-None-Match': etag}).status_code == 200
+
+
+@pytest.mark.parametrize('change', ['rename', 'delete'])
+def test_change_within_same_second_invalidates_etag(client, user, change):
+    from models import db, Conversation
+
+    stamp = datetime(2026, 3, 1, 8, 0)
+    conv_id = add_conversations(user.id, 1, updated_at=stamp)[0]
+    etag = client.get('/api/conversations').headers['ETag']
+
+    if change == 'rename':
+        assert client.put(f'/api/conversations/{conv_id}/rename', json={'title': 'Renamed'}).status_code == 200
+    else:
+        assert client.delete(f'/api/conversations/{conv_id}').status_code == 200
+    truncate_updated_at(conv_id, stamp)
+    assert db.session.get(Conversation, conv_id).updated_at == stamp
+
+    response = client.get('/api/conversations', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_bulk_update_bumps_revision(app, user):
+    from sqlalchemy import update
+    from models import db, Conversation
+
+    conv_id = add_conversations(user.id, 1)[0]
+    db.session.execute(update(Conversation), [{'id': conv_id, 'title': 'Bulk'}])
+    Conversation.query.filter_by(id=conv_id).update({'title': 'Query'})
+    db.session.commit()
+    assert db.session.get(Conversation, conv_id).revision == 2
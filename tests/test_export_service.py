@@ -0,0 +1,147 @@
+"""
+Export/import NDJSON: round-trip giữ nguyên nội dung, timestamp có/không timezone, import lỗi không để lại dữ liệu dở
+"""
+
+import io
+import json
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+
+def add_conversation(user_id, messages, title='Luyện thì hiện tại hoàn thành', is_archived=False, day=1):
+    from models import db, Conversation, Message
+
+    created = datetime(2026, 3, day, 8, 30, 15, 123456)
+    conv = Conversation(id=str(uuid.uuid4()), user_id=user_id, title=title, total_tokens=42,
+                        created_at=created, updated_at=created + timedelta(hours=1))
+    db.session.add(conv)
+    for i, (role, content, status) in enumerate(messages):
+        db.session.add(Message(conversation_id=conv.id, role=role, content=content, status=status,
+                               prompt_tokens=i, completion_tokens=2 * i, total_tokens=3 * i,
+                               created_at=created + timedelta(minutes=i)))
+    db.session.commit()
+    if is_archived:
+        from services.archive_service import archive_conversation
+        conv.updated_at = created
+        db.session.commit()
+        assert archive_conversation(conv.id, datetime.utcnow())
+        db.session.commit()
+    return conv.id
+
+
+def export_bytes(user_id, batch_size=2):
+    from services.export_service import iter_export
+    return ''.join(iter_export(user_id, batch_size=batch_size)).encode('utf-8')
+
+
+def run_import(user_id, data, **kwargs):
+    from services.export_service import import_ndjson
+    return import_ndjson(user_id, io.BufferedReader(io.BytesIO(data)), **kwargs)
+
+
+def ndjson(*records):
+    return ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records).encode('utf-8')
+
+
+def snapshot(user_id):
+    """Nội dung export của user, bỏ id (import luôn tạo id mới)"""
+    lines = [json.loads(line) for line in export_bytes(user_id).decode('utf-8').splitlines()]
+    for line in lines:
+        line.pop('id', None)
+        line.pop('conversation_id', None)
+    return lines
+
+
+@pytest.fixture
+def other_user(app):
+    from models import db, User
+
+    other = User(username='other', email='other@example.com', password_hash='x', total_tokens_used=0)
+    db.session.add(other)
+    db.session.commit()
+    return other
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_export_import_round_trip(app, user, other_user, compress):
+    from models import Conversation
+    from services.export_service import gzip_chunks, iter_export
+
+    add_conversation(user.id, [
+        ('user', 'I have lived here for 3 years', 'completed'),
+        ('assistant', '[Vietsub] Tôi đã sống ở đây 3 năm [Engsub] Great!', 'completed'),
+        ('user', 'draft', 'pending'),
+        ('assistant', 'stopped halfway', 'cancelled'),
+    ])
+    add_conversation(user.id, [('user', 'Old chat', 'completed')], title='Archived', is_archived=True, day=2)
+    add_conversation(user.id, [], title='Empty', day=3)
+
+    if compress:
+        data = b''.join(gzip_chunks(iter_export(user.id, batch_size=2)))
+        assert data[:2] == b'\x1f\x8b'
+    else:
+        data = export_bytes(user.id)
+
+    stats = run_import(other_user.id, data, batch_size=3)
+    assert stats == {'conversations': 3, 'messages': 4, 'skipped': 0}
+    assert snapshot(other_user.id) == snapshot(user.id)
+
+    imported = Conversation.query.filter_by(user_id=other_user.id).all()
+    counters = {c.title: (c.message_count, c.completed_count, c.last_message_preview) for c in imported}
+    assert counters['Archived'] == (1, 1, 'Old chat')
+    assert counters['Empty'] == (0, 0, None)
+    assert counters['Luyện thì hiện tại hoàn thành'][:2] == (3, 2)
+
+
+def test_import_accepts_mixed_timezone_timestamps(app, user):
+    from models import Conversation, Message
+
+    data = ndjson(
+        {'type': 'conversation', 'id': 'c1', 'title': 'Mixed', 'created_at': '2026-03-01T08:00:00+07:00'},
+        {'type': 'message', 'conversation_id': 'c1', 'role': 'user', 'content': 'naive', 'created_at': '2026-03-01T02:00:00'},
+        {'type': 'message', 'conversation_id': 'c1', 'role': 'assistant', 'content': 'aware', 'created_at': '2026-03-01T10:00:00+07:00'},
+        {'type': 'message', 'conversation_id': 'c1', 'role': 'user', 'content': 'zulu', 'created_at': '2026-03-01T01:00:00Z'},
+        {'type': 'message', 'conversation_id': 'c1', 'role': 'user', 'content': 'broken', 'created_at': 'yesterday'},
+    )
+    assert run_import(user.id, data)['messages'] == 4
+
+    conv = Conversation.query.filter_by(user_id=user.id).one()
+    assert conv.created_at == datetime(2026, 3, 1, 1, 0)
+    created = {m.content: m.created_at for m in Message.query.filter_by(conversation_id=conv.id)}
+    assert created['naive'] == datetime(2026, 3, 1, 2, 0)
+    assert created['aware'] == datetime(2026, 3, 1, 3, 0)
+    assert created['zulu'] == datetime(2026, 3, 1, 1, 0)
+    assert all(value.tzinfo is None for value in created.values())
+    # 'broken' nhận thời điểm import - mới nhất
+    assert conv.last_message_preview == 'broken'
+
+
+def test_failed_import_leaves_nothing_behind(app, user, monkeypatch):
+    import services.export_service
+    from models import Conversation, Message
+
+    monkeypatch.setattr(services.export_service, 'IMPORT_MAX_MESSAGES', 3)
+    data = ndjson(
+        {'type': 'conversation', 'id': 'c1', 'title': 'First'},
+        *[{'type': 'message', 'conversation_id': 'c1', 'role': 'user', 'content': f'm{i}'} for i in range(5)],
+    )
+    with pytest.raises(ValueError):
+        run_import(user.id, data, batch_size=2)
+    assert Conversation.query.count() == 0
+    assert Message.query.count() == 0
+
+
+def test_message_outside_its_conversation_block_is_skipped(app, user):
+    from models import Message
+
+    data = ndjson(
+        {'type': 'conversation', 'id': 'c1', 'title': 'First'},
+        {'type': 'message', 'conversation_id': 'c1', 'role': 'user', 'content': 'in order'},
+        {'type': 'conversation', 'id': 'c2', 'title': 'Second'},
+        {'type': 'message', 'conversation_id': 'c1', 'role': 'user', 'content': 'late'},
+        {'type': 'message', 'conversation_id': 'missing', 'role': 'user', 'content': 'orphan'},
+    )
+    assert run_import(user.id, data, batch_size=1) == {'conversations': 2, 'messages': 1, 'skipped': 2}
+    assert [m.content for m in Message.query] == ['in order']
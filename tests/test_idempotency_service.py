@@ -0,0 +1,224 @@
+"""
+Idempotency-Key của /api/chat: dùng chung giữa các worker, phát lại thay vì sinh lại, 422 khi khác body
+"""
+
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import make_test_app, require_app_deps
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    """2 app cùng 1 file SQLite = 2 worker gunicorn dùng chung DB"""
+    require_app_deps()
+    from models import db, User
+
+    uri = f"sqlite:///{tmp_path / 'chat.db'}"
+    first, second = make_test_app(uri), make_test_app(uri)
+    with first.app_context():
+        db.create_all()
+        user = User(username='learner', email='learner@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        db.session.remove()
+    yield first, second, user_id
+    with first.app_context():
+        db.drop_all()
+
+
+def test_key_is_shared_across_workers(file_app):
+    from models import db
+    from services.idempotency_service import chat_idempotency
+
+    first, second, user_id = file_app
+    request_hash = chat_idempotency.request_hash('Hello', None, None)
+    with first.app_context():
+        record, created = chat_idempotency.reserve(user_id, 'key-1', request_hash)
+        record_id = record.id
+        assert created
+        db.session.remove()
+    with second.app_context():
+        record, created = chat_idempotency.reserve(user_id, 'key-1', request_hash)
+        assert not created and record.id == record_id
+        db.session.remove()
+
+
+def test_same_key_with_different_body_conflicts(app, user):
+    from services.idempotency_service import chat_idempotency, IdempotencyConflict
+
+    chat_idempotency.reserve(user.id, 'key-1', chat_idempotency.request_hash('Hello', None, None))
+    with pytest.raises(IdempotencyConflict):
+        chat_idempotency.reserve(user.id, 'key-1', chat_idempotency.request_hash('Goodbye', None, None))
+    # Key là theo user
+    _, created = chat_idempotency.reserve(user.id + 1, 'key-1', chat_idempotency.request_hash('Goodbye', None, None))
+    assert created
+
+
+def test_expired_key_is_reserved_again(app, user):
+    from models import db, ChatRequest
+    from services.idempotency_service import chat_idempotency, purge_expired_chat_requests
+
+    request_hash = chat_idempotency.request_hash('Hello', None, None)
+    record, _ = chat_idempotency.reserve(user.id, 'key-1', request_hash)
+    ChatRequest.query.filter_by(id=record.id).update({'expires_at': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+
+    record, created = chat_idempotency.reserve(user.id, 'key-1', request_hash)
+    assert created and record.expires_at > datetime.utcnow()
+    assert ChatRequest.query.count() == 1
+
+    ChatRequest.query.update({'expires_at': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+    assert purge_expired_chat_requests() == 1
+    assert ChatRequest.query.count() == 0
+
+
+def test_wait_bound_sees_bind_and_release_from_other_worker(file_app):
+    from models import db
+    from services.idempotency_service import chat_idempotency, IdempotencyInProgress
+
+    first, second, user_id = file_app
+    request_hash = chat_idempotency.request_hash('Hello', None, None)
+    with first.app_context():
+        record, _ = chat_idempotency.reserve(user_id, 'key-1', request_hash)
+        record_id = record.id
+        with pytest.raises(IdempotencyInProgress):
+            chat_idempotency.wait_bound(record_id, timeout=0.2)
+        db.session.remove()
+
+    def bind_later():
+        time.sleep(0.2)
+        with second.app_context():
+            record, _ = chat_idempotency.reserve(user_id, 'key-1', request_hash)
+            chat_idempotency.bind(record, 'conv', 1, 2)
+            db.session.remove()
+
+    thread = threading.Thread(target=bind_later)
+    thread.start()
+    with first.app_context():
+        row = chat_idempotency.wait_bound(record_id, timeout=5)
+        thread.join()
+        assert (row.conversation_id, row.user_message_id, row.assistant_message_id) == ('conv', 1, 2)
+
+        chat_idempotency.release(row)
+        assert chat_idempotency.wait_bound(record_id, timeout=0) is None
+        db.session.remove()
+
+
+# ==================== /api/chat ====================
+
+def make_chat_client(app, user_id):
+    from flask_login import LoginManager
+    from models import db, User
+    from routes.chat import chat_bp
+
+    app.secret_key = 'test'
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda uid: db.session.get(User, int(uid)))
+    app.register_blueprint(chat_bp)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    return client
+
+
+def add_exchange(user_id, status, content='Xin chào!'):
+    """Conversation + user message + assistant message như lần submit đầu đã tạo"""
+    from models import db, Conversation, Message
+
+    conv = Conversation(id=str(uuid.uuid4()), user_id=user_id)
+    db.session.add(conv)
+    user_msg = Message(conversation_id=conv.id, role='user', content='Hello', status='completed')
+    assistant_msg = Message(conversation_id=conv.id, role='assistant', content=content, status=status,
+                            prompt_tokens=10, completion_tokens=5, total_tokens=15)
+    db.session.add_all([user_msg, assistant_msg])
+    db.session.commit()
+    return conv.id, user_msg.id, assistant_msg.id
+
+
+def sse_events(response):
+    return [json.loads(line[6:]) for line in response.get_data(as_text=True).splitlines() if line.startswith('data: ')]
+
+
+@pytest.fixture
+def no_generation(monkeypatch):
+    import routes.chat
+
+    def fail():
+        raise AssertionError("duplicate request must not call the API again")
+    monkeypatch.setattr(routes.chat, 'get_client', fail)
+
+
+def test_duplicate_request_replays_completed_reply(app, user, no_generation):
+    from models import Message
+    from services.idempotency_service import chat_idempotency
+
+    conv_id, user_msg_id, assistant_msg_id = add_exchange(user.id, 'completed')
+    record, _ = chat_idempotency.reserve(user.id, 'key-1', chat_idempotency.request_hash('Hello', None, None))
+    chat_idempotency.bind(record, conv_id, user_msg_id, assistant_msg_id)
+    client = make_chat_client(app, user.id)
+
+    response = client.post('/api/chat', json={'message': 'Hello'}, headers={'Idempotency-Key': 'key-1'})
+    events = sse_events(response)
+    assert [e['type'] for e in events] == ['init', 'chunk', 'done']
+    assert events[1]['content'] == 'Xin chào!'
+    assert events[2]['assistant_message_id'] == assistant_msg_id
+    assert events[2]['tokens']['total_tokens'] == 15
+    assert Message.query.count() == 2
+
+    response = client.post('/api/chat', json={'message': 'Other'}, headers={'Idempotency-Key': 'key-1'})
+    assert response.status_code == 422
+    assert Message.query.count() == 2
+
+
+def test_duplicate_request_follows_generation_in_other_worker(file_app, no_generation, monkeypatch):
+    import routes.chat
+    from models import db, Message
+    from services.idempotency_service import chat_idempotency
+
+    first, second, user_id = file_app
+    monkeypatch.setattr(routes.chat, 'SAVED_MESSAGE_POLL_INTERVAL', 0.05)
+    with second.app_context():
+        conv_id, user_msg_id, assistant_msg_id = add_exchange(user_id, 'pending', content='Xin')
+        record, _ = chat_idempotency.reserve(user_id, 'key-1', chat_idempotency.request_hash('Hello', None, None))
+        chat_idempotency.bind(record, conv_id, user_msg_id, assistant_msg_id)
+        db.session.remove()
+
+    def finish_in_other_worker():
+        time.sleep(0.3)
+        with second.app_context():
+            Message.query.filter_by(id=assistant_msg_id).update({'content': 'Xin chào!', 'status': 'completed'})
+            db.session.commit()
+            db.session.remove()
+
+    thread = threading.Thread(target=finish_in_other_worker)
+    thread.start()
+    with first.app_context():
+        client = make_chat_client(first, user_id)
+        response = client.post('/api/chat', json={'message': 'Hello'}, headers={'Idempotency-Key': 'key-1'})
+        events = sse_events(response)
+        thread.join()
+        assert ''.join(e['content'] for e in events if e['type'] == 'chunk') == 'Xin chào!'
+        assert events[-1]['type'] == 'done' and events[-1]['assistant_message_id'] == assistant_msg_id
+        assert Message.query.count() == 2
+        db.session.remove()
+
+
+def test_in_flight_duplicate_gets_409(app, user, no_generation, monkeypatch):
+    import routes.chat
+    from services.idempotency_service import chat_idempotency
+
+    monkeypatch.setattr(routes.chat, 'IDEMPOTENCY_WAIT_SECONDS', 0.2)
+    chat_idempotency.reserve(user.id, 'key-1', chat_idempotency.request_hash('Hello', None, None))
+    client = make_chat_client(app, user.id)
+
+    response = client.post('/api/chat', json={'message': 'Hello'}, headers={'Idempotency-Key': 'key-1'})
+    assert response.status_code == 409
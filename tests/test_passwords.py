@@ -0,0 +1,50 @@
+"""
+Password hasher: process con bị kill không làm hỏng hash/verify vĩnh viễn
+"""
+
+import os
+import signal
+
+import pytest
+
+
+def test_hasher_recovers_from_killed_worker():
+    for module in ('werkzeug', 'dotenv', 'flask', 'bleach'):
+        pytest.importorskip(module)
+    from utils.passwords import PasswordHasher
+
+    hasher = PasswordHasher(workers=1, timeout=30)
+    try:
+        worker_pid = hasher.run(os.getpid)
+        assert worker_pid != os.getpid()
+        os.kill(worker_pid, signal.SIGKILL)
+
+        assert hasher.run(pow, 2, 10) == 1024
+        # Pool mới vẫn chạy ngoài process hiện tại
+        assert hasher.run(os.getpid) != os.getpid()
+    finally:
+        hasher.shutdown()
+
+
+def test_pool_does_not_fork_threaded_worker():
+    for module in ('werkzeug', 'dotenv', 'flask', 'bleach'):
+        pytest.importorskip(module)
+    import threading
+    from utils.passwords import PasswordHasher, hash_password, verify_password
+
+    hasher = PasswordHasher(workers=2, timeout=30)
+    assert hasher.context.get_start_method() in ('forkserver', 'spawn')
+
+    # Giống worker gthread: thread khác đang giữ lock khi pool được tạo
+    lock = threading.Lock()
+    lock.acquire()
+    holder = threading.Thread(target=lock.acquire)
+    holder.start()
+    try:
+        hasher.start()
+        assert hasher.run(os.getpid) != os.getpid()
+        assert verify_password(hash_password('secret'), 'secret')
+    finally:
+        lock.release()
+        holder.join()
+        hasher.shutdown()
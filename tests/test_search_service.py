@@ -0,0 +1,94 @@
+"""
+Search: kết quả FTS5 phải giống quét LIKE trên message 'completed' của user (đúng phạm vi, đúng trạng thái)
+"""
+
+import uuid
+from datetime import datetime
+
+
+def add_conversation(user_id, contents, is_deleted=False, status='completed'):
+    from models import db, Conversation, Message
+
+    conv = Conversation(id=str(uuid.uuid4()), user_id=user_id, is_deleted=is_deleted)
+    db.session.add(conv)
+    for content in contents:
+        db.session.add(Message(conversation_id=conv.id, role='assistant', content=content, status=status))
+    db.session.commit()
+    return conv.id
+
+
+def like_scan(user_id, word):
+    from models import Conversation, Message
+
+    return {
+        m.id for m in Message.query.join(Conversation).filter(
+            Conversation.user_id == user_id, Conversation.is_deleted.is_(False),
+            Message.status == 'completed', Message.content.like(f'%{word}%')
+        )
+    }
+
+
+def test_fts_results_match_like_scan(app, user):
+    from models import db, User
+    from services.search_service import ensure_search_index, search_messages
+
+    other = User(username='other', email='other@example.com', password_hash='x')
+    db.session.add(other)
+    db.session.commit()
+    ensure_search_index()
+
+    add_conversation(user.id, ["Let's practice the airport dialogue", "Ở sân bay bạn cần hộ chiếu", "Hotel check-in"])
+    add_conversation(user.id, ["Airport security questions"])
+    add_conversation(user.id, ["airport draft"], status='pending')
+    add_conversation(user.id, ["Deleted airport chat"], is_deleted=True)
+    add_conversation(other.id, ["Someone else's airport chat"])
+
+    results, has_more = search_messages(user.id, 'airport', limit=20)
+    assert {r['message_id'] for r in results} == like_scan(user.id, 'irport')
+    assert len(results) == 2 and not has_more
+
+    # Prefix của từ cuối + bỏ dấu
+    results, _ = search_messages(user.id, 'san ba')
+    assert {r['message_id'] for r in results} == like_scan(user.id, 'sân bay')
+
+
+def test_index_is_scoped_by_owner_token(app, user):
+    from sqlalchemy import text
+    from models import db, User
+    from services.search_service import ensure_search_index, search_messages, build_match_query
+
+    other = User(username='other', email='other@example.com', password_hash='x')
+    db.session.add(other)
+    db.session.commit()
+    ensure_search_index()
+
+    mine = add_conversation(user.id, [f"token u{other.id} in my text", "airport"])
+    add_conversation(other.id, ["airport", "airport again"])
+
+    # FTS chỉ trả về row của user, kể cả khi nội dung chứa chuỗi giống token owner
+    rowids = db.session.execute(
+        text("SELECT rowid FROM message_search WHERE message_search MATCH :match"),
+        {'match': build_match_query(['airport'], user.id)}
+    ).scalars().all()
+    assert len(rowids) == 1
+    results, _ = search_messages(user.id, f'u{other.id}')
+    assert [r['conversation_id'] for r in results] == [mine]
+    assert search_messages(other.id, f'u{other.id}') == ([], False)
+
+
+def test_ensure_search_index_rebuilds_unscoped_table(app, user):
+    from sqlalchemy import text
+    from models import db
+    from services.search_service import ensure_search_index, search_messages
+
+    # Bảng FTS trước migration 016: chỉ có cột content
+    db.session.execute(text(
+        "CREATE VIRTUAL TABLE message_search USING fts5(content, tokenize = 'unicode61 remove_diacritics 2')"
+    ))
+    db.session.commit()
+    conv_id = add_conversation(user.id, ["Airport security questions"])
+
+    ensure_search_index()
+    results, _ = search_messages(user.id, 'airport')
+    assert [(r['conversation_id'], r['role']) for r in results] == [(conv_id, 'assistant')]
+    assert results[0]['created_at'].startswith(str(datetime.utcnow().year))
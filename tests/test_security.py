@@ -0,0 +1,65 @@
+"""
+sanitize_html_batch: 1 lần gọi bleach cho cả batch, kết quả giống sanitize_html từng chuỗi
+"""
+
+import random
+
+import pytest
+
+
+@pytest.fixture
+def bleach_calls(monkeypatch):
+    bleach = pytest.importorskip('bleach')
+    calls = []
+    clean = bleach.clean
+
+    def counting_clean(text, *args, **kwargs):
+        calls.append(text)
+        return clean(text, *args, **kwargs)
+
+    monkeypatch.setattr(bleach, 'clean', counting_clean)
+    return calls
+
+
+def per_string(texts):
+    from utils.security import sanitize_html
+    return [sanitize_html(text) for text in texts]
+
+
+def test_batch_uses_single_bleach_call(bleach_calls):
+    from utils.security import sanitize_html_batch
+
+    texts = ["plain word", "<b>bold</b>", "", "fish & chips", "x < y", "từ vựng", None, "<i>nghiêng</i>\r\n"]
+    expected = per_string(texts)
+    bleach_calls.clear()
+
+    assert sanitize_html_batch(texts) == expected
+    assert len(bleach_calls) == 1
+
+
+def test_batch_without_markup_skips_bleach(bleach_calls):
+    from utils.security import sanitize_html_batch
+
+    assert sanitize_html_batch(["hello", "xin chào", ""]) == ["hello", "xin chào", ""]
+    assert bleach_calls == []
+
+
+@pytest.mark.parametrize('texts', [
+    ["<!-- open comment", "<b>x</b>", "tail & co"],
+    ["<b", "c>", "<i>d</i>"],
+    ["<script>x", "<b>hi</b>"],
+])
+def test_markup_spanning_separator_falls_back_per_string(bleach_calls, texts):
+    from utils.security import sanitize_html_batch
+    assert sanitize_html_batch(texts) == per_string(texts)
+
+
+def test_random_batch_matches_per_string(bleach_calls):
+    from utils.security import sanitize_html_batch
+
+    rng = random.Random(40)
+    alphabet = "ab cdđ ạ<>&/\"'=!-\r\n\t"
+    tokens = ["<b>", "</b>", "<a href='x'>", "&amp;", "&#x41;", "<br/>", "<!--", "-->"]
+    texts = [''.join(rng.choice(alphabet + ''.join(tokens)) if rng.random() < 0.9 else rng.choice(tokens)
+                     for _ in range(rng.randint(0, 40))) for _ in range(200)]
+    assert sanitize_html_batch(texts) == per_string(texts)
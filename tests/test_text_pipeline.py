@@ -0,0 +1,68 @@
+"""
+Text pipeline: kết quả phải giống hệt bản regex/generator cũ (TTS cache key, nội dung lưu DB không đổi)
+"""
+
+import random
+import re
+
+import pytest
+
+
+SAMPLES = [
+    "",
+    "Xin chào! Hôm nay chúng ta luyện **thì hiện tại hoàn thành** nhé.",
+    "A - \"I have lived here\" / Tôi đã sống ở đây... `code` ~x~ #tag _it_",
+    "B-   Option without spaces",
+    "a - lowercase prefix stays",
+    "Tab\tline\r\nnew\x00null\x07bell\x1fsep\x7fdel\x85nel",
+    "<b>bold</b> & <script>alert(1)</script> 5 > 3",
+    "  nhiều    khoảng   trắng  \n\n ",
+]
+
+
+def random_texts(count=100, seed=46):
+    alphabet = "aăâbcdđeêghiklmnoôơpqrstuưvxyAZ ạảãàáẠ*#_`~\"/.-<>&\r\n\t\x00\x07\x1f\x7f\x85"
+    rng = random.Random(seed)
+    return [''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 80))) for _ in range(count)]
+
+
+# Bản cũ (trước text_pipeline) - tham chiếu
+def old_sanitize_control_chars(text):
+    text = text.replace('\x00', '')
+    return ''.join(char for char in text if ord(char) >= 32 or char in '\n\r\t')
+
+
+def old_clean_text_for_tts(text):
+    if not text:
+        return ""
+    text = re.sub(r'[*#_`~]', '', text)
+    text = re.sub(r'^[A-Z]\s*-\s*', '', text)
+    text = text.replace('"', '')
+    text = text.replace('/', ' ')
+    text = text.replace('...', ' ')
+    text = ' '.join(text.split())
+    return text.strip()
+
+
+@pytest.mark.parametrize('text', SAMPLES + random_texts())
+def test_strip_control_chars_matches_old(text):
+    from utils.text_pipeline import strip_control_chars
+    assert strip_control_chars(text) == old_sanitize_control_chars(text)
+
+
+@pytest.mark.parametrize('text', SAMPLES + random_texts())
+def test_clean_text_for_tts_matches_old(text):
+    pytest.importorskip('bleach')
+    from utils.helpers import clean_text_for_tts
+    assert clean_text_for_tts(text) == old_clean_text_for_tts(text)
+
+
+@pytest.mark.parametrize('text', SAMPLES + random_texts())
+def test_sanitize_html_fast_path_matches_bleach(text):
+    bleach = pytest.importorskip('bleach')
+    from utils.security import sanitize_html, sanitize_html_batch
+
+    text = old_sanitize_control_chars(text)  # Input luôn đã qua sanitize_input
+    expected = bleach.clean(text, tags=[], strip=True) if text else ""
+    assert sanitize_html(text) == expected
+    assert sanitize_html_batch([text, "plain", text]) == [expected, "plain", expected]
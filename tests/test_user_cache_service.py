@@ -0,0 +1,151 @@
+"""
+User cache: cộng token trên instance lấy từ cache (giá trị cũ) không được làm mất usage,
+thay đổi ở worker khác (khóa tài khoản, lockout, token) có hiệu lực ngay ở hit kế tiếp
+"""
+
+import threading
+from datetime import datetime
+
+import pytest
+
+from conftest import make_test_app, require_app_deps
+
+
+def test_concurrent_token_increments_are_not_lost(tmp_path):
+    require_app_deps()
+    from models import db, User
+    from services.user_cache_service import user_cache
+
+    app = make_test_app(f"sqlite:///{tmp_path / 'users.db'}")
+    with app.app_context():
+        db.create_all()
+        user = User(username='learner', email='learner@example.com',
+                    password_hash='x', total_tokens_used=300)
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        db.session.remove()
+
+    user_cache.clear()
+    with app.app_context():
+        user_cache.load(user_id)  # Cache giữ total_tokens_used=300
+        db.session.remove()
+
+    barrier = threading.Barrier(2)
+    errors = []
+
+    def add_usage():
+        try:
+            with app.app_context():
+                cached = user_cache.load(user_id)
+                barrier.wait()
+                cached.add_tokens_used(500)
+                db.session.commit()
+                db.session.remove()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=add_usage) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert user_cache.get(user_id) is None
+    with app.app_context():
+        assert db.session.get(User, user_id).total_tokens_used == 1300
+        db.drop_all()
+
+
+# ==================== NHIỀU PROCESS ====================
+
+@pytest.fixture
+def worker_db(tmp_path):
+    """2 app trên cùng file SQLite = 2 worker; mỗi worker có UserCache riêng như khi chạy gunicorn"""
+    require_app_deps()
+    from models import db, User
+    from services.user_cache_service import UserCache
+
+    uri = f"sqlite:///{tmp_path / 'workers.db'}"
+    app_a, app_b = make_test_app(uri), make_test_app(uri)
+    with app_a.app_context():
+        db.create_all()
+        user = User(username='learner', email='learner@example.com', password_hash='x', total_tokens_used=0)
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        db.session.remove()
+
+    yield app_a, app_b, UserCache(ttl_seconds=60), user_id
+
+    with app_a.app_context():
+        db.drop_all()
+
+
+def load_in(app, cache, user_id):
+    from models import db
+
+    with app.app_context():
+        user = cache.load(user_id)
+        values = None if user is None else (user.is_active, user.locked_until, user.total_tokens_used)
+        db.session.remove()
+        return values
+
+
+def update_in(app, user_id, change):
+    from models import db, User
+
+    with app.app_context():
+        change(db.session.get(User, user_id))
+        db.session.commit()
+        db.session.remove()
+
+
+@pytest.mark.parametrize('change, expected', [
+    (lambda user: setattr(user, 'is_active', False), lambda values: values[0] is False),
+    (lambda user: setattr(user, 'locked_until', datetime(2099, 1, 1)), lambda values: values[1] == datetime(2099, 1, 1)),
+    (lambda user: user.add_tokens_used(250), lambda values: values[2] == 250),
+])
+def test_change_in_other_worker_is_seen_on_next_hit(worker_db, change, expected):
+    app_a, app_b, cache_b, user_id = worker_db
+    assert load_in(app_b, cache_b, user_id) == (True, None, 0)
+
+    update_in(app_a, user_id, change)
+
+    assert expected(load_in(app_b, cache_b, user_id))
+    # Entry mới được cache lại với version mới
+    assert cache_b.get(user_id) is not None
+    assert expected(load_in(app_b, cache_b, user_id))
+
+
+def test_deleted_user_is_not_served_from_cache(worker_db):
+    from models import db, User
+
+    app_a, app_b, cache_b, user_id = worker_db
+    load_in(app_b, cache_b, user_id)
+    update_in(app_a, user_id, lambda user: db.session.delete(user))
+
+    assert load_in(app_b, cache_b, user_id) is None
+    assert cache_b.get(user_id) is None
+
+
+def test_hit_reads_only_cache_version(worker_db):
+    from sqlalchemy import event
+    from models import db
+
+    app_a, app_b, cache_b, user_id = worker_db
+    load_in(app_b, cache_b, user_id)
+
+    statements = []
+    with app_b.app_context():
+        listener = lambda conn, cursor, statement, *args: statements.append(' '.join(statement.split()))
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            assert cache_b.load(user_id).username == 'learner'
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+            db.session.remove()
+
+    assert len(statements) == 1
+    assert statements[0].startswith('SELECT users.cache_version FROM users')
@@ -0,0 +1,186 @@
+"""
+Vocabulary: keyset pagination (mới nhất trước / theo prefix), chèn trùng bị DB bỏ qua, collation MySQL,
+lịch ôn SM-2 (ease, interval, quên, thứ tự hàng đợi)
+"""
+
+import pytest
+
+
+WORDS = ['resume', 'résumé', 'Resume ', 'apple', 'Apple pie', 'apricot', 'äpfel', 'banana', 'ápple', 'app']
+
+
+def add_words(user_id, words):
+    from models import db
+    from services.vocabulary_service import insert_vocabulary
+
+    results = [insert_vocabulary(user_id, word) for word in words]
+    db.session.commit()
+    return results
+
+
+def collect_pages(user_id, prefix='', limit=3):
+    from services.vocabulary_service import list_vocabularies
+
+    pages, cursor = [], None
+    while True:
+        items, cursor = list_vocabularies(user_id, prefix=prefix, cursor=cursor, limit=limit)
+        pages.append([item['word'] for item in items])
+        if cursor is None:
+            return pages
+
+
+def test_duplicates_after_normalization_are_ignored(app, user):
+    from models import Vocabulary
+
+    results = add_words(user.id, WORDS)
+    created = {word: was_created for word, (_, was_created) in zip(WORDS, results)}
+    # Khác hoa thường / khoảng trắng: trùng; khác dấu: từ khác
+    assert created['Resume '] is False
+    assert created['résumé'] is True and created['ápple'] is True
+    assert Vocabulary.query.count() == len(WORDS) - 1
+
+    vocab, was_created = add_words(user.id, ['RESUME'])[0]
+    assert was_created is False and vocab.word == 'resume'
+
+
+def test_newest_first_pages_cover_every_word_once(app, user):
+    add_words(user.id, WORDS)
+    pages = collect_pages(user.id, limit=4)
+    assert [len(page) for page in pages] == [4, 4, 1]
+    assert sum(pages, []) == [w for w in reversed(WORDS) if w != 'Resume ']
+
+
+def test_prefix_pages_follow_normalized_order(app, user):
+    from services.vocabulary_service import normalize_word
+
+    add_words(user.id, WORDS)
+    pages = collect_pages(user.id, prefix='AP', limit=2)
+    expected = sorted((w for w in WORDS if normalize_word(w).startswith('ap')), key=normalize_word)
+    assert sum(pages, []) == expected == ['app', 'apple', 'Apple pie', 'apricot']
+    assert collect_pages(user.id, prefix='ré') == [['résumé']]
+
+
+def test_non_numeric_cursor_without_prefix_returns_empty_page(app, user):
+    from services.vocabulary_service import list_vocabularies, encode_vocabulary_cursor
+
+    add_words(user.id, WORDS)
+    assert list_vocabularies(user.id, cursor=encode_vocabulary_cursor('apple')) == ([], None)
+
+
+def test_import_counts_duplicates_in_file_and_db(app, user):
+    from models import db, Vocabulary
+    from services.vocabulary_service import import_vocabularies
+
+    add_words(user.id, ['apple'])
+    stats = import_vocabularies(user.id, [('Apple', 'dup in db'), ('pear', ''), ('PEAR ', 'dup in file'),
+                                          ('<b>plum</b>', 'quả mận'), ('   ', 'empty'), (None, 'bad')])
+    db.session.commit()
+    assert stats == {'inserted': 2, 'duplicates': 2, 'rejected': 2}
+    assert sorted(v.word for v in Vocabulary.query) == ['apple', 'pear', 'plum']
+
+    # Chạy lại: mọi dòng đều đã có
+    assert import_vocabularies(user.id, [('plum', ''), ('pear', '')])['inserted'] == 0
+
+
+def test_insert_ignore_skips_rows_other_request_inserted(app, user):
+    from services.vocabulary_service import insert_ignore_duplicates
+
+    row = {'user_id': user.id, 'word': 'kiwi', 'word_normalized': 'kiwi', 'note': ''}
+    assert insert_ignore_duplicates([row]) == 1
+    # Request song song đã insert giữa SELECT và INSERT: DB bỏ qua, không lỗi unique
+    assert insert_ignore_duplicates([row, {**row, 'word': 'fig', 'word_normalized': 'fig'}]) == 1
+
+
+def test_mysql_schema_uses_binary_collation():
+    pytest.importorskip('flask_sqlalchemy')
+    pytest.importorskip('dotenv')
+    from sqlalchemy.dialects import mysql
+    from sqlalchemy.schema import CreateTable
+    from models import Vocabulary
+
+    ddl = str(CreateTable(Vocabulary.__table__).compile(dialect=mysql.dialect()))
+    assert 'word_normalized VARCHAR(200) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL' in ddl
+
+
+# ==================== REVIEW (SM-2) ====================
+
+
+def schedule(interval, ease, reps, grade):
+    from datetime import datetime
+    from services.vocabulary_service import schedule_review
+
+    now = datetime(2026, 10, 19, 9, 0)
+    interval, ease, reps, due_at = schedule_review(interval, ease, reps, grade, now)
+    assert (due_at - now).days == interval
+    return interval, ease, reps
+
+
+@pytest.mark.parametrize('grade, expected_ease', [
+    (5, 2.6), (4, 2.5), (3, 2.36), (2, 2.18), (1, 1.96), (0, 1.7),
+])
+def test_ease_change_per_grade(grade, expected_ease):
+    assert schedule(0, 2.5, 0, grade)[1] == expected_ease
+
+
+@pytest.mark.parametrize('ease, grade, expected_ease', [
+    (1.3, 0, 1.3),    # Đã ở mức sàn
+    (1.4, 2, 1.3),    # 1.4 - 0.32 -> kẹp về 1.3
+    (1.3, 3, 1.3),    # 1.3 - 0.14 -> kẹp về 1.3
+    (1.3, 4, 1.3),
+    (1.3, 5, 1.4),
+    (3.0, 5, 3.1),    # Không có trần
+])
+def test_ease_is_clamped_at_minimum(ease, grade, expected_ease):
+    assert schedule(10, ease, 3, grade)[1] == expected_ease
+
+
+@pytest.mark.parametrize('interval, ease, reps, grade, expected', [
+    # Lần nhớ thứ 1, 2 cố định 1 và 6 ngày, sau đó nhân ease (ease trước lần ôn này)
+    (0, 2.5, 0, 4, (1, 2.5, 1)),
+    (1, 2.5, 1, 4, (6, 2.5, 2)),
+    (6, 2.5, 2, 4, (15, 2.5, 3)),
+    (15, 2.5, 3, 4, (38, 2.5, 4)),
+    (6, 2.5, 2, 3, (15, 2.36, 3)),
+    (6, 1.3, 2, 5, (8, 1.4, 3)),
+    (1, 1.3, 5, 4, (1, 1.3, 6)),     # Interval tối thiểu 1 ngày
+    # Quên (grade < 3): reps về 0, ôn lại sau 1 ngày, ease giảm
+    (38, 2.5, 4, 2, (1, 2.18, 0)),
+    (38, 2.5, 4, 0, (1, 1.7, 0)),
+    (1, 2.18, 0, 4, (1, 2.18, 1)),   # Nhớ lại sau khi quên: bắt đầu lại chuỗi 1, 6, ...
+])
+def test_schedule_review_table(interval, ease, reps, grade, expected):
+    assert schedule(interval, ease, reps, grade) == expected
+
+
+def test_interval_grows_with_consecutive_good_grades():
+    state, intervals = (0, 2.5, 0), []
+    for _ in range(6):
+        state = schedule(*state, 5)
+        intervals.append(state[0])
+    assert intervals == sorted(intervals) and len(set(intervals)) == len(intervals)
+    assert intervals[:2] == [1, 6]
+
+
+def test_due_queue_orders_by_due_date_and_moves_reviewed_words(app, user):
+    from datetime import datetime, timedelta
+    from models import db, Vocabulary
+    from services.vocabulary_service import due_vocabularies, submit_reviews
+
+    now = datetime(2026, 10, 19, 9, 0)
+    for word, days in [('late', -1), ('oldest', -5), ('future', 2), ('tie-a', -3), ('tie-b', -3)]:
+        db.session.add(Vocabulary(user_id=user.id, word=word, word_normalized=word, due_at=now + timedelta(days=days)))
+    db.session.commit()
+
+    items, has_more = due_vocabularies(user.id, limit=3, now=now)
+    assert [item['word'] for item in items] == ['oldest', 'tie-a', 'tie-b'] and has_more
+    items, has_more = due_vocabularies(user.id, limit=10, now=now)
+    assert [item['word'] for item in items] == ['oldest', 'tie-a', 'tie-b', 'late'] and not has_more
+
+    ids = {v.word: v.id for v in Vocabulary.query}
+    updated = submit_reviews(user.id, {ids['oldest']: 5, ids['tie-a']: 1, 999999: 5}, now=now)
+    db.session.commit()
+    assert {item['word']: item['review']['interval'] for item in updated} == {'oldest': 1, 'tie-a': 1}
+
+    # Cả 2 từ vừa ôn hết hạn sau 1 ngày: trước 'future' (2 ngày)
+    items, _ = due_vocabularies(user.id, limit=10, now=now + timedelta(days=1, seconds=1))
+    assert [item['word'] for item in items] == ['tie-b', 'late', 'oldest', 'tie-a']
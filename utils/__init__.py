@@ -5,10 +5,12 @@ Utility modules
 from .security import (
     sanitize_input,
     sanitize_html,
+    sanitize_html_batch,
     validate_uuid,
     validate_email,
     validate_username,
     validate_password_strength,
+    validate_idempotency_key,
     check_account_lockout,
     record_failed_login,
     reset_failed_login,
@@ -19,5 +21,14 @@ from .security import (
 from .helpers import (
     estimate_tokens,
     get_cache_key,
-    split_by_language
+    clean_text_for_tts,
+    split_into_chunks
+)
+
+from .message_parser import (
+    parse_message,
+    split_by_language,
+    message_preview,
+    dump_parsed,
+    load_parsed
 )
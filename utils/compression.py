@@ -0,0 +1,70 @@
+"""
+Response compression - nén gzip/brotli cho response JSON/HTML lớn (after_request)
+
+Chỉ nén response đã có sẵn toàn bộ body: response stream (SSE /api/chat, export NDJSON/CSV)
+và file (send_file, audio TTS) không bao giờ bị đọc vào bộ nhớ hay nén lại.
+"""
+
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # Optional: pip install brotli
+    brotli = None
+
+from config import RESPONSE_COMPRESSION, RESPONSE_COMPRESS_MIN_SIZE
+
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # Response động: quality cao hơn tốn CPU hơn nhiều mà lợi ít
+
+COMPRESSIBLE_MIMETYPES = frozenset({
+    'application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript'
+})
+
+
+def choose_encoding():
+    """Encoding tốt nhất client nhận (br > gzip), None nếu không có"""
+    if brotli is not None and request.accept_encodings['br'] > 0:
+        return 'br'
+    if request.accept_encodings['gzip'] > 0:
+        return 'gzip'
+    return None
+
+
+def compress_response(response):
+    if not RESPONSE_COMPRESSION:
+        return response
+    # Stream (text/event-stream, x-ndjson, ...) và file: không buffer
+    if response.is_streamed or response.direct_passthrough:
+        return response
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+    if 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < RESPONSE_COMPRESS_MIN_SIZE:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if len(compressed) >= len(data):
+        return response
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    # Bản nén khác byte với bản gốc: ETag mạnh phải chuyển thành weak
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
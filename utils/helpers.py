@@ -5,6 +5,12 @@ Helper utilities - text processing, caching
 import re
 import hashlib
 
+from .text_pipeline import strip_markdown, strip_option_prefix, strip_tts_punctuation
+
+
+SENTENCE_SPLIT_PATTERN = re.compile(r'(?<=[.!?,])\s+')
+LEADING_PUNCTUATION_PATTERN = re.compile(r'^[.,!?\s]+')
+
 
 def estimate_tokens(text):
     """Ước tính số token từ text"""
@@ -17,21 +23,52 @@ def get_cache_key(text, lang, speed):
     return hashlib.sha256(content.encode()).hexdigest()
 
 
-def split_by_language(text):
-    """Tách text thành các segments theo ngôn ngữ"""
-    text = re.sub(r'\[Actions\].*$', '', text, flags=re.IGNORECASE).strip()
+def clean_text_for_tts(text):
+    """Clean text for TTS - remove markdown and special chars"""
+    if not text:
+        return ""
+    # Remove markdown, then patterns like "A -", "B -", "C -" at the start
+    text = strip_option_prefix(strip_markdown(text))
+    # Remove double quotes, / -> space, remove ellipsis
+    text = strip_tts_punctuation(text).replace('...', ' ')
+    # Clean extra spaces
+    return ' '.join(text.split())
+
+
+def split_into_chunks(text, lang):
+    """
+    Chia 1 segment thành các chunk TTS giống splitIntoChunks trong app.js,
+    để audio tạo trước trên server trùng cache key với request của client
+    """
+    text = text.strip()
+    words = text.split()
+    if len(words) <= 15:
+        return [{'text': text, 'lang': lang}]
+    
+    chunks = []
+    first_chunk_end = -1
+    char_count = 0
+    for word in words[:15]:
+        char_count += len(word) + 1
+        if word.endswith(('.', ',', '!', '?')):
+            first_chunk_end = char_count - 1
+            break
     
-    segments = []
-    pattern = r'\[(Vietsub|Engsub)\]\s*([^[\]]*?)(?=\[(Vietsub|Engsub)\]|$)'
+    if first_chunk_end == -1:
+        chunks.append({'text': ' '.join(words[:15]), 'lang': lang})
+        text = ' '.join(words[15:])
+    else:
+        first_chunk = text[:first_chunk_end].strip()
+        if first_chunk:
+            chunks.append({'text': first_chunk, 'lang': lang})
+        text = LEADING_PUNCTUATION_PATTERN.sub('', text[first_chunk_end:].strip()).strip()
     
-    for match in re.finditer(pattern, text, re.IGNORECASE):
-        lang_tag = match.group(1).lower()
-        content = match.group(2).strip()
-        content = re.sub(r'\*\*(.+?)\*\*', r'\1', content)
-        content = re.sub(r'[*#_`~]', '', content)
-        
-        if content and len(content) >= 2:
-            lang = 'vi' if lang_tag == 'vietsub' else 'en'
-            segments.append({'text': content, 'lang': lang})
+    if text:
+        for sentence in SENTENCE_SPLIT_PATTERN.split(text):
+            sentence = sentence.strip()
+            if sentence and len(sentence) > 1:
+                chunks.append({'text': sentence, 'lang': lang})
     
-    return segments
+    if not chunks:
+        return [{'text': text.strip(), 'lang': lang}]
+    return chunks
@@ -0,0 +1,131 @@
+"""
+Message parser - single-pass parsing of the tagged assistant response format
+
+Format (xem prompts.py):
+    [Vietsub] ... [Engsub] ... [Table] ... [List] ... [Tip] ... [Actions] a | b | c
+"""
+
+import json
+import re
+
+from .helpers import clean_text_for_tts, split_into_chunks
+from .text_pipeline import strip_markdown, strip_option_prefix, strip_tts_punctuation
+
+
+# Bump khi thay đổi cấu trúc output để client/server bỏ qua bản cũ
+PARSER_VERSION = 1
+
+TAG_PATTERN = re.compile(r'\[(Vietsub|Engsub|Table|Tip|List|Actions)\]', re.IGNORECASE)
+BOLD_PATTERN = re.compile(r'\*\*([^*]+)\*\*')
+BRACKET_TAG_PATTERN = re.compile(r'\[[^\]]*\]')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+PREVIEW_LENGTH = 120
+
+SPOKEN_TAGS = {'vietsub': 'vi', 'engsub': 'en', 'text': 'vi'}
+
+
+def parse_message(text):
+    """
+    Parse 1 assistant message trong 1 lần quét.
+
+    Returns:
+        {
+            'v': PARSER_VERSION,
+            'segments': [[tag, text], ...],  # tag: vietsub|engsub|table|list|tip|text
+            'actions': [str, ...],
+            'tts': [[lang, text], ...]       # chunk TTS đã clean, trùng với request của client
+        }
+    Text không có tag nào được trả về như 1 segment 'text' (client hiển thị như tiếng Việt).
+    """
+    segments, actions = scan_message(text)
+    return {
+        'v': PARSER_VERSION,
+        'segments': segments,
+        'actions': actions,
+        'tts': tts_chunks(segments)
+    }
+
+
+def scan_message(text):
+    """Quét tag 1 lần, trả về (segments, actions)"""
+    text = text or ''
+    segments = []
+    actions = []
+
+    matches = list(TAG_PATTERN.finditer(text))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        tag = match.group(1).lower()
+        body = text[match.end():end].strip()
+        if tag == 'actions':
+            actions = [a.strip() for a in body.split('|') if a.strip()]
+        elif body:
+            segments.append([tag, body])
+
+    if not matches and text.strip():
+        segments.append(['text', text.strip()])
+
+    return segments, actions
+
+
+def spoken_segments(segments):
+    """Các segment được đọc (bỏ table/list/tip), đã bỏ markdown - giống splitByLanguage trong app.js"""
+    result = []
+    for tag, body in segments:
+        lang = SPOKEN_TAGS.get(tag)
+        if lang is None:
+            continue
+        content = strip_markdown(BOLD_PATTERN.sub(r'\1', body))
+        if tag == 'text':
+            content = BRACKET_TAG_PATTERN.sub('', content)
+        content = strip_option_prefix(content.strip())
+        content = strip_tts_punctuation(content).strip()
+        if len(content) >= 2:
+            result.append({'text': content, 'lang': lang})
+    return result
+
+
+def tts_chunks(segments):
+    """Chunk TTS cuối cùng ([lang, text]) - text đã qua clean_text_for_tts như /api/tts/single"""
+    chunks = []
+    for seg in spoken_segments(segments):
+        for chunk in split_into_chunks(seg['text'], seg['lang']):
+            chunk_text = clean_text_for_tts(chunk['text'])
+            if len(chunk_text) >= 2:
+                chunks.append([chunk['lang'], chunk_text])
+    return chunks
+
+
+def split_by_language(text):
+    """Tách text thành các segments theo ngôn ngữ"""
+    return spoken_segments(scan_message(text)[0])
+
+
+def message_preview(text, max_length=PREVIEW_LENGTH):
+    """Đoạn text ngắn 1 dòng cho sidebar: bỏ tag, [Actions], markdown"""
+    segments, _ = scan_message(text)
+    preview = ' '.join(body for _, body in segments)
+    preview = strip_markdown(BOLD_PATTERN.sub(r'\1', preview))
+    preview = WHITESPACE_PATTERN.sub(' ', preview).strip()
+    if len(preview) > max_length:
+        preview = preview[:max_length - 1].rstrip() + '…'
+    return preview
+
+
+def dump_parsed(parsed):
+    """Serialize gọn để lưu vào Message.segments"""
+    return json.dumps(parsed, ensure_ascii=False, separators=(',', ':'))
+
+
+def load_parsed(data):
+    """Đọc Message.segments; None nếu trống hoặc khác version"""
+    if not data:
+        return None
+    try:
+        parsed = json.loads(data)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(parsed, dict) or parsed.get('v') != PARSER_VERSION:
+        return None
+    return parsed
@@ -0,0 +1,138 @@
+"""
+Password hashing - chạy hash/verify trong process pool giới hạn, không chiếm GIL của request thread
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from config import (
+    PASSWORD_HASH_METHOD, PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_TIMEOUT
+)
+
+
+# Tham số mặc định của werkzeug 3.0 - để so với prefix lưu trong password_hash
+DEFAULT_METHOD_PARAMS = {
+    'pbkdf2': ('sha256', '600000'),
+    'scrypt': ('32768', '8', '1'),
+}
+
+
+class PasswordHasherBusy(Exception):
+    """Quá nhiều yêu cầu hash đang chờ - caller trả 503"""
+
+
+def canonical_method(method):
+    """'scrypt' -> 'scrypt:32768:8:1', 'pbkdf2:sha256' -> 'pbkdf2:sha256:600000'"""
+    name, *params = method.split(':')
+    defaults = DEFAULT_METHOD_PARAMS.get(name)
+    if defaults is None:
+        return method
+    params += defaults[len(params):]
+    return ':'.join([name, *params])
+
+
+HASH_METHOD = canonical_method(PASSWORD_HASH_METHOD)
+
+
+def pool_context():
+    """
+    forkserver (spawn nếu nền tảng không có): worker gthread đã có nhiều thread, fork lúc đó
+    có thể sao chép lock đang bị thread khác giữ (logging, DB driver...) làm process con treo.
+    Forkserver là process sạch khởi động bằng exec, process con fork từ đó nên không kế thừa
+    thread/lock của worker.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        # Forkserver import sẵn 1 lần, process con không phải import lại khi được tạo
+        context.set_forkserver_preload(['werkzeug.security'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+class PasswordHasher:
+    """
+    ProcessPoolExecutor tạo theo pid (gunicorn fork worker sau khi import app): start() trong
+    post_worker_init để process con sẵn sàng trước request đầu tiên, nếu chưa thì tạo lazy.
+    Semaphore giới hạn số yêu cầu đang chờ để đợt login dồn dập không xếp hàng vô hạn.
+    workers=0: chạy ngay trên thread hiện tại.
+    Process con chết (OOM killer, kill -9) làm pool hỏng vĩnh viễn: bỏ pool, tạo lại và
+    thử lại 1 lần; pool mới cũng hỏng thì hash ngay trên thread hiện tại.
+    """
+    def __init__(self, workers=2, max_pending=16, timeout=10):
+        self.workers = workers
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max(1, max_pending))
+        self.lock = threading.Lock()
+        self.context = pool_context()
+        self.executor = None
+        self.pid = None
+
+    def _get_executor(self):
+        with self.lock:
+            if self.executor is None or self.pid != os.getpid():
+                self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=self.context)
+                self.pid = os.getpid()
+            return self.executor
+
+    def start(self):
+        """Khởi động forkserver và process con ngay (gọi trước khi worker nhận request)"""
+        if self.workers > 0:
+            self.run(os.getpid)
+
+    def _discard_executor(self, broken):
+        with self.lock:
+            # Thread khác có thể đã tạo pool mới
+            if self.executor is broken:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+
+    def run(self, func, *args):
+        if self.workers <= 0:
+            return func(*args)
+        if not self.slots.acquire(timeout=self.timeout):
+            raise PasswordHasherBusy()
+        try:
+            for _ in range(2):
+                executor = self._get_executor()
+                try:
+                    return executor.submit(func, *args).result(timeout=self.timeout)
+                except BrokenProcessPool:
+                    self._discard_executor(executor)
+            return func(*args)
+        except FutureTimeoutError:
+            raise PasswordHasherBusy()
+        finally:
+            self.slots.release()
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None and self.pid == os.getpid():
+                self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+# Global hasher (per process)
+password_hasher = PasswordHasher(
+    workers=PASSWORD_HASH_WORKERS,
+    max_pending=PASSWORD_HASH_MAX_PENDING,
+    timeout=PASSWORD_HASH_TIMEOUT
+)
+
+
+def hash_password(password):
+    return password_hasher.run(generate_password_hash, password, HASH_METHOD)
+
+
+def verify_password(password_hash, password):
+    return password_hasher.run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """Hash lưu bằng thuật toán/tham số khác cấu hình hiện tại"""
+    return (password_hash or '').split('$', 1)[0] != HASH_METHOD
@@ -0,0 +1,136 @@
+"""
+Rate limiting - Flask-Limiter dùng chung storage giữa các worker trên cùng host
+
+`memory://` đếm riêng từng process nên với N worker giới hạn thực tế là N lần cấu hình.
+SQLiteStorage lưu counter fixed-window trong 1 file SQLite (WAL) mà mọi worker cùng mở:
+mỗi hit là 1 upsert trong transaction ngắn, không cần Redis/Memcached.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from flask import request
+from flask_login import current_user
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from limits.storage import Storage
+
+from config import RATE_LIMIT_DEFAULT, RATE_LIMIT_STORAGE_URI
+from .static_assets import is_fast_path
+
+
+RATE_LIMIT_DB_TIMEOUT = 5  # Giây chờ lock ghi của process khác
+RATE_LIMIT_PURGE_EVERY = 1000  # Số lần incr / process giữa 2 lần xóa counter hết hạn
+
+
+class SQLiteStorage(Storage):
+    """
+    limits storage cho `sqlite:///path/to/file.db` (chỉ hỗ trợ strategy fixed-window).
+
+    Mỗi thread giữ 1 connection riêng, mở lại sau fork (gunicorn preload).
+    """
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri, wrap_exceptions=False, **options):
+        self.path = uri.split("://", 1)[1][1:] or ":memory:"
+        self.local = threading.local()
+        self.incr_calls = 0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None and self.local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(
+            self.path, timeout=RATE_LIMIT_DB_TIMEOUT,
+            isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            "key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self.local.conn = conn
+        self.local.pid = os.getpid()
+        return conn
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        """Tăng counter của window hiện tại, window đã hết hạn thì bắt đầu lại từ `amount`"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO rate_limits (key, count, expires_at) VALUES (:key, :amount, :expires_at) "
+                "ON CONFLICT(key) DO UPDATE SET "
+                "count = CASE WHEN expires_at <= :now THEN :amount ELSE count + :amount END, "
+                "expires_at = CASE WHEN expires_at <= :now OR :elastic THEN :expires_at ELSE expires_at END",
+                {'key': key, 'amount': amount, 'now': now,
+                 'expires_at': now + expiry, 'elastic': bool(elastic_expiry)}
+            )
+            count = conn.execute("SELECT count FROM rate_limits WHERE key = ?", (key,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        self.incr_calls += 1
+        if self.incr_calls % RATE_LIMIT_PURGE_EVERY == 0:
+            conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+        return count
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT count FROM rate_limits WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        row = self._connection().execute(
+            "SELECT expires_at FROM rate_limits WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self):
+        try:
+            self._connection().execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._connection().execute("DELETE FROM rate_limits").rowcount
+
+    def clear(self, key):
+        self._connection().execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+
+def get_rate_limit_key():
+    """Get rate limit key - use user ID if logged in, else IP"""
+    if hasattr(current_user, 'id') and current_user.is_authenticated:
+        return f"user:{current_user.id}"
+    return get_remote_address()
+
+
+# Global limiter - init_app trong app.py, routes import để gắn limit riêng
+limiter = Limiter(
+    key_func=get_rate_limit_key,
+    default_limits=[f"{RATE_LIMIT_DEFAULT} per hour"],
+    storage_uri=RATE_LIMIT_STORAGE_URI,
+    strategy="fixed-window",
+    swallow_errors=True,  # Storage lỗi thì cho request đi qua thay vì trả 500
+)
+
+
+@limiter.request_filter
+def skip_fast_paths():
+    # /static, /health: không tính key (load user) và không chạm storage
+    return is_fast_path(request.path)
@@ -4,52 +4,223 @@ Security utilities - validation, sanitization, logging
 
 import os
 import re
+import json
+import time
 import uuid
-import bleach
+import queue
+import atexit
 import logging
+import threading
 from datetime import datetime, timedelta
 from logging.handlers import RotatingFileHandler
+from flask import has_request_context
 from flask_limiter.util import get_remote_address
 
-from config import MAX_LOGIN_ATTEMPTS, LOCKOUT_DURATION
+from .text_pipeline import strip_control_chars, needs_html_sanitize
+from config import (
+    MAX_LOGIN_ATTEMPTS, LOCKOUT_DURATION,
+    SECURITY_LOG_QUEUE_SIZE, SECURITY_LOG_SAMPLE_WINDOW, SECURITY_LOG_SAMPLE_MAX
+)
 
 
 # ==================== SECURITY LOGGING ====================
 
+SECURITY_LOG_FILE = 'logs/security.log'
+SECURITY_LOG_FLUSH_INTERVAL = 1.0  # Giây giữa 2 lần writer ghi dòng tổng kết sampling
+SAMPLED_EVENTS = frozenset({'RATE_LIMIT'})  # Event có thể dồn dập khi bị tấn công
+SAMPLER_MAX_KEYS = 10000  # Quá số (event, ip) này thì gộp chung key ip='*'
+
+
+class JsonLineFormatter(logging.Formatter):
+    """1 event = 1 dòng JSON"""
+    def format(self, record):
+        entry = {
+            'ts': datetime.utcfromtimestamp(record.created).isoformat(timespec='milliseconds') + 'Z',
+            'level': record.levelname,
+            'event': getattr(record, 'event', None),
+            'message': record.getMessage(),
+            'user_id': getattr(record, 'user_id', None),
+            'ip': getattr(record, 'ip', None),
+        }
+        count = getattr(record, 'count', None)
+        if count is not None:
+            entry['count'] = count
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SecurityEventSampler:
+    """
+    Giới hạn số bản ghi đầy đủ cho SAMPLED_EVENTS: mỗi (event, ip) / window chỉ ghi
+    `max_per_window` bản ghi đầu, phần còn lại chỉ đếm và được ghi thành 1 dòng tổng kết
+    (có `count`) khi window đóng.
+    """
+    def __init__(self, window_seconds=60, max_per_window=5, max_keys=SAMPLER_MAX_KEYS):
+        self.window_seconds = window_seconds
+        self.max_per_window = max_per_window
+        self.max_keys = max_keys
+        self.windows = {}  # (event, ip) -> [started_at, logged, suppressed]
+        self.closed = []
+        self.lock = threading.Lock()
+
+    def admit(self, event_type, ip):
+        """True nếu bản ghi này được ghi đầy đủ"""
+        now = time.monotonic()
+        key = (event_type, ip)
+        with self.lock:
+            if key not in self.windows and len(self.windows) >= self.max_keys:
+                key = (event_type, '*')
+            window = self.windows.get(key)
+            if window is not None and now - window[0] >= self.window_seconds:
+                if window[2]:
+                    self.closed.append((key, window[2]))
+                window = None
+            if window is None:
+                window = self.windows[key] = [now, 0, 0]
+            if window[1] < self.max_per_window:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+    def drain(self):
+        """Lấy các ((event, ip), suppressed) của window đã đóng, bỏ window hết hạn"""
+        now = time.monotonic()
+        with self.lock:
+            closed, self.closed = self.closed, []
+            for key, window in list(self.windows.items()):
+                if now - window[0] >= self.window_seconds:
+                    del self.windows[key]
+                    if window[2]:
+                        closed.append((key, window[2]))
+        return closed
+
+
+class SecurityLogWriter:
+    """
+    Background thread ghi security log: request thread chỉ put record vào queue (không I/O).
+    Queue đầy thì bỏ record và ghi số lượng bị bỏ ở lần flush sau.
+    Thread khởi động lazy theo pid (gunicorn fork worker sau khi import app).
+    """
+    def __init__(self, handler, sampler, queue_size=10000):
+        self.handler = handler
+        self.sampler = sampler
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def submit(self, record):
+        if self.pid != os.getpid():
+            self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+
+    def _start(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            # Queue kế thừa từ process cha có thể giữ lock của thread không còn tồn tại
+            self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self.dropped = 0
+            self.pid = os.getpid()
+            threading.Thread(target=self._run, name='security-log-writer', daemon=True).start()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                self.handler.handle(self.queue.get(timeout=SECURITY_LOG_FLUSH_INTERVAL))
+            except queue.Empty:
+                pass
+            if time.monotonic() - last_flush >= SECURITY_LOG_FLUSH_INTERVAL:
+                self.flush_summaries()
+                last_flush = time.monotonic()
+
+    def flush_summaries(self):
+        for (event_type, ip), count in self.sampler.drain():
+            self._write_summary(event_type, ip, count, f"{count} events suppressed by sampling")
+        with self.lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            self._write_summary('LOG_DROPPED', None, dropped, f"{dropped} events dropped (queue full)")
+
+    def _write_summary(self, event_type, ip, count, message):
+        self.handler.handle(logging.makeLogRecord({
+            'name': 'security', 'levelno': logging.WARNING, 'levelname': 'WARNING',
+            'msg': message, 'event': event_type, 'ip': ip, 'user_id': None, 'count': count
+        }))
+
+    def close(self):
+        """Ghi nốt record còn trong queue khi process thoát"""
+        if self.pid != os.getpid():
+            return
+        while True:
+            try:
+                self.handler.handle(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        self.flush_summaries()
+        self.handler.flush()
+
+
+class QueuedSecurityHandler(logging.Handler):
+    """Handler của logger 'security': chuyển record sang SecurityLogWriter"""
+    def __init__(self, writer):
+        super().__init__()
+        self.writer = writer
+
+    def emit(self, record):
+        self.writer.submit(record)
+
+
+security_sampler = SecurityEventSampler(
+    window_seconds=SECURITY_LOG_SAMPLE_WINDOW,
+    max_per_window=SECURITY_LOG_SAMPLE_MAX
+)
+
+
+# Chưa setup (CLI, script ngoài app) thì bỏ qua event
+security_logger = logging.getLogger('security')
+security_logger.addHandler(logging.NullHandler())
+
+
 def setup_security_logging():
-    """Setup security event logging"""
+    """Setup security event logging - gọi trong create_app, không chạy lúc import"""
+    if any(isinstance(handler, QueuedSecurityHandler) for handler in security_logger.handlers):
+        return security_logger
+    
     if not os.path.exists('logs'):
         os.makedirs('logs')
     
     security_handler = RotatingFileHandler(
-        'logs/security.log',
+        SECURITY_LOG_FILE,
         maxBytes=10485760,  # 10MB
-        backupCount=10
+        backupCount=10,
+        delay=True  # Mở file khi writer thread ghi record đầu tiên
     )
-    security_handler.setFormatter(logging.Formatter(
-        '%(asctime)s - %(levelname)s - %(message)s'
-    ))
+    security_handler.setFormatter(JsonLineFormatter())
+    
+    writer = SecurityLogWriter(security_handler, security_sampler, queue_size=SECURITY_LOG_QUEUE_SIZE)
+    atexit.register(writer.close)
     
-    security_logger = logging.getLogger('security')
     security_logger.setLevel(logging.INFO)
-    security_logger.addHandler(security_handler)
+    security_logger.propagate = False
+    security_logger.addHandler(QueuedSecurityHandler(writer))
     
     return security_logger
 
 
-# Initialize security logger
-if os.getenv('SECURITY_LOGGING', 'true').lower() == 'true':
-    security_logger = setup_security_logging()
-else:
-    security_logger = logging.getLogger('security')
-    security_logger.addHandler(logging.NullHandler())
-
-
 def log_security_event(event_type, message, user_id=None, ip=None):
-    """Log security events"""
-    ip = ip or get_remote_address()
-    user_info = f"user_id={user_id}" if user_id else "anonymous"
-    security_logger.info(f"[{event_type}] {message} | {user_info} | ip={ip}")
+    """Log security events (JSON line, ghi bởi background thread)"""
+    # Có thể được gọi từ background thread (không có request context)
+    if not ip and has_request_context():
+        ip = get_remote_address()
+    if event_type in SAMPLED_EVENTS and not security_sampler.admit(event_type, ip):
+        return
+    security_logger.info(message, extra={'event': event_type, 'user_id': user_id, 'ip': ip})
 
 
 # ==================== INPUT SANITIZATION ====================
@@ -60,19 +231,54 @@ def sanitize_input(text, max_length=10000):
         return ""
     text = str(text).strip()
     text = text[:max_length]
-    text = text.replace('\x00', '')
-    # Remove control characters
-    text = ''.join(char for char in text if ord(char) >= 32 or char in '\n\r\t')
-    return text
+    # Remove control characters (kể cả \x00)
+    return strip_control_chars(text)
 
 
 def sanitize_html(text):
     """Remove all HTML tags"""
     if not text:
         return ""
+    # Fast path: text thường không có ký tự bleach thay đổi
+    if not needs_html_sanitize(text):
+        return text
+    import bleach  # Import lần đầu cần tới (html5lib nặng)
     return bleach.clean(text, tags=[], strip=True)
 
 
+def batch_separator():
+    """
+    Separator bleach giữ nguyên (ký tự in được, không phải & < >), bao bởi U+2063 để không dính
+    vào entity/từ liền kề; nonce ngẫu nhiên mỗi lần gọi nên không thể có sẵn trong text.
+    """
+    return f"\u2063{uuid.uuid4().hex}\u2063"
+
+
+def sanitize_html_batch(texts):
+    """
+    sanitize_html cho nhiều chuỗi bằng 1 lần gọi bleach, chỉ cho các chuỗi không đi được fast path.
+    Tag/comment dở dang vắt qua separator làm mất separator -> số phần lệch -> làm lại từng chuỗi.
+    """
+    if not texts:
+        return []
+    results = [text or "" for text in texts]
+    pending = [i for i, text in enumerate(results) if needs_html_sanitize(text)]
+    if not pending:
+        return results
+    import bleach
+    if len(pending) == 1:
+        parts = [bleach.clean(results[pending[0]], tags=[], strip=True)]
+    else:
+        separator = batch_separator()
+        joined = separator.join(results[i] for i in pending)
+        parts = bleach.clean(joined, tags=[], strip=True).split(separator)
+        if len(parts) != len(pending):
+            parts = [bleach.clean(results[i], tags=[], strip=True) for i in pending]
+    for i, part in zip(pending, parts):
+        results[i] = part
+    return results
+
+
 # ==================== VALIDATION ====================
 
 def validate_uuid(uuid_string):
@@ -100,6 +306,13 @@ def validate_username(username):
     return bool(re.match(pattern, username))
 
 
+def validate_idempotency_key(key):
+    """Validate Idempotency-Key header (1-255 printable ASCII chars)"""
+    if not key or len(key) > 255:
+        return False
+    return key.isascii() and key.isprintable()
+
+
 def validate_password_strength(password):
     """Validate password meets security requirements"""
     errors = []
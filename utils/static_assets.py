@@ -0,0 +1,166 @@
+"""
+Static assets - URL có fingerprint, file nén sẵn, fast path bỏ qua session/login/limiter
+
+    url_for('static', filename='js/app.js') -> /static/js/app.js?v=<hash nội dung>
+URL đúng hash được cache `immutable` 1 năm; sửa file -> hash đổi -> URL mới.
+`flask compress-static` tạo sẵn file .gz/.br cạnh file gốc để không nén lúc serve.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import current_app, request, send_from_directory
+from flask.sessions import SecureCookieSessionInterface
+from werkzeug.security import safe_join
+
+
+STATIC_URL_PREFIX = '/static/'
+FAST_PATHS = frozenset({'/health'})
+
+STATIC_VERSION_ARG = 'v'
+STATIC_VERSION_LENGTH = 12
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+UNVERSIONED_STATIC = frozenset({'sw.js'})  # URL service worker phải cố định
+
+# Thứ tự ưu tiên khi client nhận cả hai
+PRECOMPRESSED_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+COMPRESSIBLE_EXTENSIONS = frozenset({'.js', '.css', '.json', '.svg', '.html', '.txt', '.map'})
+COMPRESS_MIN_SIZE = 1024
+
+
+def is_fast_path(path):
+    """Request không cần session, user, rate limit"""
+    return path.startswith(STATIC_URL_PREFIX) or path in FAST_PATHS
+
+
+class FastPathSessionInterface(SecureCookieSessionInterface):
+    """
+    Session null cho fast path: không đọc/ghi cookie session, không thêm `Vary: Cookie`
+    (nếu không, session permanent bị gửi lại ở mọi response, kể cả file tĩnh).
+    """
+    def open_session(self, app, request):
+        if is_fast_path(request.path):
+            return self.null_session_class()
+        return super().open_session(app, request)
+
+
+# ==================== FINGERPRINT ====================
+
+_versions = {}  # filename -> (mtime_ns, size, version)
+_versions_lock = threading.Lock()
+
+
+def static_version(static_folder, filename):
+    """Hash nội dung file (đọc lại khi mtime/size đổi). None nếu không tồn tại"""
+    path = safe_join(static_folder, filename)
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    cached = _versions.get(filename)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+
+    with open(path, 'rb') as f:
+        version = hashlib.sha256(f.read()).hexdigest()[:STATIC_VERSION_LENGTH]
+    with _versions_lock:
+        _versions[filename] = (stat.st_mtime_ns, stat.st_size, version)
+    return version
+
+
+def add_static_version(endpoint, values):
+    """url_defaults: thêm ?v=<hash> cho url_for('static', ...)"""
+    if endpoint != 'static' or STATIC_VERSION_ARG in values:
+        return
+    filename = values.get('filename')
+    if not filename or filename in UNVERSIONED_STATIC:
+        return
+    version = static_version(current_app.static_folder, filename)
+    if version:
+        values[STATIC_VERSION_ARG] = version
+
+
+# ==================== SERVE ====================
+
+def precompressed_variant(static_folder, filename):
+    """(encoding, filename nén) hợp với Accept-Encoding, mới hơn file gốc; None nếu không có"""
+    path = safe_join(static_folder, filename)
+    if path is None:
+        return None
+    try:
+        source_mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+    for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+        if request.accept_encodings[encoding] <= 0:
+            continue
+        try:
+            # File nén cũ hơn file gốc (quên chạy lại compress-static) thì bỏ qua
+            if os.stat(path + suffix).st_mtime_ns >= source_mtime:
+                return encoding, filename + suffix
+        except OSError:
+            continue
+    return None
+
+
+def send_static(filename):
+    """View cho endpoint 'static': file nén sẵn + cache theo fingerprint"""
+    static_folder = current_app.static_folder
+    variant = precompressed_variant(static_folder, filename)
+    if variant:
+        encoding, compressed = variant
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(static_folder, compressed, mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(static_folder, filename)
+    response.vary.add('Accept-Encoding')
+
+    version = request.args.get(STATIC_VERSION_ARG)
+    if version and version == static_version(static_folder, filename):
+        response.headers['Cache-Control'] = f'public, max-age={STATIC_IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        # URL không fingerprint (hoặc hash cũ): luôn revalidate bằng ETag
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+# ==================== PRECOMPRESS ====================
+
+def compress_static_files(static_folder):
+    """
+    Tạo file .gz (và .br nếu cài `brotli`) cho file text trong static/.
+    Trả về (số file đã nén, có brotli không).
+    """
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    count = 0
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            if os.path.splitext(name)[1] not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            if len(data) < COMPRESS_MIN_SIZE:
+                continue
+
+            outputs = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                outputs.append(('.br', brotli.compress(data, quality=11)))
+            for suffix, compressed in outputs:
+                if len(compressed) < len(data):
+                    with open(path + suffix, 'wb') as f:
+                        f.write(compressed)
+            count += 1
+    return count, brotli is not None
@@ -0,0 +1,46 @@
+"""
+Text pipeline - regex dựng sẵn và các bước xóa ký tự dùng chung cho sanitize / TTS cleanup
+
+Text chat chủ yếu là tiếng Việt (non-ASCII): str.translate phải tra dict từng ký tự nên chậm
+hơn cả generator; regex compile sẵn và str.replace (quét ở C) nhanh hơn hàng chục lần.
+"""
+
+import re
+
+
+# Ký tự điều khiển < 32 trừ \n \r \t (gồm cả \x00)
+CONTROL_CHARS_PATTERN = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Markdown bị bỏ trước khi đọc TTS
+MARKDOWN_CHARS = '*#_`~'
+
+# "A -", "B -" ở đầu lựa chọn
+OPTION_PREFIX_PATTERN = re.compile(r'^[A-Z]\s*-\s*')
+
+# Text không có ký tự nào dưới đây thì bleach.clean(tags=[]) trả về nguyên văn
+# (bleach escape & < >, html5lib chuẩn hóa \r và ký tự điều khiển)
+HTML_SPECIAL_PATTERN = re.compile(r'[<>&\r\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]')
+
+
+def strip_control_chars(text):
+    return CONTROL_CHARS_PATTERN.sub('', text)
+
+
+def strip_markdown(text):
+    for char in MARKDOWN_CHARS:
+        if char in text:
+            text = text.replace(char, '')
+    return text
+
+
+def strip_option_prefix(text):
+    return OPTION_PREFIX_PATTERN.sub('', text, count=1)
+
+
+def strip_tts_punctuation(text):
+    """Bỏ ngoặc kép, '/' đọc thành khoảng trắng"""
+    return text.replace('"', '').replace('/', ' ')
+
+
+def needs_html_sanitize(text):
+    return HTML_SPECIAL_PATTERN.search(text) is not None